@@ -13,11 +13,64 @@ class Settings(BaseSettings):
     
     # База данных
     database_url: str = "sqlite:///./crm.db"
+    async_database_url: Optional[str] = None  # по умолчанию выводится из database_url
+
+    # SQLite профиль (PRAGMA применяются на каждом новом подключении)
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # байт
+    sqlite_cache_size: int = -64000  # отрицательное значение — в KiB (~64 МБ)
+    sqlite_temp_store: str = "MEMORY"
+
+    # Пул соединений
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     
+    # Импорт
+    import_workers: int = 2  # фоновых задач импорта одновременно на процесс
+    import_jobs_per_user: int = 2  # одновременных импортов (запросов и задач) на пользователя
+    import_tmp_dir: Optional[str] = None  # куда сохраняются файлы фоновых задач; по умолчанию системный tmp
+
+    # Активность пользователей
+    activity_flush_interval: float = 60.0  # секунд между пакетной записью last_login
+
+    # Аудит
+    audit_flush_interval: float = 1.0  # секунд между пакетной записью журнала аудита
+    audit_batch_size: int = 500  # строк в одном INSERT; столько накопилось — пишем, не дожидаясь интервала
+    audit_queue_size: int = 10000  # событий в очереди процесса
+    audit_overflow: str = "drop"  # drop — отбросить событие | block — ждать места до audit_block_timeout
+    audit_block_timeout: float = 1.0  # секунд ожидания места в очереди при audit_overflow=block
+    audit_max_attempts: int = 5  # попыток записать пакет; после — пакет уходит в audit-dead-letter.jsonl
+    audit_retention_months: int = 12  # месяцев журнала в БД (включая текущий); старше — в архив; 0 — не архивировать
+    audit_archive_dir: Optional[str] = None  # куда выгружаются audit-YYYY-MM.jsonl.gz; по умолчанию audit-archive рядом с БД
+
+    # Rate limit
+    rate_limit_backend: str = "sqlite"  # sqlite — общий для всех воркеров | memory — на процесс
+    rate_limit_algorithm: str = "sliding_window"  # sliding_window | token_bucket
+    rate_limit_db: Optional[str] = None  # файл SQLite лимитера; по умолчанию рядом с основной БД (crm.ratelimit.db)
+    rate_limit_max_keys: int = 100000  # ключей в хранилище; сверх — вытесняются самые старые
+
+    # Журнал изменений
+    change_log_retention_days: float = 30.0  # дней хранения tombstones в change_log; более старый токен /changes получает 410; 0 — хранить всё
+
+    # События (SSE)
+    events_poll_interval: float = 1.0  # секунд между опросами change_log
+    events_queue_size: int = 256  # событий в очереди подписчика; при переполнении — reset
+    events_heartbeat: float = 15.0  # секунд между комментариями-пингами в потоке
+    events_stream_ttl: float = 300.0  # секунд до закрытия потока; EventSource переподключится с Last-Event-ID
+
     # JWT
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24 * 7  # 7 дней
+    principal_cache_ttl: float = 30.0  # секунд жизни проверенного токена в кэше
+    principal_cache_size: int = 10000  # записей в кэше токенов (LRU)
+    password_hash_workers: int = 2  # потоков bcrypt на процесс
+    password_hash_max_pending: int = 32  # хэшей в очереди и в работе; сверх — 503
     
     # CORS
     cors_origins: list = ["http://localhost:5173","http://127.0.0.1:5173"]
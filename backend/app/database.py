@@ -1,19 +1,89 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from .config import settings
 
-# Создание движка БД
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+
+def _async_url(url: str) -> str:
+    """Асинхронный драйвер для того же URL (sqlite -> aiosqlite)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql:"):
+        return "postgresql+asyncpg:" + url[len("postgresql:"):]
+    return url
+
+
+def sqlite_pragmas(cfg=settings) -> list[str]:
+    """PRAGMA профиля SQLite из настроек"""
+    return [
+        f"PRAGMA journal_mode={cfg.sqlite_journal_mode}",
+        f"PRAGMA synchronous={cfg.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(cfg.sqlite_busy_timeout_ms)}",
+        f"PRAGMA mmap_size={int(cfg.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(cfg.sqlite_cache_size)}",
+        f"PRAGMA temp_store={cfg.sqlite_temp_store}",
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: list[str]) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _engine_kwargs(url: str, *, is_async: bool) -> dict:
+    """Параметры пула; для in-memory SQLite оставляем пул по умолчанию"""
+    kwargs: dict = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if "sqlite" in url:
+        if not is_async:
+            kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.endswith("://"):
+            return kwargs
+    kwargs.update(
+        poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    return kwargs
+
+
+_async_database_url = settings.async_database_url or _async_url(settings.database_url)
+
+# Создание движка БД (синхронный: init_db, init_data, скрипты)
+engine = create_engine(settings.database_url, **_engine_kwargs(settings.database_url, is_async=False))
+
+# Асинхронный движок для роутеров — не блокирует event loop
+async_engine = create_async_engine(_async_database_url, **_engine_kwargs(_async_database_url, is_async=True))
+
+if "sqlite" in settings.database_url:
+    _pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_sqlite_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, _pragmas)
 
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+class _ModelBase:
+    # server-side created_at/updated_at забираем сразу через RETURNING:
+    # AsyncSession не умеет лениво догружать истёкшие атрибуты
+    __mapper_args__ = {"eager_defaults": True}
+
 
 # Базовый класс для моделей
-Base = declarative_base()
+Base = declarative_base(cls=_ModelBase)
 
 
 def get_db():
@@ -25,8 +95,42 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Инициализация базы данных"""
-    from app.models import user, contact, deal, pipeline, companies, advisors, investors, audit  # импорт моделей
+    from app.models import user, contact, deal, pipeline, companies, advisors, investors, audit, import_job  # импорт моделей
     Base.metadata.create_all(bind=engine)
+    from app.services.search import install_search_index
+    from app.services.versions import install_collection_versions
+    from app.services.audit_store import install_audit_storage
+    from app.services.kpi_groups import install_kpi_groups
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+        install_search_index(conn)
+        install_collection_versions(conn)
+        install_audit_storage(conn)
+        install_kpi_groups(conn)
+
+
+def upgrade_schema(conn):
+    """Досоздаёт недостающие колонки и индексы в уже существующих таблицах.
 
+    create_all не трогает существующие таблицы; миграций у нас нет, поэтому новые
+    (в т.ч. генерируемые VIRTUAL) колонки добавляются через ALTER TABLE ADD COLUMN.
+    """
+    existing = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not existing.has_table(table.name):
+            continue
+        present = {c["name"] for c in existing.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
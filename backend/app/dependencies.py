@@ -1,11 +1,15 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from .database import get_db
+from .config import settings
+from .database import AsyncSessionLocal, get_async_db
 from .models.user import User
+from .services.activity import tracker as activity
 from .services.auth import AuthService
+from .services.principals import Principal, principal_cache
+from .services.ratelimit import ConcurrencySlot, import_limiter
 
 # Security схема для JWT
 security = HTTPBearer()
@@ -13,10 +17,14 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     request: Request = None,
-) -> User:
-    """Получение текущего пользователя из JWT токена"""
+) -> Principal:
+    """Получение текущего пользователя из JWT токена.
+
+    Возвращает Principal (id, email, name, role, verified) из кэша — без проверки
+    подписи и запроса к БД, если токен уже встречался; полную запись читать из БД.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
@@ -33,29 +41,29 @@ async def get_current_user(
     if not token and credentials is not None:
         token = credentials.credentials
 
-    token_data = AuthService.decode_token(token or "")
-    
-    if token_data is None or token_data.user_id is None:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == token_data.user_id).first()
-    
+    user = principal_cache.get(token) if token else None
     if user is None:
-        raise credentials_exception
-    
-    # Обновляем last_login на любом защищенном запросе (фикс кейса, когда фронт не вызывал /auth/me)
-    try:
-        from datetime import datetime
-        user.last_login = datetime.utcnow()
-        db.commit()
-    except Exception:
-        pass
+        token_data = AuthService.decode_token(token or "")
+
+        if token_data is None or token_data.user_id is None:
+            raise credentials_exception
+
+        record = await db.get(User, token_data.user_id)
+
+        if record is None:
+            raise credentials_exception
+
+        user = Principal.from_user(record)
+        principal_cache.put(token, user, token_data.expires_at)
+
+    # last_login на любом защищенном запросе — отметка в памяти, в БД пишется пачкой в фоне
+    activity.touch(user.id)
     return user
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """Получение активного (верифицированного) пользователя"""
     if not current_user.verified:
         raise HTTPException(
@@ -66,8 +74,8 @@ async def get_current_active_user(
 
 
 async def get_current_admin(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """Получение пользователя с правами администратора"""
     from .models.user import UserRole
     
@@ -79,10 +87,44 @@ async def get_current_admin(
     return current_user
 
 
+async def get_stream_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+) -> Principal:
+    """Активный пользователь для долгих ответов (SSE).
+
+    Сессия БД закрывается сразу после проверки токена: зависимость get_async_db
+    держала бы соединение из пула до конца потока.
+    """
+    async with AsyncSessionLocal() as db:
+        user = await get_current_user(credentials, db, request)
+    return await get_current_active_user(user)
+
+
+async def import_slot(
+    current_user: User = Depends(get_current_active_user)
+) -> ConcurrencySlot:
+    """Место в лимите одновременных импортов пользователя (запросы и фоновые задачи).
+
+    Освобождается по завершении запроса, если не передано фоновой задаче (slot.detached).
+    """
+    slot = import_limiter.acquire(f"import:{current_user.id}", settings.import_jobs_per_user)
+    if slot is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many imports in progress, wait for them to finish"
+        )
+    try:
+        yield slot
+    finally:
+        if not slot.detached:
+            slot.release()
+
+
 # Опциональная аутентификация (для публичных эндпоинтов)
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[User]:
     """Получение текущего пользователя (опционально)"""
     if credentials is None:
@@ -92,6 +134,6 @@ async def get_current_user_optional(
     if token_data is None or token_data.user_id is None:
         return None
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = await db.get(User, token_data.user_id)
     return user
 
@@ -5,6 +5,12 @@ from contextlib import asynccontextmanager
 
 from .config import settings
 from .database import init_db
+from .services.jobs import runner as job_runner
+from .services.events import broadcaster
+from .services.activity import tracker as activity
+from .services.auth import password_hasher
+from .services.audit import audit_sink
+from .services.pagination import NEXT_CURSOR_HEADER
 from .routers import (
     auth_router,
     contacts_router,
@@ -14,6 +20,10 @@ from .routers import (
     companies_router,
     advisors_router,
     investors_router,
+    search_router,
+    jobs_router,
+    events_router,
+    analytics_router,
 )
 
 
@@ -22,7 +32,19 @@ async def lifespan(app: FastAPI):
     """Инициализация при запуске приложения"""
     # Создание таблиц в БД
     init_db()
+    job_runner.start()
+    broadcaster.start()
+    activity.start()
+    audit_sink.start()
     yield
+    await broadcaster.shutdown()
+    # Накопленные отметки last_login дописываются перед остановкой
+    await activity.shutdown()
+    # Очередь аудита дописывается перед остановкой
+    await audit_sink.shutdown()
+    password_hasher.shutdown()
+    # Незавершённые фоновые импорты помечаются прерванными
+    await job_runner.shutdown()
 
 
 # Создание приложения FastAPI
@@ -60,6 +82,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 if settings.env == "prod":
@@ -85,6 +108,10 @@ app.include_router(pipeline_router)
 app.include_router(companies_router)
 app.include_router(advisors_router)
 app.include_router(investors_router)
+app.include_router(search_router)
+app.include_router(jobs_router)
+app.include_router(events_router)
+app.include_router(analytics_router)
 
 
 @app.get("/", tags=["Общее"])
@@ -104,6 +131,8 @@ async def health_check():
     """Проверка работоспособности API"""
     return {
         "status": "healthy",
-        "version": settings.app_version
+        "version": settings.app_version,
+        "password_hashing": password_hasher.stats(),
+        "audit": audit_sink.stats(),
     }
 
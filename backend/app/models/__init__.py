@@ -5,6 +5,7 @@ from .pipeline import PipelineItem
 from .companies import CompanyToReach
 from .advisors import Advisor
 from .investors import Investor
+from .import_job import ImportJob
 
 __all__ = [
     "User",
@@ -14,5 +15,6 @@ __all__ = [
     "CompanyToReach",
     "Advisor",
     "Investor",
+    "ImportJob",
 ]
 
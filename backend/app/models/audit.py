@@ -1,25 +1,45 @@
-from sqlalchemy import Column, String, DateTime, JSON
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, DateTime, JSON, Index, Integer, MetaData, Table, UniqueConstraint
 from ..database import Base
 
 
-class AuditLog(Base):
-    __tablename__ = "audit_logs"
-
-    id = Column(String, primary_key=True, index=True)
-    user_id = Column(String, nullable=True)
-    action = Column(String, nullable=False)          # e.g. import, delete, change_password
-    entity = Column(String, nullable=False)          # e.g. pipeline, companies, advisors, investors, user
-    entity_id = Column(String, nullable=True)
-    ip = Column(String, nullable=True)
-    ua = Column(String, nullable=True)
-    meta = Column(JSON, nullable=True)               # free-form details
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-
-
-
-
-
-
-
-
+class AuditString(Base):
+    """Словарь повторяющихся строк журнала аудита: в строках партиций хранится только id"""
+    __tablename__ = "audit_strings"
+    __table_args__ = (UniqueConstraint("kind", "value", name="uq_audit_strings_kind_value"),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)            # ip | ua | email
+    value = Column(String, nullable=False)
+
+
+# Журнал аудита разбит по месяцам: audit_logs_YYYYMM. Партиции создаются по мере
+# записи (services/audit_store.py) и в Base.metadata.create_all не участвуют.
+AUDIT_PARTITION_PREFIX = "audit_logs_"
+partitions_metadata = MetaData()
+
+
+def audit_partition(month: str) -> Table:
+    """Таблица журнала за месяц month = "YYYYMM" """
+    name = AUDIT_PARTITION_PREFIX + month
+    if name in partitions_metadata.tables:
+        return partitions_metadata.tables[name]
+    return Table(
+        name,
+        partitions_metadata,
+        Column("id", String, primary_key=True),
+        Column("user_id", String, nullable=True),
+        Column("action", String, nullable=False),    # e.g. import, delete, change_password
+        Column("entity", String, nullable=False),    # e.g. pipeline, companies, advisors, investors, user
+        Column("entity_id", String, nullable=True),
+        Column("ip_id", Integer, nullable=True),     # -> audit_strings
+        Column("ua_id", Integer, nullable=True),     # -> audit_strings
+        Column("email_id", Integer, nullable=True),  # -> audit_strings; meta["email"] вынесен сюда
+        Column("meta", JSON, nullable=True),         # free-form details
+        Column("created_at", DateTime(timezone=True), nullable=False),
+        # последние события месяца
+        Index(f"ix_{name}_created_at", "created_at"),
+        # последние действия пользователя по типу: WHERE action = ? [AND user_id = ?] ORDER BY created_at
+        Index(f"ix_{name}_action_user_id_created_at", "action", "user_id", "created_at"),
+        # история сущности: WHERE entity = ? AND action = ? AND entity_id = ?
+        Index(f"ix_{name}_entity_action_entity_id", "entity", "action", "entity_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from ..database import Base
 
@@ -6,6 +6,10 @@ from ..database import Base
 class Contact(Base):
     """Модель контакта"""
     __tablename__ = "contacts"
+    __table_args__ = (
+        # keyset-пагинация списков по (created_at, id)
+        Index("ix_contacts_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     contact = Column(String, nullable=False)  # Имя контакта
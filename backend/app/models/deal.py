@@ -1,11 +1,17 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from ..database import Base
+from .promoted import promoted_key
+from .rowhash import row_hash_column, track_row_hash
 
 
 class Deal(Base):
     """Модель сделки (гибкая структура с JSON)"""
     __tablename__ = "deals"
+    __table_args__ = (
+        # keyset-пагинация списков по (created_at, id)
+        Index("ix_deals_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     owner_id = Column(String, ForeignKey("users.id"), nullable=True)
@@ -14,6 +20,15 @@ class Deal(Base):
     # Это позволяет гибко работать с любыми полями из CSV
     data = Column(JSON, nullable=False, default={})
     
+    # Горячие ключи data — индексируемые генерируемые колонки
+    company = promoted_key("Company")
+    status = promoted_key("Status")
+    sector = promoted_key("Sector")
+
+    row_hash = row_hash_column()
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+
+track_row_hash(Deal)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, DateTime, Integer, Boolean, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class ImportJob(Base):
+    """Фоновая задача импорта файла"""
+    __tablename__ = "import_jobs"
+    __table_args__ = (
+        Index("ix_import_jobs_owner_id_created_at", "owner_id", "created_at"),
+    )
+
+    id = Column(String, primary_key=True, index=True)
+    owner_id = Column(String, nullable=False)
+    collection = Column(String, nullable=False)      # pipeline, companies, advisors, investors, deals, contacts
+    filename = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued|running|completed|failed|cancelled
+    rows_parsed = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)             # текст ошибки для failed
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
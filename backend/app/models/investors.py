@@ -1,22 +1,30 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from ..database import Base
+from .promoted import promoted_key
+from .rowhash import row_hash_column, track_row_hash
 
 
 class Investor(Base):
     """List of investors (flexible JSON schema)"""
     __tablename__ = "investors"
+    __table_args__ = (
+        # keyset-пагинация списков по (created_at, id)
+        Index("ix_investors_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     owner_id = Column(String, ForeignKey("users.id"), nullable=True)
     data = Column(JSON, nullable=False, default={})
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-
-
-
 
+    # Горячие ключи data — индексируемые генерируемые колонки
+    investor = promoted_key("Investor")
+    relevant = promoted_key("Relevant?")
 
+    row_hash = row_hash_column()
 
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+track_row_hash(Investor)
@@ -1,22 +1,31 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from ..database import Base
+from .promoted import promoted_key
+from .rowhash import row_hash_column, track_row_hash
 
 
 class PipelineItem(Base):
     """Pipeline row (flexible JSON schema)"""
     __tablename__ = "pipeline_items"
+    __table_args__ = (
+        # keyset-пагинация списков по (created_at, id)
+        Index("ix_pipeline_items_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     owner_id = Column(String, ForeignKey("users.id"), nullable=True)
     data = Column(JSON, nullable=False, default={})
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-
-
-
 
+    # Горячие ключи data — индексируемые генерируемые колонки
+    company = promoted_key("Company")
+    status = promoted_key("Status")
+    sector = promoted_key("Sector")
 
+    row_hash = row_hash_column()
 
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+track_row_hash(PipelineItem)
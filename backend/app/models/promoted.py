@@ -0,0 +1,45 @@
+import json
+
+from sqlalchemy import Column, String, Computed, func
+
+
+def json_path(key: str) -> str:
+    """JSON path для ключа верхнего уровня (ключи бывают с пробелами и запятыми: 'Size, RUB mn')"""
+    return '$."' + key.replace('"', '\\"') + '"'
+
+
+def promoted_key(key: str, type_=String) -> Column:
+    """Ключ из `data`, вынесенный в индексируемую колонку.
+
+    Колонка генерируемая (VIRTUAL) — SQLite сам держит её в синхроне с `data`
+    при любой записи: ORM, bulk insert, импорт, сырой SQL.
+    """
+    path = json_path(key).replace("'", "''")
+    return Column(type_, Computed(f"json_extract(data, '{path}')", persisted=False), index=True, info={"json_key": key})
+
+
+def promoted_columns(model) -> dict:
+    """{ключ JSON: колонка} для вынесенных ключей модели"""
+    return {c.info["json_key"]: c for c in model.__table__.columns if "json_key" in c.info}
+
+
+def json_field(model, key: str):
+    """Выражение для ключа `data`: вынесенная колонка, если есть, иначе json_extract"""
+    column = promoted_columns(model).get(key)
+    if column is not None:
+        return column
+    value = func.json_extract(model.data, json_path(key))
+    if key.isascii():
+        return value
+    # json.dumps пишет не-ASCII ключи как \uXXXX, а json_extract (SQLite < 3.45)
+    # сравнивает ключи без раскодирования — ищем и так, и так
+    escaped = json.dumps(key)[1:-1]
+    return func.coalesce(value, func.json_extract(model.data, '$."' + escaped + '"'))
+
+
+def where_json_equals(query, model, values: dict):
+    """Фильтр равенства по ключам `data`; None-значения пропускаются"""
+    for key, value in values.items():
+        if value is not None:
+            query = query.where(json_field(model, key) == value)
+    return query
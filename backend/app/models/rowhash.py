@@ -0,0 +1,25 @@
+import hashlib
+import json
+
+from sqlalchemy import Column, String, event
+
+
+def content_hash(data) -> str:
+    """Хэш содержимого `data`: не зависит от порядка ключей"""
+    raw = json.dumps(data or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def row_hash_column() -> Column:
+    """Хэш `data` для сверки при повторном импорте (services.sync); NULL — ещё не посчитан"""
+    return Column(String(32), nullable=True)
+
+
+def track_row_hash(model) -> None:
+    """Пересчитывает row_hash при записи через ORM; Core-вставки и sync считают его сами"""
+
+    def _update(mapper, connection, target):
+        target.row_hash = content_hash(target.data)
+
+    event.listen(model, "before_insert", _update)
+    event.listen(model, "before_update", _update)
@@ -6,6 +6,10 @@ from .pipeline import router as pipeline_router
 from .companies import router as companies_router
 from .advisors import router as advisors_router
 from .investors import router as investors_router
+from .search import router as search_router
+from .jobs import router as jobs_router
+from .events import router as events_router
+from .analytics import router as analytics_router
 
 __all__ = [
     "auth_router",
@@ -16,5 +20,9 @@ __all__ = [
     "companies_router",
     "advisors_router",
     "investors_router",
+    "search_router",
+    "jobs_router",
+    "events_router",
+    "analytics_router",
 ]
 
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File, Form
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 import uuid
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.advisors import Advisor as AdvisorModel
 from ..models.user import User as UserModel
 from ..schemas.advisors import AdvisorItem, AdvisorCreate, AdvisorUpdate, AdvisorsImport
-from ..dependencies import get_current_active_user
-from ..services.ratelimit import limiter
+from ..models.promoted import where_json_equals
+from ..dependencies import get_current_active_user, import_slot
 from ..services.audit import write_audit
+from ..services.pagination import keyset_page
+from ..services.serialize import DATA_ROW_FIELDS, list_format, rows_response, select_fields
+from ..services.versions import list_etag, not_modified
+from ..services.changes import MAX_CHANGES, changes_response
+from ..services.filters import DataQuery
+from ..services.export import export_json_collection
+from ..services.imports import import_upload, is_empty_row, start_import_job
+from ..services.ratelimit import ConcurrencySlot
+from ..services.bulk import bulk_insert
+from ..services.sync import sync_collection
+from ..schemas.imports import ImportSummary, ImportJob, SyncSummary
 
 
 EXPECTED_HEADERS = ['Advisor','Contact persons','Type','Comment','Responsible','Date of the last meeting of the responsible person','Months since the last meeting']
@@ -20,87 +32,166 @@ router = APIRouter(prefix="/api/advisors", tags=["Advisors"])
 MAX_LIST = 5000
 
 @router.get("", response_model=List[AdvisorItem])
-async def list_items(skip: int = Query(0, ge=0), limit: Optional[int] = Query(1000, ge=1, le=MAX_LIST), export: bool = Query(False), db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    q = db.query(AdvisorModel)
-    items = q.offset(skip).limit(min(limit or MAX_LIST, MAX_LIST)).all()
+async def list_items(request: Request, skip: int = Query(0, ge=0), cursor: Optional[str] = Query(None), limit: Optional[int] = Query(1000, ge=1, le=MAX_LIST), export: bool = Query(False), dq: DataQuery = Depends(), fmt: str = Depends(list_format), advisor: Optional[str] = Query(None), responsible: Optional[str] = Query(None), db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    etag = await list_etag(db, "advisors", request, fmt)
+    cached = None if export else not_modified(request, etag)
+    if cached:
+        return cached
+    q = dq.where(select_fields(AdvisorModel, DATA_ROW_FIELDS), AdvisorModel)
+    q = where_json_equals(q, AdvisorModel, {"Advisor": advisor, "Responsible": responsible})
+    items, next_cursor = await keyset_page(db, q, AdvisorModel, cursor=cursor, limit=min(limit or MAX_LIST, MAX_LIST), skip=skip, order_by=dq.order_by(AdvisorModel))
     if export:
         try:
-            write_audit(db, user_id=current_user.id, action="export", entity="advisors", meta={"count": len(items), "email": current_user.email})
+            await write_audit(db, user_id=current_user.id, action="export", entity="advisors", meta={"count": len(items), "email": current_user.email})
         except Exception:
             pass
-    return [AdvisorItem.model_validate(x) for x in items]
+    return rows_response(items, DATA_ROW_FIELDS, next_cursor, fmt=fmt, expected=EXPECTED_HEADERS, etag=etag)
+
+
+@router.get("/changes", summary="Изменения после токена: строки и id удалённых")
+async def list_changes(
+    since: Optional[str] = Query(None, description="Токен из предыдущего ответа; без него — все строки"),
+    limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    return await changes_response(db, "advisors", AdvisorModel, DATA_ROW_FIELDS, since, limit)
+
+
+@router.get("/export", summary="Потоковый экспорт (CSV/XLSX) без ограничения по числу строк")
+async def export_items(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    dq: DataQuery = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    try:
+        await write_audit(db, user_id=current_user.id, action="export", entity="advisors", meta={"format": fmt, "email": current_user.email})
+    except Exception:
+        pass
+    return export_json_collection(fmt, "advisors", AdvisorModel, dq.where(select(AdvisorModel.data), AdvisorModel), EXPECTED_HEADERS)
 
 
 @router.post("", response_model=AdvisorItem, status_code=status.HTTP_201_CREATED)
-async def create_item(payload: AdvisorCreate, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+async def create_item(payload: AdvisorCreate, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
     item = AdvisorModel(id=f"a_{uuid.uuid4().hex[:12]}", owner_id=payload.owner_id or current_user.id, data=payload.data)
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return AdvisorItem.model_validate(item)
 
 
 @router.delete("/clear", status_code=status.HTTP_204_NO_CONTENT)
-async def clear(db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    db.query(AdvisorModel).delete()
-    db.commit()
+async def clear(db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    await db.execute(delete(AdvisorModel))
+    await db.commit()
     return None
 
 
 MAX_ITEMS = 20000
 
+# Естественный ключ строки для /sync по умолчанию
+NATURAL_KEY = ["Advisor"]
+
 @router.post("/import", response_model=List[AdvisorItem])
-async def import_items(payload: AdvisorsImport, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+async def import_items(payload: AdvisorsImport, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user), slot: ConcurrencySlot = Depends(import_slot)):
     if not payload.items:
         raise HTTPException(status_code=400, detail="Empty file")
     if len(payload.items) > MAX_ITEMS:
         raise HTTPException(status_code=413, detail=f"Too many rows: {len(payload.items)} > {MAX_ITEMS}")
-    key = f"import:advisors:{current_user.id}"
-    if not limiter.allow(key, limit=3, window_seconds=60):
-        raise HTTPException(status_code=429, detail="Too many imports, slow down")
     headers = list(payload.items[0].keys())
     if any(h not in headers for h in EXPECTED_HEADERS):
         raise HTTPException(status_code=400, detail="Incorrect file for Advisors")
-    created = []
-    for row in payload.items:
-        if not any(str(v).strip() for v in row.values()):
-            continue
-        m = AdvisorModel(id=f"a_{uuid.uuid4().hex[:12]}", owner_id=payload.owner_id or current_user.id, data=row)
-        db.add(m)
-        created.append(m)
-    db.commit()
+    rows = [{"data": row} for row in payload.items if not is_empty_row(row)]
+    created = await bulk_insert(db, AdvisorModel, rows, prefix="a", owner_id=payload.owner_id or current_user.id)
+    await db.commit()
     try:
-        write_audit(db, user_id=current_user.id, action="import", entity="advisors", meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="import", entity="advisors", meta={"email": current_user.email})
     except Exception:
         pass
     return [AdvisorItem.model_validate(x) for x in created]
 
 
+@router.post("/upload", response_model=Union[ImportSummary, ImportJob], summary="Импорт файла CSV/XLSX: потоковый разбор, коммит порциями")
+async def upload_items(
+    response: Response,
+    file: UploadFile = File(...),
+    owner_id: Optional[str] = Form(None),
+    background: bool = Query(False, description="Фоновой задачей: ответ 202 с задачей, прогресс — GET /api/jobs/{id}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot),
+):
+    def build(row: dict):
+        return None if is_empty_row(row) else {"data": row}
+
+    options = dict(prefix="a", owner_id=owner_id or current_user.id, required=EXPECTED_HEADERS, wrong_file="Incorrect file for Advisors")
+    if background:
+        job = await start_import_job(db, file, slot, AdvisorModel, build, user_id=current_user.id, collection="advisors", **options)
+        response.status_code = status.HTTP_202_ACCEPTED
+        result, meta = ImportJob.model_validate(job), {"job_id": job.id}
+    else:
+        result = await import_upload(db, file, AdvisorModel, build, **options)
+        meta = {"rows": result.inserted}
+    try:
+        await write_audit(db, user_id=current_user.id, action="import", entity="advisors", meta={"email": current_user.email, **meta})
+    except Exception:
+        pass
+    return result
+
+
+@router.post("/sync", response_model=SyncSummary, summary="Повторный импорт со сверкой: пишутся только отличия")
+async def sync_items(
+    payload: AdvisorsImport,
+    key: List[str] = Query(NATURAL_KEY, description="Естественный ключ строки (ключи data), можно повторять"),
+    delete_missing: bool = Query(False, description="Удалить строки, которых нет в файле"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot),
+):
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="Empty file")
+    if len(payload.items) > MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many rows: {len(payload.items)} > {MAX_ITEMS}")
+    headers = list(payload.items[0].keys())
+    if any(h not in headers for h in EXPECTED_HEADERS):
+        raise HTTPException(status_code=400, detail="Incorrect file for Advisors")
+    if any(k not in headers for k in key):
+        raise HTTPException(status_code=400, detail=f"Key columns missing in file: {[k for k in key if k not in headers]}")
+    rows = [row for row in payload.items if not is_empty_row(row)]
+    summary = await sync_collection(db, AdvisorModel, rows, key=key, prefix="a", owner_id=payload.owner_id or current_user.id, delete_missing=delete_missing)
+    try:
+        await write_audit(db, user_id=current_user.id, action="sync", entity="advisors", meta={"email": current_user.email, "key": key, **summary.model_dump()})
+    except Exception:
+        pass
+    return summary
+
+
 @router.put("/{item_id}", response_model=AdvisorItem)
-async def update_item(item_id: str, payload: AdvisorUpdate, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    item = db.query(AdvisorModel).get(item_id)
+async def update_item(item_id: str, payload: AdvisorUpdate, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    item = await db.get(AdvisorModel, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Not found")
     if payload.data is not None:
         item.data = payload.data
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     try:
-        write_audit(db, user_id=current_user.id, action="update", entity="advisors", entity_id=item_id, meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="update", entity="advisors", entity_id=item_id, meta={"email": current_user.email})
     except Exception:
         pass
     return AdvisorItem.model_validate(item)
 
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_item(item_id: str, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    item = db.query(AdvisorModel).get(item_id)
+async def delete_item(item_id: str, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    item = await db.get(AdvisorModel, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
     try:
-        write_audit(db, user_id=current_user.id, action="delete", entity="advisors", entity_id=item_id, meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="delete", entity="advisors", entity_id=item_id, meta={"email": current_user.email})
     except Exception:
         pass
     return None
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from ..database import get_async_db
+from ..models.user import User as UserModel
+from ..dependencies import get_current_active_user
+from ..services.analytics import (
+    ANALYTICS_COLLECTIONS,
+    DASHBOARD_COLLECTIONS,
+    DEFAULT_DATE,
+    DEFAULT_SUM,
+    cached_response,
+    dashboard,
+    group_totals,
+    kpi,
+    monthly_series,
+    owner_totals,
+)
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+
+def selected_collections(
+    collections: Optional[List[str]] = Query(
+        None, description="Коллекции: pipeline, companies, advisors, investors, deals (по умолчанию — четыре листа дашборда)"
+    ),
+) -> tuple[str, ...]:
+    names = tuple(dict.fromkeys(collections or DASHBOARD_COLLECTIONS))
+    unknown = [n for n in names if n not in ANALYTICS_COLLECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+    return names
+
+
+@router.get("/dashboard", summary="Показатели дашборда")
+async def get_dashboard(
+    request: Request,
+    collections: tuple[str, ...] = Depends(selected_collections),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """
+    Число сделок и уникальных контактов, разбивки по ответственным, секторам,
+    статусам и типам — `{"deals", "contacts", "by_responsible", "by_sector", "by_status", "by_type"}`.
+    """
+    return await cached_response(db, request, collections, lambda: dashboard(db, collections))
+
+
+@router.get("/groups", summary="Количество (и сумма) по значениям поля")
+async def get_groups(
+    request: Request,
+    by: str = Query(..., description="status, sector, type, responsible, owner или ключ data"),
+    sum_key: Optional[str] = Query(None, alias="sum", description=f"Суммируемый ключ data, например '{DEFAULT_SUM}'"),
+    collections: tuple[str, ...] = Depends(selected_collections),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """`[{"key", "count"[, "sum"]}]` по убыванию count; key = null — значение не заполнено."""
+    return await cached_response(db, request, collections, lambda: group_totals(db, collections, by, sum_key))
+
+
+@router.get("/owners", summary="Итоги по владельцам записей")
+async def get_owner_totals(
+    request: Request,
+    sum_key: Optional[str] = Query(DEFAULT_SUM, alias="sum", description="Суммируемый ключ data"),
+    collections: tuple[str, ...] = Depends(selected_collections),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """`[{"key": owner_id, "name", "email", "count", "sum"}]`"""
+    # имена и email владельцев — из users: ответ зависит и от её версии
+    return await cached_response(db, request, (*collections, "users"), lambda: owner_totals(db, collections, sum_key))
+
+
+@router.get("/monthly", summary="Помесячный ряд")
+async def get_monthly(
+    request: Request,
+    date_key: str = Query(DEFAULT_DATE, alias="date", description="Ключ data с датой (2024-01-15 или 15.01.2024)"),
+    sum_key: Optional[str] = Query(DEFAULT_SUM, alias="sum", description="Суммируемый ключ data"),
+    collections: tuple[str, ...] = Depends(selected_collections),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """`[{"month": "YYYY-MM", "count", "sum"}]` по возрастанию месяца."""
+    return await cached_response(db, request, collections, lambda: monthly_series(db, collections, date_key, sum_key))
+
+
+@router.get("/kpi", summary="Количество, сумма и среднее")
+async def get_kpi(
+    request: Request,
+    sum_key: str = Query(DEFAULT_SUM, alias="sum", description="Суммируемый ключ data"),
+    collections: tuple[str, ...] = Depends(selected_collections),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """`{"count", "total", "avg"}`"""
+    return await cached_response(db, request, collections, lambda: kpi(db, collections, sum_key))
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.user import User as UserModel
 from ..schemas.user import User, UserCreate, Token
-from ..services.auth import AuthService
+from ..services.activity import tracker as activity
+from ..services.auth import AuthService, password_hasher
 from ..services.ratelimit import limiter
 from ..dependencies import get_current_active_user
 import uuid
@@ -21,7 +23,7 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/register", response_model=Token, summary="Регистрация нового пользователя")
-async def register(user_data: UserCreate, db: Session = Depends(get_db), response: Response = None):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db), response: Response = None):
     """
     Регистрация нового пользователя в системе.
     
@@ -31,30 +33,34 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db), respons
     - **role**: Роль (admin или employee), по умолчанию employee
     """
     # Проверка существования пользователя
-    existing_user = db.query(UserModel).filter(UserModel.email == user_data.email).first()
+    existing_user = (await db.execute(select(UserModel).where(UserModel.email == user_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь с таким email уже существует"
         )
+    # На время bcrypt (с ожиданием в очереди) соединение с БД возвращается в пул
+    await db.commit()
+    hashed_password = await password_hasher.hash(user_data.password)
     
     # Создание нового пользователя
     user = UserModel(
         id=f"u_{uuid.uuid4().hex[:12]}",
         email=user_data.email,
         name=user_data.name,
-        hashed_password=AuthService.get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         role=user_data.role,
         verified=True  # Автоматическая верификация для упрощения
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Обновим last_login
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await db.refresh(user)
     # Создание токена
     access_token = AuthService.create_access_token(data={"sub": user.id})
     # Cookie (HttpOnly)
@@ -75,18 +81,14 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db), respons
 
 
 @router.post("/login", response_model=Token, summary="Вход в систему")
-async def login(credentials: LoginRequest, db: Session = Depends(get_db), response: Response = None):
-    # rate-limit по IP/email (MVP)
-    try:
-        import os
-        ip_key = f"login:ip:{os.getenv('CLIENT_IP','unknown')}"
-        if not limiter.allow(ip_key, limit=5, window_seconds=60):
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts")
-        email_key = f"login:email:{credentials.email}"
-        if not limiter.allow(email_key, limit=20, window_seconds=3600):
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts (hour)")
-    except Exception:
-        pass
+async def login(credentials: LoginRequest, request: Request, db: AsyncSession = Depends(get_async_db), response: Response = None):
+    # rate-limit по IP/email (общий для всех воркеров)
+    ip_key = f"login:ip:{request.client.host if request.client else 'unknown'}"
+    if not await limiter.allow(ip_key, limit=5, window_seconds=60):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts")
+    email_key = f"login:email:{credentials.email.lower()}"
+    if not await limiter.allow(email_key, limit=20, window_seconds=3600):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts (hour)")
     """
     Вход в систему с email и паролем.
     
@@ -96,9 +98,11 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db), respon
     Возвращает JWT токен для дальнейшей аутентификации.
     """
     # Поиск пользователя
-    user = db.query(UserModel).filter(UserModel.email == credentials.email).first()
+    user = (await db.execute(select(UserModel).where(UserModel.email == credentials.email))).scalars().first()
+    # На время bcrypt (с ожиданием в очереди) соединение с БД возвращается в пул
+    await db.commit()
     
-    if not user or not AuthService.verify_password(credentials.password, user.hashed_password):
+    if not user or not await password_hasher.verify(credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
@@ -109,9 +113,10 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db), respon
     try:
         from datetime import datetime
         user.last_login = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        await db.refresh(user)
     except Exception:
-        pass
+        await db.rollback()
     # Создание токена
     access_token = AuthService.create_access_token(data={"sub": user.id})
     # Cookie (HttpOnly)
@@ -132,20 +137,21 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db), respon
 
 
 @router.get("/me", response_model=User, summary="Получить данные текущего пользователя")
-async def get_me(current_user: UserModel = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def get_me(current_user: UserModel = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)):
     """
     Получение данных текущего авторизованного пользователя.
     
     Требуется JWT токен в заголовке Authorization: Bearer <token>
     """
-    # Обновим last_login при обращении к профилю (первый запрос после логина)
-    try:
-        from datetime import datetime
-        current_user.last_login = datetime.utcnow()
-        db.commit()
-    except Exception:
-        pass
-    return User.model_validate(current_user)
+    record = await db.get(UserModel, current_user.id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Не удалось проверить учетные данные")
+    # last_login уже отмечен в get_current_user; отдаём его, не дожидаясь фоновой записи
+    user = User.model_validate(record)
+    seen = activity.last_seen(current_user.id)
+    if seen is not None:
+        user.last_login = seen
+    return user
 
 
 @router.post("/logout", summary="Выход из системы")
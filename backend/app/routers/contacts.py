@@ -1,55 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File, Form
+from sqlalchemy import select, delete, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 import uuid
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.contact import Contact as ContactModel
 from ..models.user import User as UserModel
 from ..schemas.contact import Contact, ContactCreate, ContactUpdate, ContactImport
-from ..dependencies import get_current_active_user
+from ..dependencies import get_current_active_user, import_slot
 from ..config import settings
 from ..services.permissions import PermissionService
+from ..services.search import match_query, rowids_matching
+from ..services.export import export_response, stream_rows
+from ..services.pagination import keyset_page
+from ..services.serialize import TIME, VALUE, rows_response, select_fields
+from ..services.versions import list_etag, not_modified
+from ..services.changes import MAX_CHANGES, changes_response
+from ..services.imports import import_upload, start_import_job, contact_name as extract_contact_name
+from ..services.bulk import bulk_insert
+from ..services.ratelimit import ConcurrencySlot
+from ..schemas.imports import ImportSummary, ImportJob
 
 router = APIRouter(prefix="/api/contacts", tags=["Контакты"])
 
+# Поля списка в порядке схемы Contact
+LIST_FIELDS = (("contact", VALUE), ("id", VALUE), ("owner_id", VALUE), ("created_at", TIME), ("updated_at", TIME))
+
 
 @router.get("", response_model=List[Contact], summary="Получить список контактов")
 async def get_contacts(
+    request: Request,
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     limit: Optional[int] = Query(None, ge=1, description="Максимальное количество записей (если не указано — вернуть все)"),
     owner_id: Optional[str] = Query(None, description="Фильтр по владельцу"),
-    search: Optional[str] = Query(None, description="Поиск по имени контакта"),
-    db: Session = Depends(get_db),
+    search: Optional[str] = Query(None, description="Поиск по имени контакта (по началу слов)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
     Получение списка контактов с фильтрацией и пагинацией.
     
     - **skip**: Количество пропускаемых записей (для пагинации)
+    - **cursor**: Курсор из `X-Next-Cursor` — страница за O(limit) вместо O(skip)
     - **limit**: Максимальное количество возвращаемых записей
     - **owner_id**: Фильтр по ID владельца контакта
-    - **search**: Поиск по имени контакта (частичное совпадение)
+    - **search**: Поиск по имени контакта (полнотекстовый индекс, по началу слов:
+      "iva" находит "Ivanov", "ov" — нет)
     """
-    query = db.query(ContactModel)
+    etag = await list_etag(db, "contacts", request, "json")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    query = select_fields(ContactModel, LIST_FIELDS)
     
     # Фильтр по владельцу
     if owner_id:
-        query = query.filter(ContactModel.owner_id == owner_id)
+        query = query.where(ContactModel.owner_id == owner_id)
     
     # Поиск по имени
     if search:
-        query = query.filter(ContactModel.contact.ilike(f"%{search}%"))
+        match = match_query(search)
+        if not match:
+            # в запросе нет ни одного слова — совпадений нет
+            return rows_response([], LIST_FIELDS, None, etag=etag)
+        query = query.where(literal_column("contacts.rowid").in_(rowids_matching("contacts", match)))
     
-    if limit is not None:
-        contacts = query.offset(skip).limit(limit).all()
-    else:
-        contacts = query.offset(skip).all()
-    return [Contact.model_validate(c) for c in contacts]
+    contacts, next_cursor = await keyset_page(db, query, ContactModel, cursor=cursor, limit=limit, skip=skip)
+    # Быстрый путь: кортежи из БД сразу в JSON, без ORM-объектов и повторной валидации
+    return rows_response(contacts, LIST_FIELDS, next_cursor, etag=etag)
 
 @router.delete("/clear", status_code=status.HTTP_204_NO_CONTENT, summary="Очистить все контакты (MVP)")
 async def clear_contacts(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -58,15 +82,51 @@ async def clear_contacts(
     """
     if settings.env == "prod":
         raise HTTPException(status_code=403, detail="Disabled in production")
-    db.query(ContactModel).delete()
-    db.commit()
+    await db.execute(delete(ContactModel))
+    await db.commit()
     return None
 
 
+@router.get("/changes", summary="Изменения контактов после токена")
+async def get_contacts_changes(
+    since: Optional[str] = Query(None, description="Токен из предыдущего ответа; без него — все строки"),
+    limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES, description="Максимальное количество изменений в ответе"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Дельта-синхронизация: контакты, изменённые после `since`, и id удалённых.
+
+    Ответ: `{"items": [...], "deleted": [...], "token": "...", "more": false}`.
+    Следующий запрос — с `since=token`; при `more=true` изменений больше, чем `limit`.
+    410 — токен от другой базы, коллекцию нужно загрузить заново.
+    """
+    return await changes_response(db, "contacts", ContactModel, LIST_FIELDS, since, limit)
+
+
+@router.get("/export", summary="Потоковый экспорт контактов (CSV/XLSX)")
+async def export_contacts(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="Формат файла: csv или xlsx"),
+    owner_id: Optional[str] = Query(None, description="Фильтр по владельцу"),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Экспорт контактов файлом, строки читаются из БД порциями — без ограничения по количеству.
+    """
+    query = select(ContactModel.contact).order_by(ContactModel.created_at, ContactModel.id)
+    if owner_id:
+        query = query.where(ContactModel.owner_id == owner_id)
+
+    async def produce(conn):
+        return ["contact"], stream_rows(conn, query, lambda r: [r.contact])
+
+    return export_response(fmt, "contacts", produce)
+
+
 @router.get("/{contact_id}", response_model=Contact, summary="Получить контакт по ID")
 async def get_contact(
     contact_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -74,7 +134,7 @@ async def get_contact(
     
     - **contact_id**: Уникальный идентификатор контакта
     """
-    contact = db.query(ContactModel).filter(ContactModel.id == contact_id).first()
+    contact = await db.get(ContactModel, contact_id)
     
     if not contact:
         raise HTTPException(
@@ -88,7 +148,7 @@ async def get_contact(
 @router.post("", response_model=Contact, status_code=status.HTTP_201_CREATED, summary="Создать новый контакт")
 async def create_contact(
     contact_data: ContactCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -107,8 +167,8 @@ async def create_contact(
     )
     
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     
     return Contact.model_validate(contact)
 
@@ -117,7 +177,7 @@ async def create_contact(
 async def update_contact(
     contact_id: str,
     contact_data: ContactUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -128,7 +188,7 @@ async def update_contact(
     
     Можно обновлять только свои контакты (или любые, если вы администратор).
     """
-    contact = db.query(ContactModel).filter(ContactModel.id == contact_id).first()
+    contact = await db.get(ContactModel, contact_id)
     
     if not contact:
         raise HTTPException(
@@ -147,8 +207,8 @@ async def update_contact(
     if contact_data.contact is not None:
         contact.contact = contact_data.contact
     
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     
     return Contact.model_validate(contact)
 
@@ -156,7 +216,7 @@ async def update_contact(
 @router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Удалить контакт")
 async def delete_contact(
     contact_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -166,7 +226,7 @@ async def delete_contact(
     
     Можно удалять только свои контакты (или любые, если вы администратор).
     """
-    contact = db.query(ContactModel).filter(ContactModel.id == contact_id).first()
+    contact = await db.get(ContactModel, contact_id)
     
     if not contact:
         raise HTTPException(
@@ -181,16 +241,17 @@ async def delete_contact(
             detail="Недостаточно прав для удаления этого контакта"
         )
     
-    db.delete(contact)
-    db.commit()
+    await db.delete(contact)
+    await db.commit()
     
     return None
 
 @router.post("/import", response_model=List[Contact], summary="Массовый импорт контактов")
 async def import_contacts(
     import_data: ContactImport,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot)
 ):
     """
     Массовый импорт контактов из CSV/Excel.
@@ -200,37 +261,46 @@ async def import_contacts(
     
     Формат каждого контакта: {"contact": "Имя контакта"}
     """
-    owner_id = import_data.owner_id or current_user.id
-    created_contacts = []
-    
+    rows = []
     for contact_data in import_data.contacts:
         # Извлекаем имя контакта из различных возможных полей, включая Investor
-        raw = (
-            contact_data.get("contact") or
-            contact_data.get("Investor") or contact_data.get("investor") or
-            contact_data.get("Contact persons") or contact_data.get("contact persons") or
-            contact_data.get("Contacted person") or contact_data.get("contacted person") or
-            contact_data.get("Source Name") or contact_data.get("source name") or
-            ""
-        )
-        contact_name = str(raw).strip()
+        contact_name = extract_contact_name(contact_data)
         # Скипаем пустые строки (включая строки из пробелов)
         if not contact_name:
             continue
-        
-        contact = ContactModel(
-            id=f"c_{uuid.uuid4().hex[:12]}",
-            contact=contact_name,
-            owner_id=owner_id
-        )
-        
-        db.add(contact)
-        created_contacts.append(contact)
+        rows.append({"contact": contact_name})
     
-    db.commit()
-    
-    for contact in created_contacts:
-        db.refresh(contact)
+    # Одна вставка executemany; id и created_at генерируются на клиенте — refresh не нужен
+    created_contacts = await bulk_insert(db, ContactModel, rows, prefix="c", owner_id=import_data.owner_id or current_user.id)
+    await db.commit()
     
     return [Contact.model_validate(c) for c in created_contacts]
 
+
+@router.post("/upload", response_model=Union[ImportSummary, ImportJob], summary="Импорт контактов файлом CSV/XLSX")
+async def upload_contacts(
+    response: Response,
+    file: UploadFile = File(...),
+    owner_id: Optional[str] = Form(None),
+    background: bool = Query(False, description="Фоновой задачей: ответ 202 с задачей, прогресс — GET /api/jobs/{id}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot)
+):
+    """
+    Импорт контактов загрузкой файла, без ограничения по числу строк.
+    
+    Имя контакта берётся из тех же колонок, что и в `/import`; файл разбирается
+    потоком и вставляется порциями с коммитом на каждую порцию.
+    С `background=true` импорт идёт фоновой задачей (см. `/api/jobs`).
+    """
+    def build(row: dict):
+        name = extract_contact_name(row)
+        return {"contact": name} if name else None
+
+    options = dict(prefix="c", owner_id=owner_id or current_user.id)
+    if background:
+        job = await start_import_job(db, file, slot, ContactModel, build, user_id=current_user.id, collection="contacts", **options)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return ImportJob.model_validate(job)
+    return await import_upload(db, file, ContactModel, build, **options)
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File, Form
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 import uuid
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.deal import Deal as DealModel
 from ..models.user import User as UserModel
 from ..schemas.deal import Deal, DealCreate, DealUpdate, DealImport
-from ..dependencies import get_current_active_user
+from ..models.promoted import where_json_equals
+from ..dependencies import get_current_active_user, import_slot
 from ..services.permissions import PermissionService
+from ..services.pagination import keyset_page
+from ..services.serialize import DATA_ROW_FIELDS, list_format, rows_response, select_fields
+from ..services.versions import list_etag, not_modified
+from ..services.changes import MAX_CHANGES, changes_response
+from ..services.filters import DataQuery
+from ..services.export import export_json_collection
+from ..services.imports import import_upload, start_import_job, clean_deal_row
+from ..services.bulk import bulk_insert
+from ..services.sync import sync_collection
+from ..services.ratelimit import ConcurrencySlot
+from ..schemas.imports import ImportSummary, ImportJob, SyncSummary
 from ..config import settings
 
 router = APIRouter(prefix="/api/deals", tags=["Сделки"])
@@ -16,36 +29,85 @@ router = APIRouter(prefix="/api/deals", tags=["Сделки"])
 
 @router.get("", response_model=List[Deal], summary="Получить список сделок")
 async def get_deals(
+    request: Request,
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     limit: Optional[int] = Query(None, ge=1, description="Максимальное количество записей (если не указано — вернуть все)"),
     owner_id: Optional[str] = Query(None, description="Фильтр по владельцу"),
-    db: Session = Depends(get_db),
+    company: Optional[str] = Query(None, description="Фильтр по Company"),
+    status_: Optional[str] = Query(None, alias="status", description="Фильтр по Status"),
+    sector: Optional[str] = Query(None, description="Фильтр по Sector"),
+    dq: DataQuery = Depends(),
+    fmt: str = Depends(list_format),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
     Получение списка сделок с фильтрацией и пагинацией.
     
     - **skip**: Количество пропускаемых записей (для пагинации)
+    - **cursor**: Курсор из `X-Next-Cursor` — страница за O(limit) вместо O(skip)
     - **limit**: Максимальное количество возвращаемых записей
     - **owner_id**: Фильтр по ID владельца сделки
+    - **company**, **status**, **sector**: Фильтры по индексируемым полям data
+    - **filter**, **sort**: Фильтрация и сортировка по любым полям data (выполняются в БД)
+    - **format**: `columnar` / `msgpack` — компактный колоночный ответ `{columns, rows}`
     """
-    query = db.query(DealModel)
+    etag = await list_etag(db, "deals", request, fmt)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    query = select_fields(DealModel, DATA_ROW_FIELDS)
     
     # Фильтр по владельцу
     if owner_id:
-        query = query.filter(DealModel.owner_id == owner_id)
+        query = query.where(DealModel.owner_id == owner_id)
+    query = where_json_equals(query, DealModel, {"Company": company, "Status": status_, "Sector": sector})
+    query = dq.where(query, DealModel)
     
-    if limit is not None:
-        deals = query.offset(skip).limit(limit).all()
-    else:
-        deals = query.offset(skip).all()
-    return [Deal.model_validate(d) for d in deals]
+    deals, next_cursor = await keyset_page(db, query, DealModel, cursor=cursor, limit=limit, skip=skip, order_by=dq.order_by(DealModel))
+    # Быстрый путь: кортежи из БД сразу в JSON, без ORM-объектов и повторной валидации
+    return rows_response(deals, DATA_ROW_FIELDS, next_cursor, fmt=fmt, etag=etag)
+
+
+@router.get("/changes", summary="Изменения сделок после токена")
+async def get_deals_changes(
+    since: Optional[str] = Query(None, description="Токен из предыдущего ответа; без него — все строки"),
+    limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES, description="Максимальное количество изменений в ответе"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Дельта-синхронизация: сделки, изменённые после `since`, и id удалённых.
+
+    Ответ: `{"items": [...], "deleted": [...], "token": "...", "more": false}`.
+    Следующий запрос — с `since=token`; при `more=true` изменений больше, чем `limit`.
+    410 — токен от другой базы, коллекцию нужно загрузить заново.
+    """
+    return await changes_response(db, "deals", DealModel, DATA_ROW_FIELDS, since, limit)
+
+
+@router.get("/export", summary="Потоковый экспорт сделок (CSV/XLSX)")
+async def export_deals(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="Формат файла: csv или xlsx"),
+    owner_id: Optional[str] = Query(None, description="Фильтр по владельцу"),
+    dq: DataQuery = Depends(),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Экспорт сделок файлом, строки читаются из БД порциями — без ограничения по количеству.
+    Принимает те же фильтры, что и список сделок.
+    """
+    query = select(DealModel.data)
+    if owner_id:
+        query = query.where(DealModel.owner_id == owner_id)
+    return export_json_collection(fmt, "deals", DealModel, dq.where(query, DealModel))
 
 
 @router.get("/{deal_id}", response_model=Deal, summary="Получить сделку по ID")
 async def get_deal(
     deal_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -53,7 +115,7 @@ async def get_deal(
     
     - **deal_id**: Уникальный идентификатор сделки
     """
-    deal = db.query(DealModel).filter(DealModel.id == deal_id).first()
+    deal = await db.get(DealModel, deal_id)
     
     if not deal:
         raise HTTPException(
@@ -67,7 +129,7 @@ async def get_deal(
 @router.post("", response_model=Deal, status_code=status.HTTP_201_CREATED, summary="Создать новую сделку")
 async def create_deal(
     deal_data: DealCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -94,8 +156,8 @@ async def create_deal(
     )
     
     db.add(deal)
-    db.commit()
-    db.refresh(deal)
+    await db.commit()
+    await db.refresh(deal)
     
     return Deal.model_validate(deal)
 
@@ -104,7 +166,7 @@ async def create_deal(
 async def update_deal(
     deal_id: str,
     deal_data: DealUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -115,7 +177,7 @@ async def update_deal(
     
     Можно обновлять только свои сделки (или любые, если вы администратор).
     """
-    deal = db.query(DealModel).filter(DealModel.id == deal_id).first()
+    deal = await db.get(DealModel, deal_id)
     
     if not deal:
         raise HTTPException(
@@ -134,15 +196,15 @@ async def update_deal(
     if deal_data.data is not None:
         deal.data = deal_data.data
     
-    db.commit()
-    db.refresh(deal)
+    await db.commit()
+    await db.refresh(deal)
     
     return Deal.model_validate(deal)
 
 
 @router.delete("/clear", status_code=status.HTTP_204_NO_CONTENT, summary="Очистить все сделки (MVP)")
 async def clear_deals(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -151,14 +213,14 @@ async def clear_deals(
     """
     if settings.env == "prod":
         raise HTTPException(status_code=403, detail="Disabled in production")
-    db.query(DealModel).delete()
-    db.commit()
+    await db.execute(delete(DealModel))
+    await db.commit()
     return None
 
 @router.delete("/{deal_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Удалить сделку")
 async def delete_deal(
     deal_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -168,7 +230,7 @@ async def delete_deal(
     
     Можно удалять только свои сделки (или любые, если вы администратор).
     """
-    deal = db.query(DealModel).filter(DealModel.id == deal_id).first()
+    deal = await db.get(DealModel, deal_id)
     
     if not deal:
         raise HTTPException(
@@ -183,15 +245,16 @@ async def delete_deal(
             detail="Недостаточно прав для удаления этой сделки"
         )
     
-    db.delete(deal)
-    db.commit()
+    await db.delete(deal)
+    await db.commit()
     
     return None
 @router.post("/import", response_model=List[Deal], summary="Массовый импорт сделок")
 async def import_deals(
     import_data: DealImport,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot)
 ):
     """
     Массовый импорт сделок из CSV/Excel.
@@ -202,54 +265,72 @@ async def import_deals(
     Каждая сделка должна быть объектом с произвольными полями.
     Все поля сохраняются в JSON поле `data`.
     """
-    owner_id = import_data.owner_id or current_user.id
-    created_deals = []
-    
+    rows = []
     for deal_data in import_data.deals:
-        # Убираем только служебные поля и пустые имена колонок; нормализуем значения
-        clean_data = {}
-        has_nonempty_value = False
-        for k, v in deal_data.items():
-            if k in ("id", "owner_id", "created_at", "updated_at"):
-                continue
-            if not isinstance(k, str) or not k.strip():
-                continue
-            # Нормализация значения
-            normalized_empty = False
-            if v is None:
-                normalized_empty = True
-            elif isinstance(v, str):
-                if v.strip() == "":
-                    normalized_empty = True
-                else:
-                    v = v.strip()
-            elif isinstance(v, (list, dict)):
-                # Не сохраняем структурные значения из парсинга
-                normalized_empty = True
-            # Проверяем непустоту
-            if not normalized_empty:
-                has_nonempty_value = True
-                clean_data[k] = v
-            else:
-                # пропускаем пустые значения вовсе
-                pass
-        # Если нет ни одного непустого значения — пропускаем строку (включая строки вида ,,,,,, или с пробелами)
-        if not clean_data or not has_nonempty_value:
+        # Убираем служебные поля, пустые имена колонок и пустые значения;
+        # строки без единого непустого значения (,,,,,, или пробелы) пропускаем
+        clean_data = clean_deal_row(deal_data)
+        if not clean_data:
             continue
-        
-        deal = DealModel(
-            id=deal_data.get("id") or f"d_{uuid.uuid4().hex[:12]}",
-            owner_id=owner_id,
-            data=clean_data
-        )
-        
-        db.add(deal)
-        created_deals.append(deal)
+        rows.append({"id": deal_data.get("id"), "data": clean_data})
     
-    db.commit()
-    
-    for deal in created_deals:
-        db.refresh(deal)
+    # Одна вставка executemany; id и created_at генерируются на клиенте — refresh не нужен
+    created_deals = await bulk_insert(db, DealModel, rows, prefix="d", owner_id=import_data.owner_id or current_user.id)
+    await db.commit()
     
     return [Deal.model_validate(d) for d in created_deals]
 
+
+@router.post("/upload", response_model=Union[ImportSummary, ImportJob], summary="Импорт сделок файлом CSV/XLSX")
+async def upload_deals(
+    response: Response,
+    file: UploadFile = File(...),
+    owner_id: Optional[str] = Form(None),
+    background: bool = Query(False, description="Фоновой задачей: ответ 202 с задачей, прогресс — GET /api/jobs/{id}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot)
+):
+    """
+    Импорт сделок загрузкой файла, без ограничения по числу строк.
+    
+    Файл разбирается потоком и вставляется порциями с коммитом на каждую порцию,
+    поэтому память сервера не зависит от размера файла. Нормализация строк — как в `/import`.
+    С `background=true` импорт идёт фоновой задачей (см. `/api/jobs`).
+    """
+    def build(row: dict):
+        clean_data = clean_deal_row(row)
+        if not clean_data:
+            return None
+        return {"id": row.get("id"), "data": clean_data}
+
+    options = dict(prefix="d", owner_id=owner_id or current_user.id)
+    if background:
+        job = await start_import_job(db, file, slot, DealModel, build, user_id=current_user.id, collection="deals", **options)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return ImportJob.model_validate(job)
+    return await import_upload(db, file, DealModel, build, **options)
+
+
+@router.post("/sync", response_model=SyncSummary, summary="Повторный импорт сделок со сверкой")
+async def sync_deals(
+    import_data: DealImport,
+    key: List[str] = Query([], description="Естественный ключ сделки (ключи data), обязателен, можно повторять: key=Company&key=Date"),
+    delete_missing: bool = Query(False, description="Удалить сделки, которых нет в файле"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+    slot: ConcurrencySlot = Depends(import_slot)
+):
+    """
+    Повторный импорт: сделки сопоставляются с существующими по ключу, в БД пишутся
+    только новые, изменённые и (с `delete_missing`) удалённые строки.
+    Нормализация строк — как в `/import`.
+    """
+    headers = {k for deal_data in import_data.deals for k in deal_data}
+    if any(k not in headers for k in key):
+        raise HTTPException(status_code=400, detail=f"Key columns missing in file: {[k for k in key if k not in headers]}")
+    rows = [clean_data for clean_data in map(clean_deal_row, import_data.deals) if clean_data]
+    return await sync_collection(
+        db, DealModel, rows,
+        key=key, prefix="d", owner_id=import_data.owner_id or current_user.id, delete_missing=delete_missing
+    )
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..config import settings
+from ..models.user import User as UserModel
+from ..dependencies import get_stream_user
+from ..services.events import broadcaster
+from ..services.versions import LOGGED_COLLECTIONS
+
+router = APIRouter(prefix="/api/events", tags=["События"])
+
+
+def _last_event_id(request: Request) -> Optional[int]:
+    value = request.headers.get("last-event-id", "")
+    return int(value) if value.isdigit() else None
+
+
+async def _stream(collections: Optional[set[str]], last_event_id: Optional[int]):
+    subscriber = await broadcaster.subscribe(collections, last_event_id)
+    loop = asyncio.get_running_loop()
+    # поток закрывается по сроку, чтобы не держать остановку сервера (uvicorn ждёт открытые ответы);
+    # клиент переподключается сам и по Last-Event-ID ничего не теряет
+    deadline = loop.time() + settings.events_stream_ttl
+    try:
+        yield "retry: 3000\n\n"
+        while loop.time() < deadline:
+            try:
+                yield await asyncio.wait_for(subscriber.queue.get(), min(settings.events_heartbeat, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                # комментарий не даёт прокси закрыть простаивающее соединение
+                yield ": ping\n\n"
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@router.get("", summary="Поток изменений коллекций (Server-Sent Events)")
+async def stream_events(
+    request: Request,
+    collections: Optional[str] = Query(None, description="Коллекции через запятую; по умолчанию все"),
+    current_user: UserModel = Depends(get_stream_user),
+):
+    """
+    События `change`: `{"collection", "id", "op": "upsert"|"delete", "token"}`;
+    при массовых изменениях — одно `{"collection", "op": "bulk", "count", "token"}`.
+    Событие `reset` — клиент отстал, нужно дочитать изменения через `/api/<collection>/changes`.
+
+    id события — позиция в журнале: EventSource при переподключении присылает
+    Last-Event-ID и получает пропущенные события.
+    """
+    names = {c.strip() for c in collections.split(",") if c.strip()} if collections else None
+    unknown = (names or set()) - LOGGED_COLLECTIONS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(sorted(unknown))}")
+    return StreamingResponse(
+        _stream(names, _last_event_id(request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
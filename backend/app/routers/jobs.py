@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+from ..database import get_async_db
+from ..models.import_job import ImportJob as ImportJobModel
+from ..models.user import User as UserModel
+from ..schemas.imports import ImportJob
+from ..dependencies import get_current_active_user
+from ..services.permissions import PermissionService
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+async def _get_job(db: AsyncSession, job_id: str, user: UserModel) -> ImportJobModel:
+    job = await db.get(ImportJobModel, job_id)
+    if not job or (job.owner_id != user.id and not PermissionService.is_admin(user)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("", response_model=List[ImportJob], summary="Фоновые задачи импорта текущего пользователя")
+async def list_jobs(
+    status_: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    q = select(ImportJobModel).where(ImportJobModel.owner_id == current_user.id)
+    if status_:
+        q = q.where(ImportJobModel.status == status_)
+    q = q.order_by(ImportJobModel.created_at.desc(), ImportJobModel.id.desc()).limit(limit)
+    return [ImportJob.model_validate(j) for j in (await db.scalars(q)).all()]
+
+
+@router.get("/{job_id}", response_model=ImportJob, summary="Статус и прогресс задачи")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    return ImportJob.model_validate(await _get_job(db, job_id, current_user))
+
+
+@router.post("/{job_id}/cancel", response_model=ImportJob, summary="Отменить задачу")
+async def cancel_job(job_id: str, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_active_user)):
+    """
+    Задача в очереди отменяется сразу; выполняющаяся останавливается после текущей
+    порции (уже закоммиченные порции остаются в БД).
+    """
+    job = await _get_job(db, job_id, current_user)
+    if job.status in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    job.cancel_requested = True
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    await db.commit()
+    return ImportJob.model_validate(job)
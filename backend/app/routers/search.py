@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from ..database import get_async_db
+from ..models.user import User as UserModel
+from ..dependencies import get_current_active_user
+from ..services.search import SEARCH_COLLECTIONS, match_query, search_collection
+
+router = APIRouter(prefix="/api/search", tags=["Search"])
+
+
+MAX_HITS = 100
+
+
+@router.get("", summary="Полнотекстовый поиск по всем коллекциям")
+async def search(
+    q: str = Query(..., min_length=1, description="Слова запроса (совпадение по началу слова, все слова обязательны)"),
+    collections: Optional[List[str]] = Query(None, description="Коллекции для поиска (по умолчанию все)"),
+    limit: int = Query(10, ge=1, le=MAX_HITS, description="Максимум результатов на коллекцию"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_active_user),
+):
+    """
+    Поиск по FTS5-индексу: contacts, deals, pipeline, companies, advisors, investors.
+    Результаты внутри коллекции отсортированы по релевантности (bm25).
+    """
+    names = collections or list(SEARCH_COLLECTIONS)
+    unknown = [n for n in names if n not in SEARCH_COLLECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+    match = match_query(q)
+    results = {name: [] for name in names}
+    if match:
+        for name in names:
+            results[name] = await search_collection(db, name, match, limit)
+    return {"query": q, "results": results}
@@ -1,19 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Optional
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.user import User as UserModel
 from ..schemas.user import User, UserUpdate
-from ..services.auth import AuthService
+from ..services.auth import password_hasher
+from ..services.principals import principal_cache
 from pydantic import BaseModel, Field
-from ..services.audit import write_audit
-from ..models.audit import AuditLog
-from sqlalchemy import func
+from ..services.audit import audit_summary_rows, write_audit
+from ..services.audit_store import read_events
+from ..services.export import export_response, stream_rows
+from ..services.serialize import TIME, VALUE, rows_response, select_fields
+from ..services.versions import list_etag, not_modified
+from sqlalchemy import select
 from ..dependencies import get_current_admin
 
 router = APIRouter(prefix="/api/users", tags=["Пользователи (только для админов)"])
 
+# Поля списка в порядке схемы User (role — Enum, orjson отдаёт его значение)
+LIST_FIELDS = (
+    ("email", VALUE), ("name", VALUE), ("id", VALUE), ("role", VALUE), ("verified", VALUE),
+    ("created_at", TIME), ("updated_at", TIME), ("last_login", TIME),
+)
+
 
 @router.get("", response_model=List[User], summary="Получить список всех пользователей")
 async def get_users(
@@ -21,7 +32,7 @@ async def get_users(
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
     limit: int = Query(100, ge=1, le=1000, description="Максимальное количество записей"),
     export: bool = Query(False, description="Отметить запрос как экспорт для аудита"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_admin)
 ):
     """
@@ -32,60 +43,82 @@ async def get_users(
     - **skip**: Количество пропускаемых записей (для пагинации)
     - **limit**: Максимальное количество возвращаемых записей
     """
-    users = db.query(UserModel).offset(skip).limit(limit).all()
+    etag = await list_etag(db, "users", request, "json")
+    cached = None if export else not_modified(request, etag)
+    if cached:
+        return cached
+    users = (await db.execute(select_fields(UserModel, LIST_FIELDS).offset(skip).limit(limit))).all()
     if export:
         try:
-            write_audit(db, user_id=current_user.id, action="export", entity="user", meta={"count": len(users), "email": current_user.email})
+            await write_audit(db, user_id=current_user.id, action="export", entity="user", meta={"count": len(users), "email": current_user.email})
         except Exception:
             pass
-    return [User.model_validate(u) for u in users]
+    # Быстрый путь: кортежи из БД сразу в JSON, без ORM-объектов и повторной валидации
+    return rows_response(users, LIST_FIELDS, etag=etag)
+
+
+EXPORT_COLUMNS = ["id", "email", "name", "role", "verified", "created_at", "last_login"]
 
 
 # ВАЖНО: располагать до динамического "/{user_id}", иначе перехватит динамический маршрут
+@router.get("/export", summary="Потоковый экспорт пользователей (CSV/XLSX)")
+async def export_users(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="Формат файла: csv или xlsx"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Экспорт пользователей файлом (без хешей паролей).
+
+    **Только для администраторов!**
+    """
+    try:
+        await write_audit(db, user_id=current_user.id, action="export", entity="user", meta={"format": fmt, "email": current_user.email})
+    except Exception:
+        pass
+    query = select(*(getattr(UserModel, c) for c in EXPORT_COLUMNS)).order_by(UserModel.created_at, UserModel.id)
+
+    async def produce(conn):
+        return EXPORT_COLUMNS, stream_rows(conn, query, list)
+
+    return export_response(fmt, "users", produce)
+
+
 @router.get("/audit-summary", summary="Сводка аудита по действиям пользователей (для экспорта)")
-async def audit_summary(db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_admin)):
-    # Собираем по каждому пользователю последние времена его действий
-    users = db.query(UserModel.id).all()
+async def audit_summary(db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_admin)):
+    # Последние времена действий каждого пользователя — из audit_rollup, без сканирования журнала
+    return await audit_summary_rows(db)
 
-    def max_when(action: str):
-        rows = (
-            db.query(AuditLog.user_id, func.max(AuditLog.created_at))
-            .filter(AuditLog.action == action)
-            .group_by(AuditLog.user_id)
-            .all()
-        )
-        return {uid: ts.isoformat() if ts else None for uid, ts in rows}
 
-    last_import = max_when("import")
-    last_update = max_when("update")
-    last_delete = max_when("delete")
-    last_export = max_when("export")
-    # Смена пароля — по entity=user и entity_id=uid
-    rows_pw = (
-        db.query(AuditLog.entity_id, func.max(AuditLog.created_at))
-        .filter(AuditLog.entity == "user", AuditLog.action == "change_password")
-        .group_by(AuditLog.entity_id)
-        .all()
-    )
-    last_password_change = {uid: ts.isoformat() if ts else None for uid, ts in rows_pw}
+@router.get("/audit-log", summary="События журнала аудита за период")
+async def audit_log(
+    since: Optional[datetime] = Query(None, description="С какого момента (включительно)"),
+    until: Optional[datetime] = Query(None, description="До какого момента (не включая)"),
+    user_id: Optional[str] = Query(None, description="Кто действовал"),
+    action: Optional[str] = Query(None, description="Действие: import, update, delete, export, sync, change_password"),
+    entity: Optional[str] = Query(None, description="Коллекция или user"),
+    entity_id: Optional[str] = Query(None, description="ID записи"),
+    limit: int = Query(100, ge=1, le=1000, description="Максимальное количество событий"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    События аудита от новых к старым. Читаются только месяцы, попавшие в период;
+    выгруженные в архив месяцы здесь не видны.
 
-    result = []
-    for (uid,) in users:
-        result.append({
-            "user_id": uid,
-            "last_import": last_import.get(uid),
-            "last_update": last_update.get(uid),
-            "last_delete": last_delete.get(uid),
-            "last_export": last_export.get(uid),
-            "last_password_change": last_password_change.get(uid),
-        })
-    return result
+    **Только для администраторов!**
+    """
+    conn = await db.connection()
+    return await conn.run_sync(
+        read_events, since, until, limit,
+        user_id=user_id, action=action, entity=entity, entity_id=entity_id,
+    )
 
 
 @router.get("/{user_id}", response_model=User, summary="Получить пользователя по ID")
 async def get_user(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_admin)
 ):
     """
@@ -95,7 +128,7 @@ async def get_user(
     
     - **user_id**: Уникальный идентификатор пользователя
     """
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     
     if not user:
         raise HTTPException(
@@ -110,7 +143,7 @@ async def get_user(
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_admin)
 ):
     """
@@ -124,7 +157,7 @@ async def update_user(
     - **role**: Новая роль (опционально)
     - **verified**: Статус верификации (опционально)
     """
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     
     if not user:
         raise HTTPException(
@@ -135,10 +168,10 @@ async def update_user(
     # Обновление полей
     if user_data.email is not None:
         # Проверка уникальности email
-        existing = db.query(UserModel).filter(
+        existing = (await db.execute(select(UserModel).where(
             UserModel.email == user_data.email,
             UserModel.id != user_id
-        ).first()
+        ))).scalars().first()
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -155,10 +188,11 @@ async def update_user(
     if user_data.verified is not None:
         user.verified = user_data.verified
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate_user(user_id)
     try:
-        write_audit(db, user_id=current_user.id, action="update", entity="user", entity_id=user_id, meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="update", entity="user", entity_id=user_id, meta={"email": current_user.email})
     except Exception:
         pass
     return User.model_validate(user)
@@ -167,7 +201,7 @@ async def update_user(
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Удалить пользователя")
 async def delete_user(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_admin)
 ):
     """
@@ -185,7 +219,7 @@ async def delete_user(
             detail="Нельзя удалить самого себя"
         )
     
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     
     if not user:
         raise HTTPException(
@@ -193,10 +227,11 @@ async def delete_user(
             detail="Пользователь не найден"
         )
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    principal_cache.invalidate_user(user_id)
     try:
-        write_audit(db, user_id=current_user.id, action="delete", entity="user", entity_id=user_id, meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="delete", entity="user", entity_id=user_id, meta={"email": current_user.email})
     except Exception:
         pass
     return None
@@ -210,55 +245,20 @@ class PasswordUpdate(BaseModel):
 async def change_password(
     user_id: str,
     payload: PasswordUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_admin)
 ):
     """Смена пароля (только админ). Пароль хешируется bcrypt и сохраняется как hashed_password."""
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    # Хэш — до обращения к БД, чтобы не держать соединение на время bcrypt
+    hashed_password = await password_hasher.hash(payload.new_password)
+    user = await db.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
-    user.hashed_password = AuthService.get_password_hash(payload.new_password)
-    db.commit()
+    user.hashed_password = hashed_password
+    await db.commit()
+    principal_cache.invalidate_user(user_id)
     try:
-        write_audit(db, user_id=current_user.id, action="change_password", entity="user", entity_id=user_id, meta={"email": current_user.email})
+        await write_audit(db, user_id=current_user.id, action="change_password", entity="user", entity_id=user_id, meta={"email": current_user.email})
     except Exception:
         pass
     return None
-
-
-class AuditSummaryItem(BaseModel):
-    user_id: str
-    last_update: str | None = None
-    last_password_change: str | None = None
-
-
-@router.get("/audit-summary", summary="Сводка аудита по пользователям")
-async def audit_summary(db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_admin)):
-    # Последний update
-    updates = (
-        db.query(AuditLog.entity_id, func.max(AuditLog.created_at))
-        .filter(AuditLog.entity == "user", AuditLog.action == "update")
-        .group_by(AuditLog.entity_id)
-        .all()
-    )
-    updates_map = {uid: ts.isoformat() if ts else None for uid, ts in updates}
-
-    # Последняя смена пароля
-    pw = (
-        db.query(AuditLog.entity_id, func.max(AuditLog.created_at))
-        .filter(AuditLog.entity == "user", AuditLog.action == "change_password")
-        .group_by(AuditLog.entity_id)
-        .all()
-    )
-    pw_map = {uid: ts.isoformat() if ts else None for uid, ts in pw}
-
-    result = []
-    for u in db.query(UserModel.id).all():
-        uid = u[0]
-        result.append({
-            "user_id": uid,
-            "last_update": updates_map.get(uid),
-            "last_password_change": pw_map.get(uid),
-        })
-    return result
-
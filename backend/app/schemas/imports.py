@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class ImportSummary(BaseModel):
+    parsed: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    errors: int = 0
+    chunks: int = 0
+
+
+class ImportJob(BaseModel):
+    id: str
+    owner_id: str
+    collection: str
+    filename: Optional[str] = None
+    status: str
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+    rows_skipped: int = 0
+    errors: int = 0
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SyncSummary(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    skipped: int = 0
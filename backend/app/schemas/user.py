@@ -52,4 +52,5 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     """Данные из токена"""
     user_id: Optional[str] = None
+    expires_at: Optional[float] = None  # exp токена, unix time
 
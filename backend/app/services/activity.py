@@ -0,0 +1,84 @@
+"""
+Учёт последней активности пользователей (users.last_login) без записи на каждый запрос.
+
+Аутентифицированный запрос только отмечает время в памяти процесса; фоновый
+таск раз в `activity_flush_interval` секунд пишет накопленное одним executemany —
+не чаще раза в интервал на пользователя. Читающие запросы не открывают
+транзакцию записи и не конкурируют с импортами за блокировку SQLite.
+
+Запись last_login не меняет updated_at и версию коллекции users
+(services/versions.py): ETag списка пользователей от активности не сбрасывается.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import bindparam, or_, update
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: str, when: Optional[datetime] = None) -> None:
+        # naive UTC — как у остальных меток времени
+        self._pending[user_id] = when or datetime.utcnow()
+
+    def last_seen(self, user_id: str) -> Optional[datetime]:
+        """Отмеченное, но ещё не записанное время активности"""
+        return self._pending.get(user_id)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("last_login flush failed")
+
+    async def flush(self) -> int:
+        """Пишет накопленные отметки; при ошибке возвращает их в очередь"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        table = User.__table__
+        # другой воркер мог уже записать более позднее время — его не затираем
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .where(or_(table.c.last_login.is_(None), table.c.last_login < bindparam("_seen", type_=table.c.last_login.type)))
+            # updated_at — время правки пользователя, а не его активности: onupdate здесь не нужен
+            .values(last_login=bindparam("_seen", type_=table.c.last_login.type), updated_at=table.c.updated_at)
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, [{"_id": user_id, "_seen": seen} for user_id, seen in batch.items()])
+                await db.commit()
+        except Exception:
+            for user_id, seen in batch.items():
+                if self._pending.get(user_id, seen) <= seen:
+                    self._pending[user_id] = seen
+            raise
+        return len(batch)
+
+
+tracker = ActivityTracker(settings.activity_flush_interval)
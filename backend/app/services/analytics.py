@@ -0,0 +1,190 @@
+"""
+Агрегаты для дашборда в SQL: группировки, суммы и помесячные ряды по JSON-коллекциям.
+
+Клиент получает сотни байт вместо всех строк коллекций. Ответ кэшируется в
+процессе по версиям участвующих коллекций (services/versions.py): пока в них не
+было записи, повторный запрос не выполняет агрегацию, а браузер получает 304.
+
+Как значения берутся из `data` — в services/dimensions.py. Для pipeline и deals
+стандартные группировки, помесячный ряд и KPI читаются из материализованных
+итогов (services/kpi_groups.py) — O(групп) вместо прохода по строкам; остальные
+коллекции и произвольные ключи считаются по строкам, итоги складываются.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Sequence
+
+import orjson
+from fastapi import Request, Response
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.advisors import Advisor
+from ..models.companies import CompanyToReach
+from ..models.deal import Deal
+from ..models.investors import Investor
+from ..models.pipeline import PipelineItem
+from ..models.user import User
+from .dimensions import DEFAULT_DATE, DEFAULT_SUM, OWNER, dimension, month, number, text_value
+from .kpi_groups import MONTH, covers, covers_monthly, read_kpi_groups
+from .versions import cache_headers, collections_version, not_modified
+
+# коллекция API -> модель с JSON-колонкой data
+ANALYTICS_COLLECTIONS = {
+    "pipeline": PipelineItem,
+    "companies": CompanyToReach,
+    "advisors": Advisor,
+    "investors": Investor,
+    "deals": Deal,
+}
+# Листы, из которых дашборд собирает сделки
+DASHBOARD_COLLECTIONS = ("pipeline", "companies", "advisors", "investors")
+
+# Ключи, из которых дашборд собирает уникальные контакты
+CONTACT_KEYS = ("Source Name", "Contacted person", "Contact persons", "Investor")
+
+CACHE_SIZE = 256
+
+
+def _union(collections: Sequence[str], columns: Callable):
+    """UNION ALL одинаковых выборок по коллекциям -> подзапрос"""
+    selects = [select(*columns(ANALYTICS_COLLECTIONS[name])) for name in collections]
+    return (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+
+def _merge(groups: dict, rows) -> None:
+    for key, count, total in rows:
+        current = groups.get(key, (0, 0.0))
+        groups[key] = (current[0] + count, current[1] + (total or 0.0))
+
+
+async def _groups(db: AsyncSession, collections: Sequence[str], by: str, sum_key: Optional[str], expression, materialized) -> dict:
+    """key -> (count, sum): из итогов для коллекций, где materialized(name), остальные — по строкам"""
+    groups: dict = {}
+    direct = []
+    for name in collections:
+        if materialized(name):
+            _merge(groups, await read_kpi_groups(db, name, by))
+        else:
+            direct.append(name)
+    if direct:
+        rows = _union(direct, lambda m: (
+            expression(m).label("key"),
+            (number(m, sum_key) if sum_key else literal(0.0)).label("value"),
+        ))
+        _merge(groups, (await db.execute(
+            select(rows.c.key, func.count(), func.sum(rows.c.value)).group_by(rows.c.key)
+        )).all())
+    return groups
+
+
+async def group_totals(db: AsyncSession, collections: Sequence[str], by: str, sum_key: Optional[str] = None) -> list[dict]:
+    """[{key, count[, sum]}] по убыванию count; key = None — значение не заполнено"""
+    groups = await _groups(
+        db, collections, by, sum_key,
+        lambda m: dimension(m, by),
+        lambda name: covers(name, by, sum_key),
+    )
+    # порядок как ORDER BY count DESC, key в SQLite: NULL первым среди равных
+    ordered = sorted(groups.items(), key=lambda item: (-item[1][0], item[0] is not None, item[0] or ""))
+    if sum_key:
+        return [{"key": key, "count": count, "sum": total} for key, (count, total) in ordered]
+    return [{"key": key, "count": count} for key, (count, _) in ordered]
+
+
+async def owner_totals(db: AsyncSession, collections: Sequence[str], sum_key: Optional[str] = None) -> list[dict]:
+    """Итоги по владельцам записей с именем и email владельца"""
+    groups = await group_totals(db, collections, OWNER, sum_key)
+    ids = [g["key"] for g in groups if g["key"] is not None]
+    users = {}
+    if ids:
+        users = {r.id: r for r in (await db.execute(select(User.id, User.name, User.email).where(User.id.in_(ids)))).all()}
+    for group in groups:
+        owner = users.get(group["key"])
+        group["name"] = owner.name if owner else None
+        group["email"] = owner.email if owner else None
+    return groups
+
+
+async def monthly_series(db: AsyncSession, collections: Sequence[str], date_key: str, sum_key: Optional[str] = None) -> list[dict]:
+    """[{month: "YYYY-MM", count[, sum]}] по возрастанию месяца; строки без даты не учитываются"""
+    groups = await _groups(
+        db, collections, MONTH, sum_key,
+        lambda m: month(m, date_key),
+        lambda name: covers_monthly(name, date_key, sum_key),
+    )
+    groups.pop(None, None)
+    if sum_key:
+        return [{"month": key, "count": count, "sum": total} for key, (count, total) in sorted(groups.items())]
+    return [{"month": key, "count": count} for key, (count, _) in sorted(groups.items())]
+
+
+async def kpi(db: AsyncSession, collections: Sequence[str], sum_key: str) -> dict:
+    """{count, total, avg} — как kpi() в utils/analytics.ts"""
+    # любая группировка покрывает все строки; status — с итогами для pipeline/deals
+    groups = await group_totals(db, collections, "status", sum_key)
+    count = sum(g["count"] for g in groups)
+    total = sum(g["sum"] for g in groups)
+    return {"count": count, "total": total, "avg": total / count if count else 0.0}
+
+
+async def dashboard(db: AsyncSession, collections: Sequence[str] = DASHBOARD_COLLECTIONS) -> dict:
+    """Всё, что показывает Dashboard: число сделок и контактов и четыре разбивки"""
+    contacts = union_all(*(
+        select(text_value(ANALYTICS_COLLECTIONS[name], key).label("contact"))
+        for name in collections for key in CONTACT_KEYS
+    )).subquery()
+    unique_contacts = (await db.execute(select(func.count(func.distinct(contacts.c.contact))))).scalar()
+    result = {"contacts": unique_contacts}
+    for by in ("responsible", "sector", "status", "type"):
+        result[f"by_{by}"] = await group_totals(db, collections, by)
+    result["deals"] = sum(g["count"] for g in result["by_status"])
+    return result
+
+
+class AnalyticsCache:
+    """ETag -> готовое тело ответа; LRU на size записей"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._entries.get(etag)
+        if body is not None:
+            self._entries.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        self._entries[etag] = body
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+analytics_cache = AnalyticsCache(CACHE_SIZE)
+
+
+async def cached_response(
+    db: AsyncSession, request: Request, collections: Sequence[str], compute: Callable[[], Awaitable]
+) -> Response:
+    """JSON-ответ агрегата: 304 / тело из кэша / расчёт — по ETag из версий коллекций и запроса"""
+    version = await collections_version(db, collections)
+    etag = None
+    if version is not None:
+        variant = hashlib.blake2b(f"{request.url.path}?{request.url.query}|{version}".encode(), digest_size=8).hexdigest()
+        etag = f'"an-{variant}"'
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        body = analytics_cache.get(etag)
+        if body is not None:
+            return Response(content=body, media_type="application/json", headers=cache_headers(etag))
+    body = orjson.dumps(await compute())
+    if etag is None:
+        return Response(content=body, media_type="application/json")
+    analytics_cache.put(etag, body)
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag))
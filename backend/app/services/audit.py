@@ -1,26 +1,254 @@
+"""
+Журнал аудита с отложенной пакетной записью.
+
+write_audit только кладёт событие в очередь процесса — запрос не открывает
+вторую транзакцию записи после своей. Фоновый таск раз в `audit_flush_interval`
+секунд (или раньше, если накопилось `audit_batch_size` событий) пишет очередь
+многострочными INSERT по `audit_batch_size` строк в помесячные партиции
+(services/audit_store.py). При остановке сервера очередь дописывается в lifespan.
+Тот же таск раз в сутки выгружает в архив месяцы старше `audit_retention_months`.
+
+Пакет, который не записался `audit_max_attempts` раз подряд (например, из-за
+события, которое не принимает БД), не задерживает очередь: он дописывается в
+`audit-dead-letter.jsonl` в каталоге архива (по событию на строку) и
+отбрасывается, запись продолжается со следующего пакета.
+
+Очередь ограничена `audit_queue_size`. Если запись не успевает:
+  drop  — новое событие отбрасывается (счётчик dropped в /health)
+  block — запрос ждёт места до `audit_block_timeout` секунд, затем отбрасывает
+
+Сводку для /api/users/audit-summary ведут триггеры SQLite на вставку в партиции:
+в `audit_rollup` на пару (user_id, action) — время последнего события и их число.
+side='actor' — кто действовал (user_id), side='target' — над каким
+пользователем (entity='user', entity_id). Сводка читает только эту таблицу —
+время ответа не зависит от размера журнала; архивация старых месяцев её не трогает.
+"""
+import asyncio
+import logging
+import os
 import uuid
-from sqlalchemy.orm import Session
-from ..models.audit import AuditLog
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import DateTime, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database import async_engine
+from ..models.user import User
+from .audit_store import ROLLUP_TABLE, archive_dir, archive_expired, remember_strings, write_events
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop", "block")
+# первая архивация — вскоре после старта, затем раз в сутки
+ARCHIVE_DELAY = 60.0
+ARCHIVE_INTERVAL = 24 * 3600.0
+DEAD_LETTER_FILE = "audit-dead-letter.jsonl"
+
+# поле сводки -> (side, action)
+SUMMARY_FIELDS = {
+    "last_import": ("actor", "import"),
+    "last_update": ("actor", "update"),
+    "last_delete": ("actor", "delete"),
+    "last_export": ("actor", "export"),
+    "last_password_change": ("target", "change_password"),
+}
+
+
+class AuditSink:
+    def __init__(
+        self,
+        interval: float,
+        size: int,
+        batch: int,
+        overflow: str = "drop",
+        block_timeout: float = 1.0,
+        max_attempts: int = 5,
+        dead_letter: Optional[str] = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"audit overflow policy must be one of {OVERFLOW_POLICIES}")
+        self.interval = interval
+        self.size = size
+        self.batch = batch
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_attempts = max_attempts
+        # None — audit-dead-letter.jsonl в каталоге архива журнала
+        self.dead_letter = dead_letter
+        self._buffer: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # id первого события пакета, который не записался, и число неудачных попыток подряд
+        self._failed_head: Optional[str] = None
+        self._attempts = 0
+        self.written = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+
+    def start(self) -> None:
+        # события привязываются к циклу при первом ожидании — создаём их в цикле сервера
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def put(self, event: dict) -> bool:
+        """Ставит событие в очередь; False — событие отброшено"""
+        if self._task is None:
+            # без фонового таска (скрипты, тесты без lifespan) — пишем сразу
+            self._buffer.append(event)
+            await self.flush()
+            return True
+        if len(self._buffer) >= self.size and self.overflow == "block":
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._wait_space(), self.block_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if len(self._buffer) >= self.size:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("audit queue full, %d events dropped so far", self.dropped)
+            return False
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch:
+            self._wakeup.set()
+        return True
+
+    async def _wait_space(self) -> None:
+        while len(self._buffer) >= self.size:
+            self._drained.clear()
+            await self._drained.wait()
+
+    async def _loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_archive = loop.time() + ARCHIVE_DELAY
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("audit flush failed")
+            if settings.audit_retention_months > 0 and loop.time() >= next_archive:
+                next_archive = loop.time() + ARCHIVE_INTERVAL
+                try:
+                    # gzip и чтение партиции — в потоке, на синхронном движке
+                    archived = await asyncio.to_thread(archive_expired)
+                    if archived:
+                        logger.info("audit partitions archived: %s", ", ".join(archived))
+                except Exception:
+                    logger.exception("audit archive failed")
 
+    async def flush(self) -> int:
+        """Пишет очередь пакетами. Непринятый пакет возвращается в начало очереди,
+        после max_attempts неудач подряд — уходит в dead letter."""
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch, len(self._buffer)))]
+            try:
+                async with async_engine.begin() as conn:
+                    fresh = await conn.run_sync(write_events, batch)
+            except Exception:
+                if self._failed(batch[0]["id"]) < self.max_attempts:
+                    self._buffer.extendleft(reversed(batch))
+                    raise
+                logger.exception("audit batch of %d events failed %d times, moved to dead letter", len(batch), self._attempts)
+                self._failed_head, self._attempts = None, 0
+                self._dead_letter(batch)
+                self._drained.set()
+                continue
+            except BaseException:
+                self._buffer.extendleft(reversed(batch))
+                raise
+            remember_strings(fresh)
+            self._failed_head, self._attempts = None, 0
+            written += len(batch)
+            self.written += len(batch)
+            self._drained.set()
+        return written
 
-def write_audit(db: Session, *, user_id: str | None, action: str, entity: str, entity_id: str | None = None, ip: str | None = None, ua: str | None = None, meta: dict | None = None):
-    log = AuditLog(
-        id=f"al_{uuid.uuid4().hex[:12]}",
-        user_id=user_id,
-        action=action,
-        entity=entity,
-        entity_id=entity_id,
-        ip=ip,
-        ua=ua,
-        meta=meta or {},
-    )
-    db.add(log)
-    db.commit()
+    def _failed(self, head: str) -> int:
+        """Учитывает неудачу пакета с первым событием head; -> число неудач подряд"""
+        if self._failed_head != head:
+            self._failed_head, self._attempts = head, 0
+        self._attempts += 1
+        return self._attempts
 
+    def _dead_letter(self, batch: list[dict]) -> None:
+        path = self.dead_letter or os.path.join(archive_dir(), DEAD_LETTER_FILE)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "ab") as out:
+                out.write(b"".join(orjson.dumps(event, default=str) + b"\n" for event in batch))
+        except OSError:
+            logger.exception("audit dead letter %s is not writable, %d events lost", path, len(batch))
+            self.dropped += len(batch)
+            return
+        self.dead_lettered += len(batch)
 
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+            "overflow": self.overflow,
+        }
 
 
+audit_sink = AuditSink(
+    settings.audit_flush_interval,
+    settings.audit_queue_size,
+    settings.audit_batch_size,
+    settings.audit_overflow,
+    settings.audit_block_timeout,
+    settings.audit_max_attempts,
+)
 
 
+async def write_audit(db: AsyncSession, *, user_id: str | None, action: str, entity: str, entity_id: str | None = None, ip: str | None = None, ua: str | None = None, meta: dict | None = None):
+    """Ставит событие аудита в очередь записи. db не используется — событие пишет audit_sink
+    в своей сессии, поэтому транзакция запроса здесь не коммитится."""
+    await audit_sink.put({
+        "id": f"al_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "action": action,
+        "entity": entity,
+        "entity_id": entity_id,
+        "ip": ip,
+        "ua": ua,
+        "meta": meta or {},
+        # время события, а не записи пакета; naive UTC — как server_default
+        "created_at": datetime.utcnow(),
+    })
 
 
+async def audit_summary_rows(db: AsyncSession) -> list[dict]:
+    """По каждому пользователю — время последнего импорта, изменения, удаления, экспорта и смены пароля"""
+    rollup = (await db.execute(
+        text(f"SELECT user_id, action, side, last_at FROM {ROLLUP_TABLE}").columns(last_at=DateTime)
+    )).all()
+    last = {(row.user_id, row.side, row.action): row.last_at for row in rollup}
+    result = []
+    for (uid,) in (await db.execute(select(User.id))).all():
+        item = {"user_id": uid}
+        for field, (side, action) in SUMMARY_FIELDS.items():
+            ts = last.get((uid, side, action))
+            item[field] = ts.isoformat() if ts else None
+        result.append(item)
+    return result
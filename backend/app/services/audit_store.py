@@ -0,0 +1,431 @@
+"""
+Хранилище журнала аудита: помесячные партиции, словарь строк, архив.
+
+Событие пишется в таблицу своего месяца `audit_logs_YYYYMM` (создаётся при первой
+записи). ip, user-agent и email действующего пользователя (meta["email"])
+повторяются от события к событию — в строке хранится только их id из
+`audit_strings`, при чтении значения подставляются обратно.
+
+Запрос за период читает только партиции попавших в него месяцев. Месяцы старше
+`audit_retention_months` выгружаются в `audit-YYYY-MM.jsonl.gz` (по событию на
+строку, в исходном виде; повторная выгрузка месяца — `audit-YYYY-MM-2.jsonl.gz`
+и т. д.) в `audit_archive_dir`, после чего таблица удаляется:
+основная БД хранит только свежие месяцы. Освобождённые страницы SQLite
+переиспользует под новые записи.
+
+Сводку по пользователям (`audit_rollup`) ведут триггеры на вставку в каждую
+партицию; архивация её не меняет.
+
+Выгрузка вручную: python -m app.services.audit_store archive
+"""
+import gzip
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+import orjson
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from ..config import settings
+from ..models.audit import AUDIT_PARTITION_PREFIX, AuditString, audit_partition
+
+ROLLUP_TABLE = "audit_rollup"
+LEGACY_TABLE = "audit_logs"
+ARCHIVE_SUFFIX = ".jsonl.gz"
+
+STRINGS_CACHE_SIZE = 10000
+
+# партиции, созданные этим процессом или найденные при старте
+_known_months: set[str] = set()
+# (kind, value) -> id в audit_strings; только закоммиченные строки (remember_strings),
+# id не меняются, кэш только растёт до предела
+_string_ids: dict[tuple[str, str], int] = {}
+
+
+def month_of(ts: datetime) -> str:
+    return f"{ts.year:04d}{ts.month:02d}"
+
+
+def _shift_month(month: str, delta: int) -> str:
+    index = int(month[:4]) * 12 + int(month[4:]) - 1 + delta
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+def list_partitions(conn: Connection) -> list[str]:
+    """Месяцы существующих партиций по возрастанию"""
+    months = []
+    for name in inspect(conn).get_table_names():
+        month = name[len(AUDIT_PARTITION_PREFIX):]
+        if name.startswith(AUDIT_PARTITION_PREFIX) and len(month) == 6 and month.isdigit():
+            months.append(month)
+    return sorted(months)
+
+
+def archive_dir(cfg=settings) -> str:
+    """По умолчанию — audit-archive рядом с файлом SQLite-БД"""
+    if cfg.audit_archive_dir:
+        return cfg.audit_archive_dir
+    url = cfg.database_url
+    if url.startswith("sqlite:///") and ":memory:" not in url:
+        return os.path.join(os.path.dirname(os.path.abspath(url[len("sqlite:///"):])), "audit-archive")
+    return os.path.abspath("audit-archive")
+
+
+# --- сводка по пользователям --------------------------------------------------
+
+def _rollup_upsert(user_id: str, side: str) -> str:
+    return (
+        f"INSERT INTO {ROLLUP_TABLE}(user_id, action, side, last_at, count) "
+        f"VALUES ({user_id}, NEW.action, '{side}', NEW.created_at, 1) "
+        "ON CONFLICT(user_id, action, side) DO UPDATE SET "
+        "last_at = max(coalesce(last_at, ''), coalesce(excluded.last_at, '')), count = count + 1;"
+    )
+
+
+def _rollup_triggers(table: str) -> list[str]:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_actor_ai_{table} AFTER INSERT ON {table} "
+        f"WHEN NEW.user_id IS NOT NULL BEGIN {_rollup_upsert('NEW.user_id', 'actor')} END",
+        f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_target_ai_{table} AFTER INSERT ON {table} "
+        f"WHEN NEW.entity = 'user' AND NEW.entity_id IS NOT NULL BEGIN {_rollup_upsert('NEW.entity_id', 'target')} END",
+    ]
+
+
+def _rollup_backfill(conn: Connection, table: str) -> None:
+    merge = (
+        "ON CONFLICT(user_id, action, side) DO UPDATE SET "
+        "last_at = max(coalesce(last_at, ''), coalesce(excluded.last_at, '')), count = count + excluded.count"
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO {ROLLUP_TABLE}(user_id, action, side, last_at, count) "
+        f"SELECT user_id, action, 'actor', max(created_at), count(*) FROM {table} "
+        f"WHERE user_id IS NOT NULL GROUP BY user_id, action {merge}"
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO {ROLLUP_TABLE}(user_id, action, side, last_at, count) "
+        f"SELECT entity_id, action, 'target', max(created_at), count(*) FROM {table} "
+        f"WHERE entity = 'user' AND entity_id IS NOT NULL GROUP BY entity_id, action {merge}"
+    )
+
+
+# --- партиции ------------------------------------------------------------------
+
+def ensure_partition(conn: Connection, month: str, triggers: bool = True) -> None:
+    if month in _known_months:
+        return
+    table = audit_partition(month)
+    table.create(conn, checkfirst=True)
+    if triggers and conn.dialect.name == "sqlite":
+        for stmt in _rollup_triggers(table.name):
+            conn.exec_driver_sql(stmt)
+    _known_months.add(month)
+
+
+def _migrate_legacy(conn: Connection) -> None:
+    """Переносит строки прежней единой таблицы audit_logs по партициям и удаляет её"""
+    for kind, expr in (("ip", "ip"), ("ua", "ua"), ("email", "json_extract(meta, '$.email')")):
+        conn.exec_driver_sql(
+            f"INSERT INTO audit_strings(kind, value) SELECT DISTINCT '{kind}', {expr} FROM {LEGACY_TABLE} "
+            f"WHERE {expr} IS NOT NULL ON CONFLICT(kind, value) DO NOTHING"
+        )
+    month_expr = "coalesce(strftime('%Y%m', created_at), strftime('%Y%m', 'now'))"
+    months = [m for (m,) in conn.exec_driver_sql(f"SELECT DISTINCT {month_expr} FROM {LEGACY_TABLE}")]
+    for month in months:
+        ensure_partition(conn, month, triggers=False)
+        conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO {AUDIT_PARTITION_PREFIX}{month}"
+            "(id, user_id, action, entity, entity_id, ip_id, ua_id, email_id, meta, created_at) "
+            "SELECT l.id, l.user_id, l.action, l.entity, l.entity_id, "
+            "(SELECT id FROM audit_strings WHERE kind = 'ip' AND value = l.ip), "
+            "(SELECT id FROM audit_strings WHERE kind = 'ua' AND value = l.ua), "
+            "(SELECT id FROM audit_strings WHERE kind = 'email' AND value = json_extract(l.meta, '$.email')), "
+            "json_remove(l.meta, '$.email'), coalesce(l.created_at, datetime('now')) "
+            f"FROM {LEGACY_TABLE} l WHERE {month_expr} = ?",
+            (month,),
+        )
+    conn.exec_driver_sql(f"DROP TABLE {LEGACY_TABLE}")
+
+
+def install_audit_storage(conn: Connection) -> None:
+    """Переносит старый журнал в партиции, создаёт audit_rollup и триггеры сводки.
+
+    Триггеры на время переноса снимаются: сводка, уже учитывающая старые строки,
+    не должна посчитать их второй раз. Новая audit_rollup заполняется из партиций.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    _known_months.clear()
+    for (name,) in conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", (f"{ROLLUP_TABLE}_%",)
+    ).all():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    rollup_missing = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_TABLE,)
+    ).first() is None
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} ("
+        "user_id TEXT NOT NULL, action TEXT NOT NULL, side TEXT NOT NULL, last_at TEXT, "
+        "count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (user_id, action, side))"
+    )
+    if inspect(conn).has_table(LEGACY_TABLE):
+        _migrate_legacy(conn)
+    for month in list_partitions(conn):
+        table = AUDIT_PARTITION_PREFIX + month
+        if rollup_missing:
+            _rollup_backfill(conn, table)
+        for stmt in _rollup_triggers(table):
+            conn.exec_driver_sql(stmt)
+        _known_months.add(month)
+
+
+# --- запись ----------------------------------------------------------------------
+
+def _string_id_map(conn: Connection, keys: set[tuple[str, str]]) -> tuple[dict[tuple[str, str], int], dict[tuple[str, str], int]]:
+    """-> (id всех ключей, id прочитанных из БД). Прочитанные в кэш не кладутся:
+    транзакция ещё может откатиться, и SQLite отдаст те же rowid другим строкам."""
+    missing = [key for key in keys if key not in _string_ids]
+    fresh: dict[tuple[str, str], int] = {}
+    if missing:
+        conn.execute(
+            text("INSERT INTO audit_strings(kind, value) VALUES (:kind, :value) ON CONFLICT(kind, value) DO NOTHING"),
+            [{"kind": kind, "value": value} for kind, value in missing],
+        )
+        strings = AuditString.__table__
+        for kind in {kind for kind, _ in missing}:
+            values = [value for k, value in missing if k == kind]
+            rows = conn.execute(
+                select(strings.c.id, strings.c.value).where(strings.c.kind == kind, strings.c.value.in_(values))
+            )
+            for string_id, value in rows:
+                fresh[(kind, value)] = string_id
+    return {key: fresh[key] if key in fresh else _string_ids[key] for key in keys}, fresh
+
+
+def remember_strings(ids: dict[tuple[str, str], int]) -> None:
+    """Кладёт id строк в кэш — только после коммита транзакции, которая их записала"""
+    if len(_string_ids) + len(ids) > STRINGS_CACHE_SIZE:
+        # кэш переполнен — начинаем заново
+        _string_ids.clear()
+    if len(ids) <= STRINGS_CACHE_SIZE:
+        _string_ids.update(ids)
+
+
+def write_events(conn: Connection, events: list[dict]) -> dict[tuple[str, str], int]:
+    """Пишет события (поля как у write_audit) в партиции их месяцев, строки — через словарь.
+
+    -> id строк, впервые прочитанных из audit_strings; после коммита их можно
+    передать в remember_strings, чтобы следующие пакеты не читали их заново.
+    """
+    keys = set()
+    for event in events:
+        email = (event.get("meta") or {}).get("email")
+        for kind, value in (("ip", event.get("ip")), ("ua", event.get("ua")), ("email", email)):
+            if isinstance(value, str):
+                keys.add((kind, value))
+    ids, fresh = _string_id_map(conn, keys) if keys else ({}, {})
+    by_month: dict[str, list[dict]] = {}
+    for event in events:
+        meta = dict(event.get("meta") or {})
+        email = meta.pop("email", None) if isinstance(meta.get("email"), str) else None
+        row = {
+            "id": event["id"],
+            "user_id": event.get("user_id"),
+            "action": event["action"],
+            "entity": event["entity"],
+            "entity_id": event.get("entity_id"),
+            "ip_id": ids.get(("ip", event.get("ip"))),
+            "ua_id": ids.get(("ua", event.get("ua"))),
+            "email_id": ids.get(("email", email)),
+            "meta": meta,
+            "created_at": event["created_at"],
+        }
+        by_month.setdefault(month_of(event["created_at"]), []).append(row)
+    for month, rows in by_month.items():
+        ensure_partition(conn, month)
+        try:
+            conn.execute(insert(audit_partition(month)).values(rows))
+        except OperationalError as exc:
+            if "no such table" not in str(exc.orig):
+                raise
+            # партицию выгрузил и удалил другой воркер (поздние события в архивном месяце):
+            # кэш этого процесса устарел — создаём таблицу заново
+            _known_months.discard(month)
+            ensure_partition(conn, month)
+            conn.execute(insert(audit_partition(month)).values(rows))
+    return fresh
+
+
+# --- чтение --------------------------------------------------------------------------
+
+def _decoded_query(month: str):
+    table = audit_partition(month)
+    strings = AuditString.__table__
+    ip, ua, email = strings.alias("ip"), strings.alias("ua"), strings.alias("email")
+    return table, select(
+        table.c.id, table.c.user_id, table.c.action, table.c.entity, table.c.entity_id,
+        ip.c.value.label("ip"), ua.c.value.label("ua"), email.c.value.label("email"),
+        table.c.meta, table.c.created_at,
+    ).select_from(
+        table.outerjoin(ip, ip.c.id == table.c.ip_id)
+        .outerjoin(ua, ua.c.id == table.c.ua_id)
+        .outerjoin(email, email.c.id == table.c.email_id)
+    )
+
+
+def _event(row) -> dict:
+    meta = dict(row.meta or {})
+    if row.email is not None:
+        meta["email"] = row.email
+    return {
+        "id": row.id, "user_id": row.user_id, "action": row.action, "entity": row.entity,
+        "entity_id": row.entity_id, "ip": row.ip, "ua": row.ua, "meta": meta,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def read_events(
+    conn: Connection,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    **filters: Optional[str],
+) -> list[dict]:
+    """События за [since, until) от новых к старым; читаются только партиции этих месяцев.
+
+    filters — равенства по user_id, action, entity, entity_id (None — без условия).
+    """
+    since, until = _naive_utc(since), _naive_utc(until)
+    first = month_of(since) if since is not None else None
+    # until не включается: 2025-05-01T00:00 — это ещё апрель
+    last = month_of(until - timedelta(microseconds=1)) if until is not None else None
+    months = [m for m in list_partitions(conn) if (first is None or m >= first) and (last is None or m <= last)]
+    result: list[dict] = []
+    for month in reversed(months):
+        table, query = _decoded_query(month)
+        for column, value in filters.items():
+            if value is not None:
+                query = query.where(table.c[column] == value)
+        if since is not None:
+            query = query.where(table.c.created_at >= since)
+        if until is not None:
+            query = query.where(table.c.created_at < until)
+        rows = conn.execute(query.order_by(table.c.created_at.desc(), table.c.id.desc()).limit(limit - len(result)))
+        result.extend(_event(row) for row in rows)
+        if len(result) >= limit:
+            break
+    return result
+
+
+# --- архив ------------------------------------------------------------------------------
+
+def _write_archive(conn: Connection, month: str, directory: str) -> tuple[str, int]:
+    """Выгружает партицию во временный файл рядом с архивом -> (путь, число событий)"""
+    tmp = os.path.join(directory, f"audit-{month[:4]}-{month[4:]}.{os.getpid()}.tmp")
+    table, query = _decoded_query(month)
+    result = conn.execution_options(stream_results=True).execute(query.order_by(table.c.created_at, table.c.id))
+    count = 0
+    with gzip.open(tmp, "wb") as out:
+        for rows in result.partitions(1000):
+            out.write(b"".join(orjson.dumps(_event(row)) + b"\n" for row in rows))
+            count += len(rows)
+    return tmp, count
+
+
+def _publish_archive(tmp: str, month: str, directory: str) -> str:
+    """Переносит выгрузку под свободное имя: audit-YYYY-MM.jsonl.gz, затем audit-YYYY-MM-2.jsonl.gz, ...
+
+    Месяц выгружается повторно, если после архивации в него дописали поздние
+    события, — прежний архив не перезаписывается. os.link не заменяет
+    существующий файл, так что два воркера не займут одно имя.
+    """
+    base = os.path.join(directory, f"audit-{month[:4]}-{month[4:]}")
+    n = 1
+    while True:
+        path = f"{base}{ARCHIVE_SUFFIX}" if n == 1 else f"{base}-{n}{ARCHIVE_SUFFIX}"
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            n += 1
+            continue
+        os.unlink(tmp)
+        return path
+
+
+def _lock_for_write(conn: Connection) -> None:
+    """Занимает блокировку записи SQLite до конца транзакции.
+
+    pysqlite открывает транзакцию только перед DML — пустой DELETE её начинает.
+    """
+    conn.exec_driver_sql("DELETE FROM audit_strings WHERE 0")
+
+
+def _archive_month(conn: Connection, month: str, directory: str) -> Optional[str]:
+    # выгрузка идёт без блокировки — запись журнала в другие месяцы не ждёт gzip
+    tmp, count = _write_archive(conn, month, directory)
+    try:
+        _lock_for_write(conn)
+        table = f"{AUDIT_PARTITION_PREFIX}{month}"
+        if month not in list_partitions(conn):
+            # месяц уже выгрузил другой воркер
+            os.unlink(tmp)
+            return None
+        if conn.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar() != count:
+            # за время выгрузки в месяц дописали события — выгружаем заново, уже под блокировкой
+            os.unlink(tmp)
+            tmp, _ = _write_archive(conn, month, directory)
+        conn.exec_driver_sql(f"DROP TABLE {table}")
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return _publish_archive(tmp, month, directory)
+
+
+def archive_partitions(conn: Connection, retention_months: int, directory: str, now: Optional[datetime] = None) -> list[str]:
+    """Выгружает и удаляет партиции старше retention_months месяцев (текущий считается); 0 — хранить всё"""
+    if retention_months <= 0:
+        return []
+    oldest_kept = _shift_month(month_of(now or datetime.utcnow()), 1 - retention_months)
+    expired = [m for m in list_partitions(conn) if m < oldest_kept]
+    if not expired:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for month in expired:
+        path = _archive_month(conn, month, directory)
+        _known_months.discard(month)
+        if path is not None:
+            paths.append(path)
+    return paths
+
+
+def read_archive(path: str) -> Iterable[dict]:
+    with gzip.open(path, "rb") as source:
+        for line in source:
+            yield orjson.loads(line)
+
+
+def archive_expired(cfg=settings) -> list[str]:
+    """Архивация по настройкам на синхронном движке — для фонового потока и CLI"""
+    from ..database import engine
+
+    with engine.begin() as conn:
+        return archive_partitions(conn, cfg.audit_retention_months, archive_dir(cfg))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["archive"]:
+        sys.exit("usage: python -m app.services.audit_store archive")
+    archived = archive_expired()
+    print(f"✓ Архивировано партиций: {len(archived)}")
+    for path in archived:
+        print(f"  {path}")
@@ -1,5 +1,9 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from ..config import settings
@@ -44,7 +48,88 @@ class AuthService:
             user_id: str = payload.get("sub")
             if user_id is None:
                 return None
-            return TokenData(user_id=user_id)
+            return TokenData(user_id=user_id, expires_at=payload.get("exp"))
         except JWTError:
             return None
 
+
+
+class PasswordHasher:
+    """bcrypt вне event loop: отдельный пул потоков на `workers` потоков.
+
+    Один хэш — ~200 мс CPU; в пуле они не блокируют остальные запросы воркера
+    (bcrypt отпускает GIL), а число одновременных хэшей не больше workers.
+    Если в очереди и в работе уже max_pending хэшей — сразу 503, чтобы шторм
+    логинов не копил очередь с растущей задержкой. Метрики (время ожидания
+    в очереди и время хэша) — в /health.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(AuthService.get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(AuthService.verify_password, plain_password, hashed_password)
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        queued = time.perf_counter()
+        started = ran = None
+
+        def run():
+            nonlocal started, ran
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                ran = time.perf_counter() - started
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+        finally:
+            self._pending -= 1
+            if ran is not None:
+                waited = started - queued
+                self.completed += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                self._run_total += ran
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self._wait_total / done * 1000, 1),
+            "queue_wait_max_ms": round(self._wait_max * 1000, 1),
+            "hash_avg_ms": round(self._run_total / done * 1000, 1),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
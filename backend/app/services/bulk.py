@@ -0,0 +1,51 @@
+"""
+Массовая вставка строк импорта одним executemany через Core insert().
+
+id и created_at генерируются на клиенте, поэтому вставленные записи известны
+без RETURNING и без refresh на каждую строку. created_at растёт на микросекунду
+от строки к строке — в списках (сортировка по created_at, id) строки идут
+в порядке файла.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.rowhash import content_hash
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+
+
+def prepare_rows(rows: Iterable[dict], *, prefix: str, owner_id: Optional[str] = None) -> list[dict]:
+    """Дополняет значения колонок служебными полями: id (если не задан), owner_id, created_at, updated_at"""
+    # naive UTC — как CURRENT_TIMESTAMP у server_default
+    start = datetime.utcnow()
+    prepared = []
+    for i, values in enumerate(rows):
+        prepared.append({
+            **values,
+            "id": values.get("id") or new_id(prefix),
+            "owner_id": values.get("owner_id", owner_id),
+            "created_at": start + timedelta(microseconds=i),
+            "updated_at": None,
+        })
+    return prepared
+
+
+async def bulk_insert(db: AsyncSession, model, rows: Iterable[dict], *, prefix: str, owner_id: Optional[str] = None) -> list[dict]:
+    """Вставляет строки (значения колонок model) одним executemany, без коммита.
+
+    Возвращает вставленные записи — их можно отдавать через схемы ответа
+    (model_validate принимает dict) без повторного чтения из БД.
+    """
+    prepared = prepare_rows(rows, prefix=prefix, owner_id=owner_id)
+    if "row_hash" in model.__table__.c:
+        for values in prepared:
+            values["row_hash"] = content_hash(values.get("data"))
+    if prepared:
+        await db.execute(insert(model.__table__), prepared)
+    return prepared
@@ -0,0 +1,79 @@
+"""
+Дельта-синхронизация коллекций: строки, изменённые после токена, и tombstones удалённых.
+
+Журнал `change_log` ведут триггеры (services/versions.py), поэтому в него попадают
+все пути записи — ORM, импорт, sync, delete и clear. Токен — `<epoch>.<seq>`:
+epoch коллекции защищает от токена, выданного другой (пересозданной) базой,
+min_seq — от токена старше удалённых из журнала tombstones.
+"""
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, Response
+from sqlalchemy import column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .serialize import Fields, field_columns, json_rows
+from .versions import CHANGE_LOG_TABLE, change_log_horizon
+
+# Строк журнала в одном ответе
+MAX_CHANGES = 5000
+
+change_log = table(CHANGE_LOG_TABLE, column("seq"), column("collection"), column("row_id"), column("op"))
+
+
+def parse_token(token: Optional[str], epoch: str, min_seq: int = 0) -> int:
+    """seq из токена; пустой токен — с начала журнала"""
+    if not token:
+        return 0
+    token_epoch, _, seq = token.partition(".")
+    if not seq.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid change token")
+    # другая база или удаления после токена уже вычищены из журнала
+    if token_epoch != epoch or int(seq) < min_seq:
+        raise HTTPException(status_code=410, detail="Change token expired, reload the collection")
+    return int(seq)
+
+
+async def changes_response(
+    db: AsyncSession,
+    collection: str,
+    model,
+    fields: Fields,
+    since: Optional[str],
+    limit: int,
+) -> Response:
+    """{"items": [...], "deleted": [id, ...], "token": "...", "more": bool}
+
+    items — строки в форме ответа списка; token — для следующего запроса;
+    more — в журнале есть ещё изменения, запросить сразу же с новым токеном.
+    """
+    horizon = await change_log_horizon(db, collection)
+    if horizon is None:
+        raise HTTPException(status_code=501, detail="Change log is not available")
+    epoch, min_seq = horizon
+    after = parse_token(since, epoch, min_seq)
+    query = (
+        select(change_log.c.seq, change_log.c.op, change_log.c.row_id, *field_columns(model, fields))
+        .select_from(change_log.outerjoin(model, model.id == change_log.c.row_id))
+        .where(change_log.c.collection == collection, change_log.c.seq > after)
+        .order_by(change_log.c.seq)
+        .limit(limit + 1)
+    )
+    rows = (await db.execute(query)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items, deleted = [], []
+    for seq, op, row_id, *values in rows:
+        if op == "delete":
+            deleted.append(row_id)
+        else:
+            items.append(values)
+    token = f"{epoch}.{rows[-1].seq if rows else after}"
+    content = (
+        b'{"items":' + json_rows(items, fields)
+        + b',"deleted":' + orjson.dumps(deleted)
+        + b',"token":' + orjson.dumps(token)
+        + b',"more":' + (b"true" if more else b"false") + b"}"
+    )
+    return Response(content=content, media_type="application/json", headers={"Cache-Control": "no-store"})
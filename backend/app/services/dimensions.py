@@ -0,0 +1,67 @@
+"""
+Выражения SQL над `data` JSON-коллекций: измерения группировки, числа, месяцы.
+
+Общие для агрегатов по запросу (services/analytics.py) и материализованных
+итогов (services/kpi_groups.py, там они же компилируются в тела триггеров) — значение
+группы в обоих путях считается одинаково.
+
+Значения берутся из `data` как на фронте (utils/dataset.ts): измерения
+status/type/sector/responsible — первый непустой из ключей-синонимов, пустые
+строки и пробелы не считаются значением. Суммируемое поле приводится к числу
+с учётом пробелов-разделителей разрядов и десятичной запятой ("1 000,5");
+нечисловые значения дают 0.
+"""
+from sqlalchemy import Float, String, and_, case, cast, func, literal, not_
+
+from ..models.promoted import json_field
+
+# Измерение -> ключи data по приоритету (KEYS в frontend/src/utils/dataset.ts)
+DIMENSIONS: dict[str, tuple[str, ...]] = {
+    "status": ("Status", "status", "Статус", "статус"),
+    "type": ("Type", "type", "Тип", "тип"),
+    "sector": ("Sector", "sector", "Сектор", "сектор"),
+    "responsible": (
+        "Responsible", "responsible", "Seniot", "Senior", "Owner", "owner",
+        "Ответственный", "ответственный", "Junior team", "Junior", "Менеджер",
+    ),
+}
+# Группировка по владельцу записи (owner_id), а не по ключу data
+OWNER = "owner"
+DEFAULT_SUM = "Size, RUB mn"
+DEFAULT_DATE = "Date"
+
+
+def text_value(model, key: str):
+    """Значение ключа как обрезанная строка; пустое -> NULL"""
+    return func.nullif(func.trim(cast(json_field(model, key), String)), "")
+
+
+def dimension(model, by: str):
+    """Выражение группировки: owner, измерение из DIMENSIONS или произвольный ключ data"""
+    if by == OWNER:
+        return model.owner_id
+    keys = DIMENSIONS.get(by)
+    if keys is None:
+        return text_value(model, by)
+    return func.coalesce(*(text_value(model, key) for key in keys))
+
+
+def number(model, key: str):
+    """Значение ключа как число: "1 000,5" -> 1000.5, нечисловое -> 0"""
+    raw = func.replace(func.replace(func.trim(cast(json_field(model, key), String)), " ", ""), func.char(160), "")
+    normalized = func.replace(raw, ",", ".")
+    numeric = and_(normalized.op("GLOB")("*[0-9]*"), not_(normalized.op("GLOB")("*[^0-9.eE+-]*")))
+    return case((numeric, cast(normalized, Float)), else_=0.0)
+
+
+def month(model, key: str):
+    """YYYY-MM из даты вида 2024-01-15[...] или 15.01.2024; иначе NULL"""
+    value = func.trim(cast(json_field(model, key), String))
+    return case(
+        (value.op("GLOB")("[0-9][0-9][0-9][0-9]-[0-9][0-9]*"), func.substr(value, 1, 7)),
+        (
+            value.op("GLOB")("[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]*"),
+            func.substr(value, 7, 4) + literal("-") + func.substr(value, 4, 2),
+        ),
+        else_=None,
+    )
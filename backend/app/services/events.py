@@ -0,0 +1,174 @@
+"""
+Push-уведомления об изменениях коллекций (Server-Sent Events).
+
+В каждом процессе один опрашивающий `change_log` таск (журнал пишут триггеры,
+см. services/versions.py, — поэтому уведомления приходят от любого пути записи
+и от любого воркера). Новые записи раздаются подписчикам через их asyncio.Queue:
+соединение — это лишь ожидающая корутина, без потока и без сессии БД.
+
+Событие — `{"collection", "id", "op", "token"}`, где token годится для
+`/api/<collection>/changes?since=`. Если за один опрос в коллекции изменилось
+больше EVENT_BATCH строк (импорт, clear), вместо них уходит одно событие
+`op: "bulk"` с количеством. Подписчик, который не успевает читать, получает
+`reset` — ему нужно дозапросить изменения через /changes.
+"""
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+import orjson
+from sqlalchemy import bindparam, func, select, text
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from .changes import change_log
+from .versions import VERSIONS_TABLE
+
+logger = logging.getLogger(__name__)
+
+# Больше изменений коллекции за опрос — одно событие bulk
+EVENT_BATCH = 50
+# Записей журнала за один опрос / догон по Last-Event-ID
+POLL_LIMIT = 5000
+
+
+def sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+class Subscriber:
+    def __init__(self, collections: Optional[set[str]], size: int):
+        self.collections = collections
+        self.queue: asyncio.Queue[str] = asyncio.Queue(size)
+
+    def wants(self, collection: str) -> bool:
+        return self.collections is None or collection in self.collections
+
+    def push(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # отстающему клиенту — только reset: дальше он дочитает через /changes
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(sse("reset", {}))
+
+
+class ChangeBroadcaster:
+    """Опрос change_log и раздача событий подписчикам этого процесса"""
+
+    def __init__(self, interval: float, queue_size: int):
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscribers: set[Subscriber] = set()
+        self.last_seq: Optional[int] = None
+        self._epochs: dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def subscribe(self, collections: Optional[Iterable[str]] = None, last_event_id: Optional[int] = None) -> Subscriber:
+        """Регистрирует подписчика; с last_event_id сначала отдаёт пропущенное из журнала"""
+        subscriber = Subscriber(set(collections) if collections else None, self.queue_size)
+        if self.last_seq is None:
+            self.last_seq = await self._max_seq()
+        after = last_event_id
+        if after is not None and after < await self._min_seq(subscriber.collections):
+            # удаления после last_event_id уже вычищены из журнала — догнать нечем
+            subscriber.push(sse("reset", {}))
+            after = None
+        while after is not None and after < self.last_seq:
+            # догоняем пропущенное до last_seq; регистрируем, только когда опрос не ушёл дальше,
+            # иначе события между догоном и общим потоком потерялись бы или пришли не по порядку
+            upto = self.last_seq
+            rows = await self._read(after, upto)
+            if len(rows) >= POLL_LIMIT:
+                subscriber.push(sse("reset", {}))
+                break
+            for collection, message in self._messages(rows):
+                if subscriber.wants(collection):
+                    subscriber.push(message)
+            after = upto
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("change_log poll failed")
+
+    async def poll(self) -> None:
+        if not self.subscribers or self.last_seq is None:
+            # без подписчиков журнал не читаем, только сдвигаем позицию
+            seq = await self._max_seq()
+            if not self.subscribers:
+                self.last_seq = seq
+            return
+        rows = await self._read(self.last_seq)
+        if not rows:
+            return
+        self.last_seq = max(self.last_seq, rows[-1].seq)
+        for collection, message in self._messages(rows):
+            for subscriber in list(self.subscribers):
+                if subscriber.wants(collection):
+                    subscriber.push(message)
+
+    async def _max_seq(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(func.coalesce(func.max(change_log.c.seq), 0)))).scalar()
+
+    async def _min_seq(self, collections: Optional[set[str]]) -> int:
+        """Наибольший min_seq коллекций подписчика (services/versions.py)"""
+        statement = text(f"SELECT coalesce(max(min_seq), 0) FROM {VERSIONS_TABLE}")
+        params = {}
+        if collections is not None:
+            statement = text(f"{statement.text} WHERE collection IN :names").bindparams(bindparam("names", expanding=True))
+            params = {"names": sorted(collections)}
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(statement, params)).scalar()
+
+    async def _read(self, after: int, upto: Optional[int] = None) -> list:
+        query = select(change_log.c.seq, change_log.c.collection, change_log.c.row_id, change_log.c.op).where(change_log.c.seq > after)
+        if upto is not None:
+            query = query.where(change_log.c.seq <= upto)
+        async with AsyncSessionLocal() as db:
+            if not self._epochs:
+                self._epochs = dict((await db.execute(text(f"SELECT collection, epoch FROM {VERSIONS_TABLE}"))).all())
+            return (await db.execute(query.order_by(change_log.c.seq).limit(POLL_LIMIT))).all()
+
+    def _messages(self, rows: list) -> list[tuple[str, str]]:
+        """(collection, SSE-сообщение) в порядке seq: по событию на строку или одно bulk на коллекцию"""
+        by_collection: dict[str, list] = {}
+        for row in rows:
+            by_collection.setdefault(row.collection, []).append(row)
+        events = []
+        for collection, items in by_collection.items():
+            epoch = self._epochs.get(collection, "")
+            if len(items) > EVENT_BATCH:
+                last = items[-1].seq
+                data = {"collection": collection, "op": "bulk", "count": len(items), "token": f"{epoch}.{last}"}
+                events.append((last, collection, data))
+                continue
+            for row in items:
+                data = {"collection": collection, "id": row.row_id, "op": row.op, "token": f"{epoch}.{row.seq}"}
+                events.append((row.seq, collection, data))
+        # id события — seq журнала: по нему клиент продолжает после переподключения (Last-Event-ID)
+        events.sort(key=lambda e: e[0])
+        return [(collection, sse("change", data, seq)) for seq, collection, data in events]
+
+
+broadcaster = ChangeBroadcaster(settings.events_poll_interval, settings.events_queue_size)
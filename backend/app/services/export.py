@@ -0,0 +1,198 @@
+"""
+Потоковый экспорт CSV/XLSX прямо из курсора БД.
+
+Строки читаются порциями (yield_per) в одной read-транзакции — снимок согласован,
+а память не зависит от числа строк. Сессия запроса к моменту стриминга уже закрыта
+(FastAPI закрывает yield-зависимости до отправки тела), поэтому генератор открывает
+своё соединение.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..database import async_engine
+
+EXPORT_FORMATS = ("csv", "xlsx")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+YIELD_PER = 1000
+
+# Первая порция — заголовок, дальше порции строк
+Batches = AsyncIterator[list[list]]
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum
+        return str(value.value)
+    return str(value)
+
+
+async def csv_chunks(batches: Batches) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    first = True
+    async for batch in batches:
+        writer.writerows([[_cell_text(v) for v in row] for row in batch])
+        data = buf.getvalue().encode("utf-8")
+        if first:
+            data, first = "﻿".encode("utf-8") + data, False  # BOM — Excel корректно открывает кириллицу
+        buf.seek(0)
+        buf.truncate()
+        yield data
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border/></borders>
+<cellStyleXfs count="1"><xf/></cellStyleXfs>
+<cellXfs count="1"><xf/></cellXfs>
+</styleSheet>"""
+_SHEET_HEAD = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+_SHEET_TAIL = b"</sheetData></worksheet>"
+
+# Управляющие символы недопустимы в XML 1.0
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_row(row: Iterable) -> str:
+    cells = []
+    for value in row:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            s = _XML_ILLEGAL.sub("", escape(_cell_text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{s}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+
+class _Sink(io.RawIOBase):
+    """Приёмник zip-потока без seek: ZipFile пишет data descriptor'ы, мы забираем байты порциями"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def xlsx_chunks(batches: Batches) -> AsyncIterator[bytes]:
+    """Минимальный XLSX (inline strings, один лист), собираемый на лету"""
+    sink = _Sink()
+    zf = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    for name, xml in (
+        ("[Content_Types].xml", _CONTENT_TYPES),
+        ("_rels/.rels", _ROOT_RELS),
+        ("xl/workbook.xml", _WORKBOOK),
+        ("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS),
+        ("xl/styles.xml", _STYLES),
+    ):
+        zf.writestr(name, xml)
+    with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+        sheet.write(_SHEET_HEAD)
+        async for batch in batches:
+            sheet.write("".join(_xlsx_row(row) for row in batch).encode("utf-8"))
+            yield sink.drain()
+        sheet.write(_SHEET_TAIL)
+    zf.close()
+    yield sink.drain()
+
+
+async def stream_rows(conn: AsyncConnection, stmt, to_row: Callable) -> Batches:
+    result = await conn.stream(stmt.execution_options(yield_per=YIELD_PER))
+    async for partition in result.partitions():
+        yield [to_row(r) for r in partition]
+
+
+def export_response(
+    fmt: str,
+    filename: str,
+    produce: Callable[[AsyncConnection], Awaitable[tuple[list[str], Batches]]],
+) -> StreamingResponse:
+    """StreamingResponse экспорта.
+
+    produce(conn) -> (заголовок, порции строк); вызывается внутри read-транзакции
+    отдельного соединения, которое живёт, пока идёт отдача файла.
+    """
+
+    async def batches() -> Batches:
+        async with async_engine.connect() as conn:
+            async with conn.begin():
+                header, rows = await produce(conn)
+                yield [header]
+                async for batch in rows:
+                    yield batch
+
+    body = xlsx_chunks(batches()) if fmt == "xlsx" else csv_chunks(batches())
+    stamp = datetime.utcnow().strftime("%Y-%m-%d")
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}-{stamp}.{fmt}"'},
+    )
+
+
+async def data_keys(conn: AsyncConnection, table: str, expected: Optional[list[str]] = None) -> list[str]:
+    """Колонки экспорта JSON-коллекции: ожидаемые заголовки, затем прочие ключи в порядке появления"""
+    rows = await conn.execute(text(
+        f"SELECT j.key FROM {table} t, json_each(t.data) j "
+        f"GROUP BY j.key ORDER BY MIN(t.rowid), MIN(j.id)"
+    ))
+    expected = list(expected or [])
+    return expected + [k for (k,) in rows if k not in expected]
+
+
+def export_json_collection(fmt: str, filename: str, model, query, expected: Optional[list[str]] = None) -> StreamingResponse:
+    """Экспорт коллекции с гибкой схемой: по колонке на ключ `data`"""
+    query = query.order_by(model.created_at, model.id)
+
+    async def produce(conn: AsyncConnection):
+        header = await data_keys(conn, model.__tablename__, expected)
+        return header, stream_rows(conn, query, lambda r: [(r.data or {}).get(k) for k in header])
+
+    return export_response(fmt, filename, produce)
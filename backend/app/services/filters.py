@@ -0,0 +1,125 @@
+from typing import List, Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import Float, String, cast, not_, or_, and_
+
+from ..models.promoted import json_field
+
+# Колонки строки, доступные в filter/sort наравне с ключами data
+META_COLUMNS = ("id", "owner_id", "created_at", "updated_at")
+
+FILTER_OPS = ("eq", "ne", "in", "nin", "contains", "gt", "gte", "lt", "lte", "between")
+
+FILTER_HELP = (
+    "Фильтр по ключу data: `<ключ>:<op>:<значение>`, можно повторять (условия объединяются через AND). "
+    "op: eq, ne, in, nin, contains, gt, gte, lt, lte, between. Для in/nin/between значения разделяются `|`. "
+    "Числовые значения сравниваются как числа, остальные — как строки (ISO-даты сравниваются корректно). "
+    "Пример: `Status:in:Active|On hold`, `Size, RUB mn:gte:100`, `Date:between:2024-01-01|2024-12-31`"
+)
+SORT_HELP = (
+    "Сортировка по ключу data, можно повторять: `Company`, `-Date` (по убыванию), "
+    "`-Size, RUB mn:num` (числовая сортировка строковых значений)"
+)
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _field(model, key: str):
+    if key in META_COLUMNS:
+        return getattr(model, key)
+    return json_field(model, key)
+
+
+def _equals(field, value: str):
+    """Ключи из CSV хранятся строками, из форм — бывают числами: сравниваем с обоими"""
+    number = _number(value)
+    if number is None:
+        return field == value
+    return or_(field == value, field == number)
+
+
+def _compare(field, op: str, value: str):
+    number = _number(value)
+    if number is not None:
+        field, value = cast(field, Float), number
+    elif not isinstance(field.type, String):
+        field = cast(field, String)
+    return {"gt": field > value, "gte": field >= value, "lt": field < value, "lte": field <= value}[op]
+
+
+def parse_filter(expr: str) -> tuple[str, str, str]:
+    parts = expr.split(":", 2)
+    if len(parts) != 3 or not parts[0]:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {expr!r}, expected key:op:value")
+    key, op, value = parts
+    if op not in FILTER_OPS:
+        raise HTTPException(status_code=400, detail=f"Unknown filter operator: {op!r}")
+    if op == "between" and len(value.split("|")) != 2:
+        raise HTTPException(status_code=400, detail=f"between expects two values: {expr!r}")
+    return key, op, value
+
+
+def filter_clause(model, key: str, op: str, value: str):
+    field = _field(model, key)
+    if op == "eq":
+        return _equals(field, value)
+    if op == "ne":
+        return or_(field.is_(None), not_(_equals(field, value)))
+    if op in ("in", "nin"):
+        clause = or_(*(_equals(field, v) for v in value.split("|")))
+        return clause if op == "in" else or_(field.is_(None), not_(clause))
+    if op == "contains":
+        if not isinstance(field.type, String):
+            field = cast(field, String)
+        return field.icontains(value, autoescape=True)
+    if op == "between":
+        low, high = value.split("|")
+        return and_(_compare(field, "gte", low), _compare(field, "lte", high))
+    return _compare(field, op, value)
+
+
+def parse_sort(expr: str) -> tuple[str, bool, bool]:
+    """'-Key:num' -> (key, descending, numeric)"""
+    descending = expr.startswith("-")
+    key = expr[1:] if descending else expr
+    numeric = key.endswith(":num")
+    if numeric:
+        key = key[: -len(":num")]
+    if not key:
+        raise HTTPException(status_code=400, detail=f"Invalid sort: {expr!r}")
+    return key, descending, numeric
+
+
+class DataQuery:
+    """Параметры `filter`/`sort` списков коллекций с гибкой схемой (JSON `data`).
+
+    Условия компилируются в SQL (json_extract или вынесенная индексируемая колонка),
+    так что фильтрация и сортировка происходят в БД, а клиенту уходит только страница.
+    """
+
+    def __init__(
+        self,
+        filter: List[str] = Query([], description=FILTER_HELP),
+        sort: List[str] = Query([], description=SORT_HELP),
+    ):
+        self.filters = [parse_filter(f) for f in filter]
+        self.sort = [parse_sort(s) for s in sort]
+
+    def where(self, query, model):
+        for key, op, value in self.filters:
+            query = query.where(filter_clause(model, key, op, value))
+        return query
+
+    def order_by(self, model) -> list:
+        clauses = []
+        for key, descending, numeric in self.sort:
+            field = _field(model, key)
+            if numeric:
+                field = cast(field, Float)
+            clauses.append(field.desc() if descending else field.asc())
+        return clauses
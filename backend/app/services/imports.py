@@ -0,0 +1,266 @@
+"""
+Импорт таблиц, загруженных файлом (multipart): файл разбирается потоком,
+строки вставляются порциями по CHUNK_SIZE с коммитом на каждую порцию.
+
+Память ограничена размером порции: Starlette спулит тело загрузки на диск,
+разбор идёт построчно (services.tabular), порция вставляется одним executemany
+(services.bulk) без ORM-объектов.
+
+Большие файлы можно импортировать фоновой задачей (start_import_job): файл
+сохраняется во временный каталог, запись import_jobs хранит статус и прогресс.
+"""
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from itertools import islice
+from typing import Awaitable, BinaryIO, Callable, Iterator, Optional, Sequence
+from xml.etree.ElementTree import ParseError
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.import_job import ImportJob
+from ..schemas.imports import ImportSummary
+from .bulk import bulk_insert, new_id
+from .jobs import runner
+from .ratelimit import ConcurrencySlot
+from .tabular import iter_records
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# Битый файл: TabularFormatError (ValueError), нет листа в архиве, кривой XML
+_BAD_FILE = (ValueError, KeyError, ParseError)
+
+SERVICE_FIELDS = ("id", "owner_id", "created_at", "updated_at")
+
+CONTACT_NAME_KEYS = (
+    "contact",
+    "Investor", "investor",
+    "Contact persons", "contact persons",
+    "Contacted person", "contacted person",
+    "Source Name", "source name",
+)
+
+
+def is_empty_row(row: dict) -> bool:
+    """Строка вида ,,,,, или из одних пробелов"""
+    return not any(str(v).strip() for v in row.values() if v is not None)
+
+
+def clean_deal_row(row: dict) -> Optional[dict]:
+    """Данные сделки без служебных полей, пустых колонок и пустых значений; None — строку пропустить"""
+    clean = {}
+    for k, v in row.items():
+        if k in SERVICE_FIELDS:
+            continue
+        if not isinstance(k, str) or not k.strip():
+            continue
+        if v is None or isinstance(v, (list, dict)):
+            # Не сохраняем структурные значения из парсинга
+            continue
+        if isinstance(v, str):
+            v = v.strip()
+            if not v:
+                continue
+        clean[k] = v
+    return clean or None
+
+
+def contact_name(row: dict) -> str:
+    """Имя контакта из первой заполненной подходящей колонки (contact, Investor, Contact persons, ...)"""
+    raw = next((row[k] for k in CONTACT_NAME_KEYS if row.get(k)), "")
+    return str(raw).strip()
+
+
+def _open(fileobj: BinaryIO, filename: str) -> tuple[list[str], Iterator[dict]]:
+    fileobj.seek(0)
+    return iter_records(fileobj, filename or "")
+
+
+def _next_chunk(records: Iterator[dict]) -> list[dict]:
+    return list(islice(records, CHUNK_SIZE))
+
+
+async def _read_header(fileobj: BinaryIO, filename: str, required: Sequence[str], wrong_file: str):
+    try:
+        header, records = await run_in_threadpool(_open, fileobj, filename)
+    except _BAD_FILE as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if any(h not in header for h in required):
+        raise HTTPException(status_code=400, detail=wrong_file)
+    return header, records
+
+
+def _build_chunk(chunk: list[dict], build: Callable[[dict], Optional[dict]], summary: ImportSummary) -> list[dict]:
+    values = []
+    for row in chunk:
+        try:
+            v = build(row)
+        except (ValueError, TypeError, KeyError):
+            summary.errors += 1
+            continue
+        if v is None:
+            summary.skipped += 1
+        else:
+            values.append(v)
+    return values
+
+
+async def import_stream(
+    db: AsyncSession,
+    fileobj: BinaryIO,
+    filename: str,
+    model,
+    build: Callable[[dict], Optional[dict]],
+    *,
+    prefix: str,
+    owner_id: Optional[str] = None,
+    required: Sequence[str] = (),
+    wrong_file: str = "Incorrect file",
+    on_chunk: Optional[Callable[[ImportSummary], Awaitable[None]]] = None,
+) -> ImportSummary:
+    """Потоковый импорт файла: build(row) -> значения колонок model или None (строку пропустить).
+
+    on_chunk(summary) вызывается после вставки каждой порции до её коммита — прогресс
+    пишется в той же транзакции; исключение из on_chunk откатывает текущую порцию.
+    Уже закоммиченные порции при ошибке посередине файла остаются в БД —
+    в тексте ошибки сообщается, сколько строк успело загрузиться.
+    """
+    _, records = await _read_header(fileobj, filename, required, wrong_file)
+    summary = ImportSummary()
+    while True:
+        try:
+            chunk = await run_in_threadpool(_next_chunk, records)
+        except _BAD_FILE as e:
+            raise HTTPException(status_code=400, detail=f"{e} (imported {summary.inserted} rows before the error)")
+        if not chunk:
+            break
+        summary.parsed += len(chunk)
+        values = _build_chunk(chunk, build, summary)
+        if values:
+            await bulk_insert(db, model, values, prefix=prefix, owner_id=owner_id)
+            summary.inserted += len(values)
+            summary.chunks += 1
+        if on_chunk is not None:
+            await on_chunk(summary)
+        await db.commit()
+    return summary
+
+
+async def import_upload(db: AsyncSession, file: UploadFile, model, build: Callable[[dict], Optional[dict]], **options) -> ImportSummary:
+    """import_stream для файла из запроса (параметры — как у import_stream)"""
+    return await import_stream(db, file.file, file.filename or "", model, build, **options)
+
+
+# --- Фоновые задачи импорта ---
+
+class ImportCancelled(Exception):
+    """Задачу отменили — текущая порция откатывается"""
+
+
+def _save_upload(file: UploadFile) -> str:
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=suffix, dir=settings.import_tmp_dir)
+    with os.fdopen(fd, "wb") as out:
+        file.file.seek(0)
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
+    return path
+
+
+async def start_import_job(
+    db: AsyncSession,
+    file: UploadFile,
+    slot: ConcurrencySlot,
+    model,
+    build: Callable[[dict], Optional[dict]],
+    *,
+    user_id: str,
+    collection: str,
+    **options,
+) -> ImportJob:
+    """Сохраняет файл во временный каталог, создаёт запись import_jobs и ставит задачу в пул.
+
+    Заголовок проверяется сразу — неверный файл отклоняется ответом 400, а не задачей failed.
+    Место в лимите импортов пользователя (slot) переходит задаче.
+    """
+    await _read_header(file.file, file.filename or "", options.get("required", ()), options.get("wrong_file", "Incorrect file"))
+    path = await run_in_threadpool(_save_upload, file)
+    try:
+        job = ImportJob(id=new_id("j"), owner_id=user_id, collection=collection, filename=file.filename, status="queued")
+        db.add(job)
+        await db.commit()
+    except Exception:
+        os.remove(path)
+        raise
+    slot.detached = True
+
+    async def abort() -> None:
+        await _mark_interrupted(job.id)
+        _release(slot, path)
+
+    runner.submit(job.id, lambda: _run_import_job(job.id, path, file.filename or "", model, build, slot, options), on_abort=abort)
+    return job
+
+
+def _release(slot: ConcurrencySlot, path: str) -> None:
+    slot.release()
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+async def _mark_interrupted(job_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status.in_(("queued", "running")))
+            .values(status="failed", error="Interrupted by server shutdown", finished_at=datetime.utcnow())
+        )
+        await db.commit()
+
+
+async def _run_import_job(job_id: str, path: str, filename: str, model, build, slot: ConcurrencySlot, options: dict) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ImportJob, job_id)
+            if job is None or job.status != "queued":
+                return  # отменена до старта
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            await db.commit()
+
+            async def on_chunk(summary: ImportSummary) -> None:
+                job.rows_parsed = summary.parsed
+                job.rows_inserted = summary.inserted
+                job.rows_skipped = summary.skipped
+                job.errors = summary.errors
+                # флаг отмены ставит другой запрос (возможно, в другом процессе)
+                if await db.scalar(select(ImportJob.cancel_requested).where(ImportJob.id == job_id)):
+                    raise ImportCancelled()
+
+            try:
+                with open(path, "rb") as f:
+                    await import_stream(db, f, filename, model, build, on_chunk=on_chunk, **options)
+                job.status = "completed"
+            except ImportCancelled:
+                await db.rollback()
+                job.status = "cancelled"
+            except HTTPException as e:
+                await db.rollback()
+                job.status, job.error = "failed", str(e.detail)
+            except Exception as e:
+                logger.exception("Import job %s failed", job_id)
+                await db.rollback()
+                job.status, job.error = "failed", str(e)
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+    finally:
+        _release(slot, path)
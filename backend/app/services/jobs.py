@@ -0,0 +1,62 @@
+"""
+Пул фоновых задач в процессе приложения (asyncio-задачи + семафор).
+
+Задачи живут, пока жив процесс: при остановке (lifespan) незавершённые
+отменяются, и для каждой вызывается on_abort — в том числе для ещё ждущих
+места в пуле.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        # семафор создаётся в цикле событий приложения
+        self._semaphore = asyncio.Semaphore(self.workers)
+
+    def submit(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[None]],
+        on_abort: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        if self._semaphore is None:
+            self.start()
+        task = asyncio.create_task(self._run(name, run, on_abort), name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, name: str, run, on_abort) -> None:
+        try:
+            async with self._semaphore:
+                await run()
+        except asyncio.CancelledError:
+            if on_abort is not None:
+                await on_abort()
+            raise
+        except Exception:
+            logger.exception("Background job %s failed", name)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._semaphore = None
+
+
+runner = JobRunner(settings.import_workers)
@@ -0,0 +1,180 @@
+"""
+Материализованные итоги дашборда: число строк и сумма по группам.
+
+Для pipeline и deals в `kpi_groups` хранится строка на (коллекция, измерение,
+значение): count и total — сумма DEFAULT_SUM ("Size, RUB mn"). Измерения —
+status, sector, владелец записи и месяц DEFAULT_DATE. Каждое измерение — это
+upsert в триггере на каждую записанную строку, поэтому их немного: остальные
+группировки (type, responsible) считаются по строкам.
+Строки без значения измерения собраны в группу с key = '' (пустое значение
+измерением не считается, так что с настоящим ключом не совпадёт).
+
+Итоги ведут триггеры SQLite на INSERT/UPDATE/DELETE таблиц — как версии
+коллекций (services/versions.py), их меняет любой путь записи: create/update/
+delete роутеров, импорт, bulk insert, sync, clear. Тела триггеров компилируются
+из тех же выражений, что и агрегаты по запросу (services/dimensions.py), поэтому
+чтение отсюда и расчёт по строкам дают одни группы. Группа, в которой не
+осталось строк, удаляется — таблица занимает O(групп), а не O(строк).
+
+Сумма ведётся прибавлением и вычитанием: после многих правок в total копится
+погрешность float в последних знаках. Пересчёт с нуля:
+    python -m app.services.kpi_groups rebuild
+Он же выполняется при старте, если таблицы ещё нет или изменились тела триггеров.
+"""
+import sys
+from typing import Iterable, Optional
+
+from sqlalchemy import column, table, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.deal import Deal
+from ..models.pipeline import PipelineItem
+from .dimensions import DEFAULT_DATE, DEFAULT_SUM, OWNER, dimension, month, number
+
+KPI_TABLE = "kpi_groups"
+
+# коллекция API -> модель
+KPI_COLLECTIONS = {
+    "pipeline": PipelineItem,
+    "deals": Deal,
+}
+# измерения group_totals (by=...) и помесячный ряд по DEFAULT_DATE
+GROUP_DIMENSIONS = ("status", "sector", OWNER)
+MONTH = "month"
+KPI_DIMENSIONS = (*GROUP_DIMENSIONS, MONTH)
+# значение key для строк, где измерение не заполнено
+NONE_KEY = ""
+
+
+class _Row:
+    """NEW/OLD в теле триггера или таблица в пересчёте — вместо модели для выражений dimensions.py"""
+
+    def __init__(self, name: str):
+        source = table(name, column("data"), column("owner_id"))
+        self.__table__ = table(name)  # без вынесенных колонок: выражения читают data
+        self.data = source.c.data
+        self.owner_id = source.c.owner_id
+
+
+def _sql(expression) -> str:
+    return str(expression.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def _key(row: _Row, dim: str) -> str:
+    expression = month(row, DEFAULT_DATE) if dim == MONTH else dimension(row, dim)
+    return f"coalesce({_sql(expression)}, '{NONE_KEY}')"
+
+
+def _add(collection: str, row: _Row) -> str:
+    value = _sql(number(row, DEFAULT_SUM))
+    return "".join(
+        f"INSERT INTO {KPI_TABLE}(collection, dimension, key, count, total) "
+        f"VALUES ('{collection}', '{dim}', {_key(row, dim)}, 1, {value}) "
+        "ON CONFLICT(collection, dimension, key) DO UPDATE SET count = count + 1, total = total + excluded.total;"
+        for dim in KPI_DIMENSIONS
+    )
+
+
+def _remove(collection: str, row: _Row) -> str:
+    value = _sql(number(row, DEFAULT_SUM))
+    return "".join(
+        f"UPDATE {KPI_TABLE} SET count = count - 1, total = total - {value} "
+        f"WHERE collection = '{collection}' AND dimension = '{dim}' AND key = {_key(row, dim)};"
+        for dim in KPI_DIMENSIONS
+    ) + f"DELETE FROM {KPI_TABLE} WHERE count <= 0 AND collection = '{collection}';"
+
+
+def _triggers(collection: str, tablename: str) -> dict[str, str]:
+    """Имя триггера -> CREATE TRIGGER"""
+    new, old = _Row("new"), _Row("old")
+    return {
+        f"kpi_{tablename}_ai": f"CREATE TRIGGER kpi_{tablename}_ai AFTER INSERT ON {tablename} BEGIN {_add(collection, new)} END",
+        f"kpi_{tablename}_au": (
+            f"CREATE TRIGGER kpi_{tablename}_au AFTER UPDATE OF data, owner_id ON {tablename} "
+            f"BEGIN {_remove(collection, old)}{_add(collection, new)} END"
+        ),
+        f"kpi_{tablename}_ad": f"CREATE TRIGGER kpi_{tablename}_ad AFTER DELETE ON {tablename} BEGIN {_remove(collection, old)} END",
+    }
+
+
+def rebuild_kpi_groups(conn: Connection, collections: Optional[Iterable[str]] = None) -> None:
+    """Пересчитывает итоги коллекций (по умолчанию всех) по текущим строкам"""
+    for collection in collections or KPI_COLLECTIONS:
+        tablename = KPI_COLLECTIONS[collection].__tablename__
+        row = _Row(tablename)
+        value = _sql(number(row, DEFAULT_SUM))
+        conn.exec_driver_sql(f"DELETE FROM {KPI_TABLE} WHERE collection = ?", (collection,))
+        for dim in KPI_DIMENSIONS:
+            conn.exec_driver_sql(
+                f"INSERT INTO {KPI_TABLE}(collection, dimension, key, count, total) "
+                f"SELECT '{collection}', '{dim}', {_key(row, dim)}, count(*), sum({value}) "
+                f"FROM {tablename} GROUP BY 3"
+            )
+
+
+def install_kpi_groups(conn) -> None:
+    """Создаёт таблицу итогов и триггеры; пересчитывает коллекции с новой таблицей или изменёнными триггерами"""
+    if conn.dialect.name != "sqlite":
+        return
+    missing = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (KPI_TABLE,)
+    ).first() is None
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {KPI_TABLE} ("
+        "collection TEXT NOT NULL, dimension TEXT NOT NULL, key TEXT NOT NULL, "
+        "count INTEGER NOT NULL, total REAL NOT NULL, "
+        "PRIMARY KEY (collection, dimension, key)) WITHOUT ROWID"
+    )
+    # опустевшие группы удаляются после каждого DELETE/UPDATE строки — по этому индексу, без скана
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{KPI_TABLE}_empty ON {KPI_TABLE}(collection) WHERE count <= 0")
+    existing = dict(conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'kpi\\_%' ESCAPE '\\'"
+    ).all())
+    stale = []
+    for collection, model in KPI_COLLECTIONS.items():
+        triggers = _triggers(collection, model.__tablename__)
+        if not missing and all(existing.get(name) == ddl for name, ddl in triggers.items()):
+            continue
+        # тела поменялись между версиями (измерения, ключи) — старые итоги посчитаны иначе
+        for name, ddl in triggers.items():
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(ddl)
+        stale.append(collection)
+    if stale:
+        rebuild_kpi_groups(conn, stale)
+
+
+def covers(collection: str, by: str, sum_key: Optional[str] = None) -> bool:
+    """Есть ли итоги коллекции по группировке by для суммы sum_key"""
+    return collection in KPI_COLLECTIONS and by in GROUP_DIMENSIONS and sum_key in (None, DEFAULT_SUM)
+
+
+def covers_monthly(collection: str, date_key: str, sum_key: Optional[str] = None) -> bool:
+    """Есть ли помесячные итоги коллекции по дате date_key для суммы sum_key"""
+    return collection in KPI_COLLECTIONS and date_key == DEFAULT_DATE and sum_key in (None, DEFAULT_SUM)
+
+
+async def read_kpi_groups(db: AsyncSession, collection: str, by: str) -> list[tuple[Optional[str], int, float]]:
+    """[(key, count, total)] коллекции по измерению; key = None — значение не заполнено"""
+    rows = (await db.execute(
+        text(f"SELECT key, count, total FROM {KPI_TABLE} WHERE collection = :collection AND dimension = :dimension"),
+        {"collection": collection, "dimension": by},
+    )).all()
+    return [(None if key == NONE_KEY else key, count, total) for key, count, total in rows]
+
+
+def rebuild() -> None:
+    """Пересчёт на синхронном движке — для CLI"""
+    from ..database import engine
+
+    with engine.begin() as conn:
+        rebuild_kpi_groups(conn)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.services.kpi_groups rebuild")
+    rebuild()
+    print(f"✓ Итоги пересчитаны: {', '.join(KPI_COLLECTIONS)}")
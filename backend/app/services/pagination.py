@@ -0,0 +1,70 @@
+import base64
+import json
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import String, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: Optional[str], item_id: str) -> str:
+    raw = json.dumps([created_at, item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(item_id, str):
+            raise ValueError(cursor)
+        return created_at, item_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def keyset_page(
+    db: AsyncSession,
+    query,
+    model,
+    *,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    skip: int = 0,
+    order_by: Sequence = (),
+) -> tuple[list, Optional[str]]:
+    """Страница по ключу (created_at, id), опирается на индекс ix_<table>_created_at_id.
+
+    При пользовательской сортировке (order_by) курсор не выдаётся — листать через skip;
+    (created_at, id) остаётся последним ключом, чтобы порядок был стабильным.
+
+    Для select(Model) возвращаются объекты, для select нескольких колонок — строки
+    результата (с двумя служебными колонками курсора в конце).
+
+    created_at сравнивается как хранимый текст: строки с server_default (без
+    микросекунд) и записанные из Python должны упорядочиваться одинаково в
+    ORDER BY и в условии курсора, иначе на границе секунды строки теряются.
+    """
+    single = len(query.column_descriptions) == 1
+    created = type_coerce(model.created_at, String)
+    query = query.add_columns(created.label("cursor_created_at"), model.id.label("cursor_id")).order_by(*order_by, model.created_at, model.id)
+    if cursor and order_by:
+        raise HTTPException(status_code=400, detail="cursor cannot be combined with sort, use skip")
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.where(tuple_(created, model.id) > tuple_(created_at, item_id))
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        if not order_by:
+            next_cursor = encode_cursor(rows[-1].cursor_created_at, rows[-1].cursor_id)
+    if single:
+        return [row[0] for row in rows], next_cursor
+    return rows, next_cursor
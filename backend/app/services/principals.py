@@ -0,0 +1,90 @@
+"""
+Кэш аутентифицированных пользователей: проверенный JWT -> Principal.
+
+На горячем пути get_current_user не проверяет подпись токена и не читает users:
+запись живёт `principal_cache_ttl` секунд (но не дольше exp токена), кэш
+ограничен `principal_cache_size` записями и вытесняет давно неиспользованные.
+
+Изменения пользователя (update_user, delete_user, change_password) сбрасывают
+его записи явно — в этом процессе; другие воркеры увидят изменение не позже TTL.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from ..config import settings
+from ..models.user import User, UserRole
+
+
+class Principal:
+    """Снимок пользователя для проверок доступа: id, email, name, role, verified.
+
+    Подставляется вместо ORM-объекта User в current_user; полная запись
+    (например, для /me) читается из БД отдельно.
+    """
+
+    __slots__ = ("id", "email", "name", "role", "verified")
+
+    def __init__(self, id: str, email: str, name: str, role: UserRole, verified: bool):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+        self.verified = verified
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.email, user.name, user.role, user.verified)
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, size: int):
+        self.ttl = ttl
+        self.size = size
+        # token -> (principal, истекает в monotonic)
+        self._entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+        self._tokens: dict[str, set[str]] = {}
+
+    def get(self, token: str) -> Optional[Principal]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        principal, expires = entry
+        if expires <= time.monotonic():
+            self._drop(token)
+            return None
+        self._entries.move_to_end(token)
+        return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float] = None) -> None:
+        lifetime = self.ttl
+        if token_expires_at is not None:
+            lifetime = min(lifetime, token_expires_at - time.time())
+        if lifetime <= 0 or self.size <= 0:
+            return
+        self._drop(token)
+        self._entries[token] = (principal, time.monotonic() + lifetime)
+        self._tokens.setdefault(principal.id, set()).add(token)
+        while len(self._entries) > self.size:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str) -> None:
+        for token in self._tokens.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tokens.clear()
+
+    def _drop(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens.get(entry[0].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[entry[0].id]
+
+
+principal_cache = PrincipalCache(settings.principal_cache_ttl, settings.principal_cache_size)
@@ -1,39 +1,266 @@
+"""
+Ограничение частоты запросов (rate limit) и числа одновременных операций.
+
+RateLimiter — алгоритм (скользящее окно или token bucket) поверх хранилища:
+  MemoryBackend  — в памяти процесса; записи истекают, число ключей ограничено (LRU)
+  SQLiteBackend  — отдельный файл SQLite, общий для всех воркеров uvicorn: лимит
+                   действует на сервер целиком, а не на каждый процесс
+Состояние ключа — три числа и срок, после которого оно равно пустому: такие
+записи удаляются периодической чисткой. max_keys — жёсткий предел в обоих
+хранилищах: новый ключ сверх него сразу вытесняет самый старый.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
 import time
-from typing import Dict, Tuple
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+State = Tuple[float, float, float]
+# (state | None, now, limit, window) -> (allowed, new_state, expires_at)
+Algorithm = Callable[[Optional[State], float, int, float], Tuple[bool, State, float]]
+
+SWEEP_INTERVAL = 60.0
+
+
+def sliding_window(state: Optional[State], now: float, limit: int, window: float) -> Tuple[bool, State, float]:
+  """Скользящее окно на двух счётчиках: текущее окно + доля предыдущего,
+  пропорциональная ещё не истёкшей его части"""
+  current = now - now % window
+  start, prev, count = state or (current, 0.0, 0.0)
+  if start != current:
+    prev, count = (count if start == current - window else 0.0), 0.0
+  estimate = prev * (1 - (now - current) / window) + count
+  allowed = estimate + 1 <= limit
+  if allowed:
+    count += 1
+  return allowed, (current, prev, count), current + 2 * window
+
+
+def token_bucket(state: Optional[State], now: float, limit: int, window: float) -> Tuple[bool, State, float]:
+  """Token bucket: ёмкость limit, пополнение limit токенов за window"""
+  rate = limit / window
+  tokens, updated, _ = state or (float(limit), now, 0.0)
+  tokens = min(float(limit), tokens + (now - updated) * rate)
+  allowed = tokens >= 1
+  if allowed:
+    tokens -= 1
+  # после этого момента корзина снова полная — запись можно забыть
+  return allowed, (tokens, now, 0.0), now + (limit - tokens) / rate
+
+
+ALGORITHMS: Dict[str, Algorithm] = {"sliding_window": sliding_window, "token_bucket": token_bucket}
 
 
-class InMemoryRateLimiter:
-  """Простой in-memory rate limiter (для одного инстанса приложения).
-  Не для распределённой прод-среды, но хватает как MVP защиты.
+class MemoryBackend:
+  """Состояния ключей в памяти процесса: истёкшие чистятся, сверх max_keys вытесняются LRU"""
+
+  blocking = False
+
+  def __init__(self, max_keys: int):
+    self.max_keys = max_keys
+    self._entries: "OrderedDict[str, Tuple[State, float]]" = OrderedDict()
+    self._next_sweep = 0.0
+
+  def hit(self, key: str, algorithm: Algorithm, now: float, limit: int, window: float) -> bool:
+    entry = self._entries.pop(key, None)
+    state = entry[0] if entry is not None and entry[1] > now else None
+    allowed, state, expires = algorithm(state, now, limit, window)
+    self._entries[key] = (state, expires)
+    while len(self._entries) > self.max_keys:
+      self._entries.popitem(last=False)
+    if now >= self._next_sweep:
+      self._next_sweep = now + SWEEP_INTERVAL
+      for stale in [k for k, (_, exp) in self._entries.items() if exp <= now]:
+        del self._entries[stale]
+    return allowed
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def clear(self) -> None:
+    self._entries.clear()
+
+
+class SQLiteBackend:
+  """Состояния ключей в отдельном файле SQLite — общие для всех процессов.
+
+  Не основная БД: короткие транзакции лимитера не конкурируют с импортами
+  за её блокировку записи. Соединение — своё в каждом потоке.
+
+  Число ключей держат триггеры в rate_limit_count: новый ключ сверх max_keys
+  сразу вытесняет самый ранний по сроку, не дожидаясь чистки.
   """
 
-  def __init__(self):
-    # key -> (window_start_ts, count)
-    self._buckets: Dict[str, Tuple[float, int]] = {}
-
-  def allow(self, key: str, limit: int, window_seconds: int) -> bool:
-    now = time.time()
-    bucket = self._buckets.get(key)
-    if not bucket:
-      self._buckets[key] = (now, 1)
-      return True
-    start, cnt = bucket
-    if now - start > window_seconds:
-      # новая временная оконная корзина
-      self._buckets[key] = (now, 1)
+  blocking = True
+
+  def __init__(self, path: str, max_keys: int, busy_timeout_ms: int = 2000):
+    self.path = path
+    self.max_keys = max_keys
+    self.busy_timeout_ms = busy_timeout_ms
+    self._local = threading.local()
+    self._next_sweep = 0.0
+
+  def _conn(self) -> sqlite3.Connection:
+    conn = getattr(self._local, "conn", None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, isolation_level=None, timeout=self.busy_timeout_ms / 1000)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS rate_limits ("
+        "key TEXT PRIMARY KEY, a REAL NOT NULL, b REAL NOT NULL, c REAL NOT NULL, expires_at REAL NOT NULL)"
+      )
+      conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits(expires_at)")
+      conn.execute("BEGIN IMMEDIATE")
+      try:
+        # счётчик строк: count(*) на каждый новый ключ — проход по всей таблице
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_count (id INTEGER PRIMARY KEY CHECK (id = 1), n INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO rate_limit_count(id, n) SELECT 1, count(*) FROM rate_limits")
+        # upsert существующего ключа AFTER INSERT не вызывает
+        conn.execute(
+          "CREATE TRIGGER IF NOT EXISTS rate_limits_ai AFTER INSERT ON rate_limits "
+          "BEGIN UPDATE rate_limit_count SET n = n + 1 WHERE id = 1; END"
+        )
+        conn.execute(
+          "CREATE TRIGGER IF NOT EXISTS rate_limits_ad AFTER DELETE ON rate_limits "
+          "BEGIN UPDATE rate_limit_count SET n = n - 1 WHERE id = 1; END"
+        )
+        conn.execute("COMMIT")
+      except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+      self._local.conn = conn
+    return conn
+
+  def hit(self, key: str, algorithm: Algorithm, now: float, limit: int, window: float) -> bool:
+    conn = self._conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      row = conn.execute("SELECT a, b, c, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+      state = row[:3] if row is not None and row[3] > now else None
+      allowed, state, expires = algorithm(state, now, limit, window)
+      if row is None:
+        self._make_room(conn)
+      conn.execute(
+        "INSERT INTO rate_limits(key, a, b, c, expires_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET a = excluded.a, b = excluded.b, c = excluded.c, expires_at = excluded.expires_at",
+        (key, *state, expires),
+      )
+      if now >= self._next_sweep:
+        self._next_sweep = now + SWEEP_INTERVAL
+        self._sweep(conn, now)
+      conn.execute("COMMIT")
+    except BaseException:
+      conn.execute("ROLLBACK")
+      raise
+    return allowed
+
+  def _make_room(self, conn: sqlite3.Connection) -> None:
+    """Перед вставкой нового ключа: сверх max_keys забываем те, что истекают раньше всех"""
+    excess = conn.execute("SELECT n FROM rate_limit_count WHERE id = 1").fetchone()[0] + 1 - self.max_keys
+    if excess > 0:
+      conn.execute(
+        "DELETE FROM rate_limits WHERE key IN (SELECT key FROM rate_limits ORDER BY expires_at LIMIT ?)", (excess,)
+      )
+
+  def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+    conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+
+  def __len__(self) -> int:
+    return self._conn().execute("SELECT n FROM rate_limit_count WHERE id = 1").fetchone()[0]
+
+  def clear(self) -> None:
+    self._conn().execute("DELETE FROM rate_limits")
+
+
+class RateLimiter:
+  """allow(key, limit, window_seconds): не больше limit событий за window_seconds на ключ.
+
+  Ошибка хранилища не блокирует пользователей: запрос пропускается, ошибка пишется в лог.
+  """
+
+  def __init__(self, backend, algorithm: str = "sliding_window"):
+    self.backend = backend
+    self.algorithm = ALGORITHMS[algorithm]
+
+  async def allow(self, key: str, limit: int, window_seconds: float) -> bool:
+    try:
+      if self.backend.blocking:
+        return await asyncio.to_thread(self.backend.hit, key, self.algorithm, time.time(), limit, window_seconds)
+      return self.backend.hit(key, self.algorithm, time.time(), limit, window_seconds)
+    except Exception:
+      logger.exception("rate limiter backend failed, allowing %s", key)
       return True
-    if cnt + 1 > limit:
-      return False
-    self._buckets[key] = (start, cnt + 1)
-    return True
 
 
-limiter = InMemoryRateLimiter()
+def _default_sqlite_path(cfg=settings) -> Optional[str]:
+  """Рядом с файлом основной SQLite-БД: crm.db -> crm.ratelimit.db"""
+  url = cfg.database_url
+  if not url.startswith("sqlite:///") or ":memory:" in url:
+    return None
+  root, ext = os.path.splitext(url[len("sqlite:///"):])
+  return f"{root}.ratelimit{ext or '.db'}"
+
 
+def create_limiter(cfg=settings) -> RateLimiter:
+  path = cfg.rate_limit_db or _default_sqlite_path(cfg)
+  if cfg.rate_limit_backend == "sqlite" and path:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    backend = SQLiteBackend(path, cfg.rate_limit_max_keys)
+  else:
+    backend = MemoryBackend(cfg.rate_limit_max_keys)
+  return RateLimiter(backend, cfg.rate_limit_algorithm)
+
+
+class ConcurrencySlot:
+  """Занятое место в ConcurrencyLimiter; release() идемпотентен.
+  Место можно передать фоновой задаче (detached = True) — тогда его освобождает она.
+  """
 
+  def __init__(self, owner: "ConcurrencyLimiter", key: str):
+    self._owner = owner
+    self._key = key
+    self._held = True
+    self.detached = False
 
+  def release(self) -> None:
+    if self._held:
+      self._held = False
+      self._owner._release(self._key)
+
+
+class ConcurrencyLimiter:
+  """Ограничение числа одновременно выполняемых операций на ключ (in-memory, на инстанс).
+  Используется для импортов: не больше N одновременных импортов/задач на пользователя.
+  """
+
+  def __init__(self):
+    self._active: Dict[str, int] = {}
 
+  def acquire(self, key: str, limit: int) -> Optional[ConcurrencySlot]:
+    active = self._active.get(key, 0)
+    if active >= limit:
+      return None
+    self._active[key] = active + 1
+    return ConcurrencySlot(self, key)
 
+  def active(self, key: str) -> int:
+    return self._active.get(key, 0)
 
+  def _release(self, key: str) -> None:
+    left = self._active.get(key, 0) - 1
+    if left > 0:
+      self._active[key] = left
+    else:
+      self._active.pop(key, None)
 
 
+limiter = create_limiter()
+import_limiter = ConcurrencyLimiter()
@@ -0,0 +1,124 @@
+"""
+Полнотекстовый поиск (SQLite FTS5) по всем коллекциям CRM.
+
+На каждую таблицу — своя FTS5-таблица `search_<table>`, rowid которой совпадает с
+rowid исходной строки. Синхронизация — триггерами SQLite, поэтому индекс
+обновляется при любой записи (ORM, bulk insert, clear) без кода в роутерах.
+
+rowid таблиц без INTEGER PRIMARY KEY может поменяться после VACUUM — после него
+индекс нужно перестроить: `python -m app.services.search rebuild`.
+"""
+import json
+import re
+import sys
+from typing import Optional
+
+from sqlalchemy import Integer, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# коллекция API -> (таблица, индексируемая колонка)
+SEARCH_COLLECTIONS: dict[str, tuple[str, str]] = {
+    "contacts": ("contacts", "contact"),
+    "deals": ("deals", "data"),
+    "pipeline": ("pipeline_items", "data"),
+    "companies": ("companies_to_reach", "data"),
+    "advisors": ("advisors", "data"),
+    "investors": ("investors", "data"),
+}
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_table(table: str) -> str:
+    return f"search_{table}"
+
+
+def _body(row: str, column: str) -> str:
+    """SQL-выражение индексируемого текста строки: значения всех ключей data через пробел"""
+    if column == "data":
+        return f"(SELECT group_concat(value, ' ') FROM json_each({row}.data))"
+    return f"{row}.{column}"
+
+
+def _ddl(table: str, column: str) -> list[str]:
+    fts = fts_table(table)
+    new = _body("NEW", column)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(body, tokenize='unicode61 remove_diacritics 2')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, body) VALUES (NEW.rowid, {new});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = OLD.rowid;
+            INSERT INTO {fts}(rowid, body) VALUES (NEW.rowid, {new});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = OLD.rowid;
+        END""",
+    ]
+
+
+def _rebuild(conn, table: str, column: str) -> None:
+    fts = fts_table(table)
+    conn.exec_driver_sql(f"DELETE FROM {fts}")
+    conn.exec_driver_sql(f"INSERT INTO {fts}(rowid, body) SELECT rowid, {_body(table, column)} FROM {table}")
+
+
+def install_search_index(conn) -> None:
+    """Создаёт FTS-таблицы и триггеры; новые таблицы заполняет из существующих строк"""
+    if conn.dialect.name != "sqlite":
+        return
+    for table, column in SEARCH_COLLECTIONS.values():
+        fts = fts_table(table)
+        missing = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first() is None
+        for stmt in _ddl(table, column):
+            conn.exec_driver_sql(stmt)
+        if missing:
+            _rebuild(conn, table, column)
+
+
+def rebuild_search_index(conn) -> None:
+    for table, column in SEARCH_COLLECTIONS.values():
+        _rebuild(conn, table, column)
+
+
+def match_query(q: str) -> Optional[str]:
+    """Пользовательский ввод -> безопасный MATCH: все слова, каждое как префикс"""
+    terms = _TERM_RE.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def rowids_matching(table: str, match: str):
+    """Подзапрос rowid строк таблицы, подходящих под MATCH"""
+    fts = fts_table(table)
+    return text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match").bindparams(match=match).columns(rowid=Integer)
+
+
+async def search_collection(db: AsyncSession, collection: str, match: str, limit: int) -> list[dict]:
+    table, column = SEARCH_COLLECTIONS[collection]
+    fts = fts_table(table)
+    rows = (await db.execute(
+        text(
+            f"SELECT t.id, bm25({fts}) AS score, snippet({fts}, 0, '[', ']', '…', 12) AS snippet, t.{column} AS payload "
+            f"FROM {fts} JOIN {table} t ON t.rowid = {fts}.rowid "
+            f"WHERE {fts} MATCH :match ORDER BY score LIMIT :limit"
+        ),
+        {"match": match, "limit": limit},
+    )).all()
+    if column != "data":
+        return [{"id": r.id, "score": -r.score, "snippet": r.snippet, column: r.payload} for r in rows]
+    return [{"id": r.id, "score": -r.score, "snippet": r.snippet, "data": json.loads(r.payload)} for r in rows]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.services.search rebuild")
+    from ..database import engine
+
+    with engine.begin() as conn:
+        rebuild_search_index(conn)
+    print("✓ Поисковый индекс перестроен")
@@ -0,0 +1,145 @@
+"""
+Быстрый путь сериализации списков: строки из БД кортежами сразу в JSON (orjson),
+без ORM-объектов и без двойной работы Pydantic (model_validate + response_model).
+
+JSON-колонки (`data`) читаются как хранимый текст и вставляются в ответ как есть —
+без json.loads/json.dumps на каждую строку; даты — хранимый текст SQLite,
+приведённый к ISO 8601 (как у Pydantic). Форма ответа совпадает со схемами,
+response_model в декораторе остаётся для OpenAPI.
+
+Для коллекций с гибкой схемой есть компактный колоночный формат (format=columnar
+или Accept): `{"columns": [...], "rows": [[...], ...]}` — ключи `data` не
+повторяются в каждой строке; вариант MessagePack — format=msgpack.
+"""
+from typing import Optional, Sequence
+
+import msgpack
+import orjson
+from fastapi import Query, Request, Response
+from sqlalchemy import String, select, type_coerce
+
+from .pagination import NEXT_CURSOR_HEADER
+from .versions import cache_headers
+
+VALUE = "value"  # обычное значение, кодируется orjson (str, int, bool, Enum)
+JSON = "json"    # JSON-колонка: хранимый текст вставляется без перекодирования
+TIME = "time"    # DateTime: хранимый текст 'YYYY-MM-DD HH:MM:SS[.ffffff]' -> ISO
+
+Fields = Sequence[tuple[str, str]]
+
+# Строка коллекции с гибкой схемой (pipeline, companies, advisors, investors, deals) — как в схемах ответа
+DATA_ROW_FIELDS: Fields = (
+    ("id", VALUE), ("owner_id", VALUE), ("data", JSON), ("created_at", TIME), ("updated_at", TIME),
+)
+
+
+def field_columns(model, fields: Fields) -> list:
+    """Колонки модели под json_rows: JSON и TIME — как сырой текст"""
+    columns = []
+    for name, kind in fields:
+        column = getattr(model, name)
+        if kind in (JSON, TIME):
+            column = type_coerce(column, String)
+        columns.append(column.label(name))
+    return columns
+
+
+def select_fields(model, fields: Fields):
+    """select колонок модели под json_rows"""
+    return select(*field_columns(model, fields))
+
+
+LIST_FORMATS = ("json", "columnar", "msgpack")
+COLUMNAR_MEDIA_TYPE = "application/vnd.crm.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_ACCEPT = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+
+def list_format(
+    request: Request,
+    fmt: Optional[str] = Query(
+        None, alias="format", pattern="^(json|columnar|msgpack)$",
+        description="Формат ответа: json (по умолчанию), columnar — {columns, rows}, msgpack — columnar в MessagePack. "
+        f"Можно выбрать заголовком Accept: {COLUMNAR_MEDIA_TYPE} или {MSGPACK_MEDIA_TYPE}",
+    ),
+) -> str:
+    """Формат ответа списка: параметр format, иначе заголовок Accept"""
+    if fmt:
+        return fmt
+    accept = request.headers.get("accept", "")
+    if any(t in accept for t in _MSGPACK_ACCEPT):
+        return "msgpack"
+    if COLUMNAR_MEDIA_TYPE in accept:
+        return "columnar"
+    return "json"
+
+
+def _iso(value: Optional[str]) -> Optional[str]:
+    if value is not None and len(value) > 10 and value[10] == " ":
+        return value[:10] + "T" + value[11:]
+    return value
+
+
+def _time(value: Optional[str]) -> bytes:
+    return b"null" if value is None else orjson.dumps(_iso(value))
+
+
+def json_rows(rows, fields: Fields) -> bytes:
+    """JSON-массив объектов из строк результата select_fields"""
+    keys = [orjson.dumps(name) + b":" for name, _ in fields]
+    plan = list(zip(range(len(fields)), keys, (kind for _, kind in fields)))
+    out = []
+    for row in rows:
+        parts = []
+        for i, key, kind in plan:
+            value = row[i]
+            if kind == JSON:
+                encoded = value.encode() if value is not None else b"null"
+            elif kind == TIME:
+                encoded = _time(value)
+            else:
+                encoded = orjson.dumps(value)
+            parts.append(key + encoded)
+        out.append(b"{" + b",".join(parts) + b"}")
+    return b"[" + b",".join(out) + b"]"
+
+
+def columnar(rows, fields: Fields, expected: Sequence[str] = ()) -> dict:
+    """{columns, rows}: сначала поля строки, затем ключи `data` (ожидаемые заголовки, потом прочие
+    в порядке появления). Отсутствующий ключ — null; ключ `data`, совпадающий с полем строки,
+    получает префикс `data.`"""
+    plain = [(i, name, kind) for i, (name, kind) in enumerate(fields) if kind != JSON]
+    nested = [i for i, (_, kind) in enumerate(fields) if kind == JSON]
+    decoded = [orjson.loads(row[nested[0]] or "{}") for row in rows] if nested else [{} for _ in rows]
+    keys = dict.fromkeys(expected)
+    for data in decoded:
+        for key in data:
+            keys.setdefault(key)
+    names = [name for _, name, _ in plain]
+    return {
+        "columns": names + [f"data.{k}" if k in names else k for k in keys],
+        "rows": [
+            [_iso(row[i]) if kind == TIME else row[i] for i, _, kind in plain] + [data.get(k) for k in keys]
+            for row, data in zip(rows, decoded)
+        ],
+    }
+
+
+def rows_response(
+    rows,
+    fields: Fields,
+    next_cursor: Optional[str] = None,
+    fmt: str = "json",
+    expected: Sequence[str] = (),
+    etag: Optional[str] = None,
+) -> Response:
+    """Готовый ответ со списком; заголовки из параметра `response` сюда не переносятся"""
+    headers = cache_headers(etag) if etag else {"Vary": "Accept"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fmt == "json":
+        return Response(content=json_rows(rows, fields), media_type="application/json", headers=headers)
+    payload = columnar(rows, fields, expected)
+    if fmt == "msgpack":
+        return Response(content=msgpack.packb(payload, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    return Response(content=orjson.dumps(payload), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
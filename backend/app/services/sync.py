@@ -0,0 +1,105 @@
+"""
+Сверочный повторный импорт (sync) коллекций с гибкой схемой.
+
+Строки файла сопоставляются с существующими по естественному ключу (значения
+ключей `data`, например Company + Date), содержимое сравнивается по row_hash.
+В БД пишутся только отличия: новые строки — вставка, изменённые — update,
+отсутствующие в файле — delete (если попросили). Неизменённые строки не
+трогаются: сохраняются id, created_at, а FTS-триггеры и аудит не срабатывают.
+Всё выполняется в одной транзакции.
+"""
+from collections import defaultdict, deque
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, case, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.promoted import json_field
+from ..models.rowhash import content_hash
+from ..schemas.imports import SyncSummary
+from .bulk import bulk_insert
+
+# Параметров в одном DELETE ... IN (...)
+DELETE_BATCH = 500
+
+
+def _key_value(value) -> str:
+    """Значения ключа из CSV — строки, в БД бывают числами: сравниваем как текст"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def natural_key(data: dict, key: Sequence[str]) -> tuple:
+    return tuple(_key_value(data.get(k)) for k in key)
+
+
+async def sync_collection(
+    db: AsyncSession,
+    model,
+    rows: list[dict],
+    *,
+    key: Sequence[str],
+    prefix: str,
+    owner_id: Optional[str] = None,
+    delete_missing: bool = False,
+) -> SyncSummary:
+    """Приводит коллекцию к содержимому файла; rows — готовые значения `data`.
+
+    Дубликаты ключа сопоставляются по порядку (первая строка файла — с самой старой
+    строкой в БД). Строки с полностью пустым ключом не сопоставляются: из файла
+    пропускаются, в БД не удаляются.
+    """
+    if not key:
+        raise HTTPException(status_code=400, detail="Natural key is required")
+    summary = SyncSummary()
+
+    # Из БД читаются только id, ключ и хэш; data — лишь у строк без хэша (созданных до row_hash)
+    fields = [json_field(model, k) for k in key]
+    query = (
+        select(model.id, model.row_hash, case((model.row_hash.is_(None), model.data)), *fields)
+        .order_by(model.created_at, model.id)
+    )
+    existing: dict[tuple, deque] = defaultdict(deque)
+    for item_id, row_hash, data, *values in (await db.execute(query)).all():
+        k = tuple(_key_value(v) for v in values)
+        if any(k):
+            existing[k].append((item_id, row_hash or content_hash(data)))
+
+    inserts, updates = [], []
+    for data in rows:
+        k = natural_key(data, key)
+        if not any(k):
+            summary.skipped += 1
+            continue
+        matches = existing.get(k)
+        if not matches:
+            inserts.append({"data": data})
+            continue
+        item_id, old_hash = matches.popleft()
+        new_hash = content_hash(data)
+        if new_hash == old_hash:
+            summary.unchanged += 1
+        else:
+            updates.append({"_id": item_id, "data": data, "row_hash": new_hash})
+
+    if inserts:
+        await bulk_insert(db, model, inserts, prefix=prefix, owner_id=owner_id)
+        summary.inserted = len(inserts)
+    if updates:
+        table = model.__table__
+        await db.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(data=bindparam("data"), row_hash=bindparam("row_hash")),
+            updates,
+        )
+        summary.updated = len(updates)
+    if delete_missing:
+        missing = [item_id for matches in existing.values() for item_id, _ in matches]
+        for i in range(0, len(missing), DELETE_BATCH):
+            await db.execute(delete(model).where(model.id.in_(missing[i:i + DELETE_BATCH])))
+        summary.deleted = len(missing)
+    await db.commit()
+    return summary
@@ -0,0 +1,145 @@
+"""
+Потоковое чтение загруженных таблиц (CSV/XLSX) построчно.
+
+Файл не читается в память целиком: CSV идёт через csv.reader поверх файла,
+у XLSX лист разбирается iterparse с очисткой обработанных элементов
+(в памяти остаётся только таблица sharedStrings).
+"""
+import csv
+import io
+import posixpath
+import re
+import zipfile
+from typing import BinaryIO, Iterator, Optional
+from xml.etree.ElementTree import iterparse
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_COL_RE = re.compile(r"[A-Z]+")
+
+
+class TabularFormatError(ValueError):
+    """Файл не удаётся разобрать как CSV/XLSX"""
+
+
+def _csv_rows(fileobj: BinaryIO) -> Iterator[list]:
+    sample = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    try:
+        text_sample = sample.decode("utf-8-sig", errors="ignore")
+        dialect = csv.Sniffer().sniff(text_sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(stream, dialect)
+    except UnicodeDecodeError as e:
+        raise TabularFormatError("CSV must be UTF-8") from e
+    finally:
+        if not stream.closed:
+            stream.detach()  # файл закрывает владелец, не обёртка
+
+
+def _col_index(ref: Optional[str], fallback: int) -> int:
+    if not ref:
+        return fallback
+    letters = _COL_RE.match(ref)
+    if not letters:
+        return fallback
+    index = 0
+    for ch in letters.group(0):
+        index = index * 26 + (ord(ch) - 64)
+    return index - 1
+
+
+def _first_sheet_path(zf: zipfile.ZipFile) -> str:
+    try:
+        with zf.open("xl/workbook.xml") as f:
+            rid = None
+            for _, el in iterparse(f):
+                if el.tag == f"{_NS}sheet":
+                    rid = el.get(f"{_REL_NS}id")
+                    break
+        with zf.open("xl/_rels/workbook.xml.rels") as f:
+            for _, el in iterparse(f):
+                if el.tag == f"{_PKG_REL_NS}Relationship" and el.get("Id") == rid:
+                    target = el.get("Target").lstrip("/")
+                    return target if target.startswith("xl/") else posixpath.normpath(posixpath.join("xl", target))
+    except KeyError:
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, el in iterparse(f):
+            if el.tag == f"{_NS}si":
+                strings.append("".join(t.text or "" for t in el.iter(f"{_NS}t")))
+                el.clear()
+    return strings
+
+
+def _number(raw: str):
+    try:
+        value = float(raw)
+    except ValueError:
+        return raw
+    return int(value) if value.is_integer() else value
+
+
+def _xlsx_rows(fileobj: BinaryIO) -> Iterator[list]:
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise TabularFormatError("Not an XLSX file") from e
+    with zf:
+        shared = _shared_strings(zf)
+        with zf.open(_first_sheet_path(zf)) as sheet:
+            for _, el in iterparse(sheet):
+                if el.tag != f"{_NS}row":
+                    continue
+                row: list = []
+                for c in el.iter(f"{_NS}c"):
+                    col = _col_index(c.get("r"), len(row))
+                    kind = c.get("t")
+                    v = c.find(f"{_NS}v")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(f"{_NS}t"))
+                    elif v is None or v.text is None:
+                        value = ""
+                    elif kind == "s":
+                        value = shared[int(v.text)]
+                    elif kind == "b":
+                        value = v.text == "1"
+                    elif kind in ("str", "e"):
+                        value = v.text
+                    else:
+                        value = _number(v.text)
+                    row.extend([""] * (col - len(row) + 1))
+                    row[col] = value
+                el.clear()
+                yield row
+
+
+def iter_records(fileobj: BinaryIO, filename: str) -> tuple[list[str], Iterator[dict]]:
+    """(заголовок, итератор строк-словарей) для CSV/XLSX; формат — по расширению"""
+    name = (filename or "").lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        rows = _xlsx_rows(fileobj)
+    elif name.endswith((".csv", ".txt")):
+        rows = _csv_rows(fileobj)
+    else:
+        raise TabularFormatError("Unsupported file type, expected .csv or .xlsx")
+    header = [str(h).strip() for h in next(rows, [])]
+    if not any(header):
+        raise TabularFormatError("Empty file")
+
+    def records() -> Iterator[dict]:
+        for row in rows:
+            yield {h: (row[i] if i < len(row) else "") for i, h in enumerate(header) if h}
+
+    return header, records()
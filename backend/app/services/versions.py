@@ -0,0 +1,212 @@
+"""
+Версии коллекций для условных GET (ETag / If-None-Match -> 304) и журнал изменений.
+
+У каждой коллекции — строка в `collection_versions` со счётчиком, который
+увеличивают триггеры SQLite на INSERT/UPDATE/DELETE таблицы. Поэтому версию
+меняет любой путь записи (ORM, bulk insert, sync, clear) без кода в роутерах.
+`epoch` — случайная метка, заданная при создании строки: после пересоздания
+базы старые ETag не совпадут с новыми, даже если счётчик повторится.
+
+Списки отдают сильный ETag из версии и параметров запроса и на совпавший
+If-None-Match отвечают 304, прочитав только строку версии — без запроса к таблице.
+
+Те же триггеры пишут `change_log` для коллекций с данными: по одной записи
+на строку (collection, row_id) с последней операцией — upsert или delete
+(tombstone). INSERT OR REPLACE выдаёт записи новый seq, так что повторные
+правки строки журнал не растят, а выборка `seq > since` (services/changes.py)
+отдаёт всё, что изменилось.
+
+Tombstones так не сжимаются: id строк случайные, и каждый clear + импорт
+оставляет по записи на удалённую строку. Поэтому delete старше
+CHANGE_LOG_RETENTION_DAYS удаляются при старте (или `python -m
+app.services.versions prune`), а наибольший удалённый seq коллекции
+запоминается в `collection_versions.min_seq`: токен старше него мог пропустить
+удаление, и /changes отвечает на него 410 — клиент загружает коллекцию заново.
+"""
+import hashlib
+import sys
+from typing import Optional, Sequence
+
+from fastapi import Request, Response
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from .search import SEARCH_COLLECTIONS
+
+VERSIONS_TABLE = "collection_versions"
+CHANGE_LOG_TABLE = "change_log"
+
+# коллекция API -> таблица
+VERSIONED_COLLECTIONS: dict[str, str] = {
+    **{collection: table for collection, (table, _) in SEARCH_COLLECTIONS.items()},
+    "users": "users",
+}
+
+# Коллекции с журналом изменений (users туда не попадает: в строках хэши паролей)
+LOGGED_COLLECTIONS = frozenset(SEARCH_COLLECTIONS)
+
+# Колонки, изменение только которых версию не меняет: last_login пишется фоном
+# (services/activity.py) раз в интервал и не должен сбрасывать ETag списка
+UNVERSIONED_COLUMNS: dict[str, tuple[str, ...]] = {"users": ("last_login",)}
+
+
+def _log(collection: str, row_id: str, op: str, when: str = "") -> str:
+    return (
+        f"INSERT OR REPLACE INTO {CHANGE_LOG_TABLE}(collection, row_id, op, changed_at) "
+        f"SELECT '{collection}', {row_id}, '{op}', datetime('now') {when};"
+    )
+
+
+def _ddl(collection: str, table: str, columns: Sequence[str] = ()) -> list[str]:
+    bump = f"UPDATE {VERSIONS_TABLE} SET version = version + 1 WHERE collection = '{collection}';"
+    when = ""
+    skipped = UNVERSIONED_COLUMNS.get(collection, ())
+    if skipped:
+        changed = [f'OLD."{c}" IS NOT NEW."{c}"' for c in columns if c not in skipped]
+        when = f"WHEN {' OR '.join(changed)} " if changed else ""
+    on_insert = on_update = on_delete = bump
+    if collection in LOGGED_COLLECTIONS:
+        on_insert += _log(collection, "NEW.id", "upsert")
+        # смена id — для клиента это удаление старой строки и появление новой
+        on_update += _log(collection, "OLD.id", "delete", "WHERE OLD.id <> NEW.id") + _log(collection, "NEW.id", "upsert")
+        on_delete += _log(collection, "OLD.id", "delete")
+    # триггеры пересоздаются на каждом старте: тело могло поменяться между версиями
+    return [
+        f"INSERT OR IGNORE INTO {VERSIONS_TABLE}(collection, epoch, version) VALUES ('{collection}', lower(hex(randomblob(4))), 0)",
+        f"DROP TRIGGER IF EXISTS version_{table}_ai",
+        f"DROP TRIGGER IF EXISTS version_{table}_au",
+        f"DROP TRIGGER IF EXISTS version_{table}_ad",
+        f"CREATE TRIGGER version_{table}_ai AFTER INSERT ON {table} BEGIN {on_insert} END",
+        f"CREATE TRIGGER version_{table}_au AFTER UPDATE ON {table} {when}BEGIN {on_update} END",
+        f"CREATE TRIGGER version_{table}_ad AFTER DELETE ON {table} BEGIN {on_delete} END",
+    ]
+
+
+def _columns(conn, table: str) -> list[str]:
+    return [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+
+
+def install_collection_versions(conn) -> None:
+    """Создаёт таблицы версий и журнала, их строки и триггеры; новый журнал заполняет текущими строками,
+    из старого удаляет tombstones за горизонтом хранения"""
+    if conn.dialect.name != "sqlite":
+        return
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} ("
+        "collection TEXT PRIMARY KEY, epoch TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0, "
+        "min_seq INTEGER NOT NULL DEFAULT 0)"
+    )
+    if "min_seq" not in _columns(conn, VERSIONS_TABLE):
+        conn.exec_driver_sql(f"ALTER TABLE {VERSIONS_TABLE} ADD COLUMN min_seq INTEGER NOT NULL DEFAULT 0")
+    log_missing = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGE_LOG_TABLE,)
+    ).first() is None
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, row_id TEXT NOT NULL, "
+        "op TEXT NOT NULL, changed_at TEXT, UNIQUE (collection, row_id))"
+    )
+    if "changed_at" not in _columns(conn, CHANGE_LOG_TABLE):
+        # журнал до горизонта хранения: возраст старых записей неизвестен — отсчитываем от обновления
+        conn.exec_driver_sql(f"ALTER TABLE {CHANGE_LOG_TABLE} ADD COLUMN changed_at TEXT")
+        conn.exec_driver_sql(f"UPDATE {CHANGE_LOG_TABLE} SET changed_at = datetime('now')")
+    conn.exec_driver_sql(
+        f"CREATE INDEX IF NOT EXISTS ix_{CHANGE_LOG_TABLE}_collection_seq ON {CHANGE_LOG_TABLE}(collection, seq)"
+    )
+    conn.exec_driver_sql(
+        f"CREATE INDEX IF NOT EXISTS ix_{CHANGE_LOG_TABLE}_tombstones ON {CHANGE_LOG_TABLE}(changed_at) WHERE op = 'delete'"
+    )
+    for collection, table in VERSIONED_COLLECTIONS.items():
+        for stmt in _ddl(collection, table, _columns(conn, table)):
+            conn.exec_driver_sql(stmt)
+        if log_missing and collection in LOGGED_COLLECTIONS:
+            conn.exec_driver_sql(
+                f"INSERT INTO {CHANGE_LOG_TABLE}(collection, row_id, op, changed_at) "
+                f"SELECT '{collection}', id, 'upsert', datetime('now') FROM {table} ORDER BY created_at, id"
+            )
+    if settings.change_log_retention_days > 0:
+        prune_change_log(conn, settings.change_log_retention_days)
+
+
+def prune_change_log(conn, days: float) -> int:
+    """Удаляет tombstones старше days дней и сдвигает min_seq их коллекций; -> число удалённых"""
+    expired = f"op = 'delete' AND changed_at < datetime('now', '-{float(days)} days')"
+    conn.exec_driver_sql(
+        f"UPDATE {VERSIONS_TABLE} SET min_seq = max(min_seq, ("
+        f"SELECT max(seq) FROM {CHANGE_LOG_TABLE} l WHERE l.collection = {VERSIONS_TABLE}.collection AND {expired})) "
+        f"WHERE collection IN (SELECT collection FROM {CHANGE_LOG_TABLE} WHERE {expired})"
+    )
+    return conn.exec_driver_sql(f"DELETE FROM {CHANGE_LOG_TABLE} WHERE {expired}").rowcount
+
+
+async def change_log_horizon(db: AsyncSession, collection: str) -> Optional[tuple[str, int]]:
+    """(epoch, min_seq) коллекции: токены старше min_seq могли пропустить удалённые tombstones"""
+    row = (await db.execute(
+        text(f"SELECT epoch, min_seq FROM {VERSIONS_TABLE} WHERE collection = :collection"), {"collection": collection}
+    )).first()
+    return tuple(row) if row is not None else None
+
+
+async def list_etag(db: AsyncSession, collection: str, request: Request, fmt: str = "json") -> Optional[str]:
+    """Сильный ETag списка: версия коллекции + параметры запроса и формат ответа.
+
+    Версию читаем до строк списка: если запись проскочит между ними, ETag окажется
+    старше данных и клиент просто перезапросит их ещё раз, но не наоборот.
+    """
+    if db.bind.dialect.name != "sqlite":
+        return None
+    row = (await db.execute(
+        text(f"SELECT epoch, version FROM {VERSIONS_TABLE} WHERE collection = :collection"),
+        {"collection": collection},
+    )).first()
+    if row is None:
+        return None
+    variant = hashlib.blake2b(f"{fmt}?{request.url.query}".encode(), digest_size=6).hexdigest()
+    return f'"{row.epoch}-{row.version}-{variant}"'
+
+
+async def collections_version(db: AsyncSession, collections) -> Optional[str]:
+    """Общая версия нескольких коллекций: меняется при записи в любую из них"""
+    if db.bind.dialect.name != "sqlite":
+        return None
+    names = sorted(set(collections))
+    rows = (await db.execute(
+        text(f"SELECT collection, epoch, version FROM {VERSIONS_TABLE} WHERE collection IN :names")
+        .bindparams(bindparam("names", expanding=True)),
+        {"names": names},
+    )).all()
+    if len(rows) != len(names):
+        return None
+    return ",".join(f"{r.collection}:{r.epoch}-{r.version}" for r in sorted(rows))
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    """Браузер хранит ответ, но перед каждым использованием сверяет его по ETag"""
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """304 без тела, если If-None-Match совпал с текущим ETag"""
+    header = request.headers.get("if-none-match")
+    if not etag or not header:
+        return None
+    # If-None-Match сравнивается слабо: префикс W/ не учитываем
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+
+def prune() -> int:
+    """Очистка журнала на синхронном движке — для CLI"""
+    from ..database import engine
+
+    with engine.begin() as conn:
+        return prune_change_log(conn, settings.change_log_retention_days)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["prune"] or settings.change_log_retention_days <= 0:
+        sys.exit("usage: CHANGE_LOG_RETENTION_DAYS=<дней> python -m app.services.versions prune")
+    print(f"✓ Удалено tombstones: {prune()}")
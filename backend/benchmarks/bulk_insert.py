@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк вставки импорта в pipeline_items (с FTS-триггерами и индексами
+вынесенных ключей) — строк в секунду для разных способов:
+
+  orm_refresh  ORM-объект на строку, commit, refresh каждой строки (старый import_contacts/import_deals)
+  orm          ORM-объект на строку, commit (старый import_items)
+  bulk         services.bulk.bulk_insert: Core insert + executemany, без refresh
+
+Вставка идёт порциями по services.imports.CHUNK_SIZE с коммитом на порцию, как /upload.
+
+    python -m benchmarks.bulk_insert --sizes 10000 100000 1000000 --baseline-max 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli"]
+STATUSES = ["Active", "On hold", "Closed", "Lost"]
+
+
+def _row(i: int) -> dict:
+    return {
+        "Company": f"{COMPANIES[i % 5]} {i}", "Date": f"2024-{i % 12 + 1:02d}-15", "Sector": "Tech",
+        "Seniot": "Ivanov", "Junior team": "Petrov", "Source": "Inbound", "Source Name": f"Source {i % 97}",
+        "Type": "M&A", "Size, RUB mn": str(i % 5000), "Status": STATUSES[i % 4], "Next connection": "",
+        "Comments": "imported by benchmark",
+    }
+
+
+async def _run(strategy: str, size: int) -> float:
+    from sqlalchemy import delete
+    from app.database import AsyncSessionLocal
+    from app.models.pipeline import PipelineItem
+    from app.services.bulk import bulk_insert, new_id
+    from app.services.imports import CHUNK_SIZE
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PipelineItem))
+        await db.commit()
+        started = time.perf_counter()
+        for offset in range(0, size, CHUNK_SIZE):
+            rows = [_row(i) for i in range(offset, min(offset + CHUNK_SIZE, size))]
+            if strategy == "bulk":
+                await bulk_insert(db, PipelineItem, [{"data": r} for r in rows], prefix="p", owner_id="u_bench")
+                await db.commit()
+                continue
+            items = [PipelineItem(id=new_id("p"), owner_id="u_bench", data=r) for r in rows]
+            db.add_all(items)
+            await db.commit()
+            if strategy == "orm_refresh":
+                for item in items:
+                    await db.refresh(item)
+            db.expunge_all()
+        return time.perf_counter() - started
+
+
+async def _main(sizes: list[int], baseline_max: int) -> None:
+    from app.database import init_db
+
+    init_db()
+    print(f"{'strategy':<12} {'rows':>9} {'seconds':>9} {'rows/s':>10}")
+    for size in sizes:
+        for strategy in ("orm_refresh", "orm", "bulk"):
+            if strategy != "bulk" and size > baseline_max:
+                continue
+            elapsed = await _run(strategy, size)
+            print(f"{strategy:<12} {size:>9} {elapsed:>9.2f} {size / elapsed:>10.0f}", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--baseline-max", type=int, default=100000, help="ORM-варианты только до этого размера")
+    args = parser.parse_args()
+    # Отдельная временная БД: движки app.database создаются при импорте по DATABASE_URL
+    path = os.path.join(tempfile.mkdtemp(prefix="crm-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    asyncio.run(_main(args.sizes, args.baseline_max))
+
+
+if __name__ == "__main__":
+    main()
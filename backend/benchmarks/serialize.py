@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк ответа списка: стоимость строки (мкс) для старого и быстрого пути.
+
+  pydantic  select(Model) -> ORM-объекты -> Schema.model_validate на строку ->
+            повторная валидация и сериализация response_model (как делает FastAPI) -> json.dumps
+  fast      services.serialize: select кортежей (data и даты — сырым текстом) -> json_rows (orjson)
+
+Замеры «fetch+encode» включают чтение из SQLite; «encode» — только сериализацию
+уже прочитанных строк.
+
+    python -m benchmarks.serialize --rows 5000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+
+async def _seed(rows: int) -> None:
+    from app.database import AsyncSessionLocal
+    from app.models.pipeline import PipelineItem
+    from app.services.bulk import bulk_insert
+    from benchmarks.bulk_insert import _row
+
+    async with AsyncSessionLocal() as db:
+        await bulk_insert(db, PipelineItem, [{"data": _row(i)} for i in range(rows)], prefix="p", owner_id="u_bench")
+        await db.commit()
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def _main(rows: int, repeat: int) -> None:
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from app.database import AsyncSessionLocal, init_db
+    from app.models.pipeline import PipelineItem as PipelineModel
+    from app.schemas.pipeline import PipelineItem
+    from app.services.serialize import DATA_ROW_FIELDS, json_rows, select_fields
+
+    init_db()
+    await _seed(rows)
+    adapter = TypeAdapter(List[PipelineItem])
+
+    def pydantic_encode(items) -> bytes:
+        content = [PipelineItem.model_validate(x) for x in items]
+        # response_model: validate + serialize(mode="json"), затем JSONResponse.render
+        value = adapter.validate_python([c.model_dump() for c in content])
+        data = adapter.dump_python(value, mode="json")
+        return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    async with AsyncSessionLocal() as db:
+        async def fetch_orm():
+            db.expunge_all()
+            return (await db.execute(select(PipelineModel).order_by(PipelineModel.created_at))).scalars().all()
+
+        async def fetch_rows():
+            return (await db.execute(select_fields(PipelineModel, DATA_ROW_FIELDS).order_by(PipelineModel.created_at))).all()
+
+        async def timed(fn) -> float:
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await fn()
+                best = min(best, time.perf_counter() - started)
+            return best
+
+        async def old_path():
+            pydantic_encode(await fetch_orm())
+
+        async def new_path():
+            json_rows(await fetch_rows(), DATA_ROW_FIELDS)
+
+        results = {
+            ("pydantic", "fetch+encode"): await timed(old_path),
+            ("fast", "fetch+encode"): await timed(new_path),
+        }
+        items, tuples = await fetch_orm(), await fetch_rows()
+        results[("pydantic", "encode")] = _best(lambda: pydantic_encode(items), repeat)
+        results[("fast", "encode")] = _best(lambda: json_rows(tuples, DATA_ROW_FIELDS), repeat)
+
+    print(f"{rows} строк, лучший из {repeat} прогонов")
+    print(f"{'path':<10} {'stage':<14} {'ms':>8} {'us/row':>8}")
+    for (path, stage), seconds in results.items():
+        print(f"{path:<10} {stage:<14} {seconds * 1000:>8.1f} {seconds / rows * 1e6:>8.2f}")
+    for stage in ("fetch+encode", "encode"):
+        print(f"{stage}: x{results[('pydantic', stage)] / results[('fast', stage)]:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix="crm-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    asyncio.run(_main(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк профиля SQLite: смешанная нагрузка чтение/запись из нескольких процессов
+(как uvicorn --workers 4 на одном crm.db) — до и после PRAGMA из Settings.
+
+    python -m benchmarks.sqlite_profile --workers 4 --seconds 10 --write-ratio 0.1
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from app.config import settings
+from app.database import sqlite_pragmas, apply_sqlite_pragmas
+
+SEED_ROWS = 20000
+
+
+def _connect(path: str, tuned: bool) -> sqlite3.Connection:
+    # timeout по умолчанию (5 с) — как у исходного движка pysqlite; профиль задаёт busy_timeout PRAGMA
+    conn = sqlite3.connect(path, isolation_level=None)
+    if tuned:
+        apply_sqlite_pragmas(conn, sqlite_pragmas(settings))
+    return conn
+
+
+def _seed(path: str, tuned: bool) -> None:
+    conn = _connect(path, tuned)
+    conn.execute("CREATE TABLE pipeline_items (id TEXT PRIMARY KEY, owner_id TEXT, data JSON NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME)")
+    rows = [
+        (f"p_{uuid.uuid4().hex[:12]}", "u_admin", json.dumps({"Company": f"Company {i}", "Status": random.choice(["Active", "Closed", "Lost"]), "Size, RUB mn": i % 500}))
+        for i in range(SEED_ROWS)
+    ]
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO pipeline_items (id, owner_id, data) VALUES (?, ?, ?)", rows)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _worker(path: str, tuned: bool, seconds: float, write_ratio: float, out: mp.Queue) -> None:
+    conn = _connect(path, tuned)
+    reads = writes = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if random.random() < write_ratio:
+                # небольшая «импортная» транзакция
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO pipeline_items (id, owner_id, data) VALUES (?, ?, ?)",
+                    [(f"p_{uuid.uuid4().hex[:12]}", "u_admin", '{"Company": "New", "Status": "Active"}') for _ in range(50)],
+                )
+                conn.execute("COMMIT")
+                writes += 1
+            else:
+                offset = random.randint(0, SEED_ROWS - 200)
+                conn.execute("SELECT id, owner_id, data, created_at, updated_at FROM pipeline_items LIMIT 200 OFFSET ?", (offset,)).fetchall()
+                reads += 1
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            locked += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    out.put((reads, writes, locked))
+
+
+def run(tuned: bool, workers: int, seconds: float, write_ratio: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _seed(path, tuned)
+        out: mp.Queue = mp.Queue()
+        procs = [mp.Process(target=_worker, args=(path, tuned, seconds, write_ratio, out)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+    reads = sum(r[0] for r in results)
+    writes = sum(r[1] for r in results)
+    locked = sum(r[2] for r in results)
+    return {"reads/s": reads / seconds, "writes/s": writes / seconds, "locked errors": locked}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    for label, tuned in (("default (rollback journal, без PRAGMA)", False), ("tuned (Settings.sqlite_*)", True)):
+        res = run(tuned, args.workers, args.seconds, args.write_ratio)
+        print(f"{label:42} " + "  ".join(f"{k}={v:,.0f}" for k, v in res.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Общие фикстуры тестов: приложение на временной SQLite-базе.
+
+DATABASE_URL задаётся до импорта app — движки создаются при импорте app.database.
+База одна на сессию: тесты не рассчитывают на пустые таблицы и сверяют
+итоги с прямым запросом к тем же таблицам.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="crm-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/crm.db"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import engine, init_db
+from app.main import app
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Схема, триггеры и служебные таблицы — и для тестов без клиента"""
+    init_db()
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    r = client.post("/api/auth/register", json={
+        "email": "admin@example.com", "password": "secret1", "name": "Admin", "role": "admin",
+    })
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def run(client):
+    """Выполняет корутину в цикле приложения (тот же async-движок и пул)"""
+    return lambda fn, *args: client.portal.call(fn, *args)
+
+
+@pytest.fixture
+def sql():
+    """Строки запроса на синхронном движке"""
+    def execute(statement: str, *params):
+        with engine.begin() as conn:
+            return conn.exec_driver_sql(statement, tuple(params)).all()
+    return execute
+
+
+@pytest.fixture
+def pipeline_row():
+    """Строка pipeline со всеми ожидаемыми колонками импорта; fields переопределяют значения"""
+    from app.routers.pipeline import EXPECTED_HEADERS
+
+    def make(**fields) -> dict:
+        return {**{header: "" for header in EXPECTED_HEADERS}, **fields}
+    return make
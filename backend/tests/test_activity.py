@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from app.services.activity import tracker
+
+
+def _user(sql, user_id: str):
+    return sql("SELECT last_login, updated_at FROM users WHERE id = ?", user_id)[0]
+
+
+def _version(sql) -> int:
+    return sql("SELECT version FROM collection_versions WHERE collection = 'users'")[0][0]
+
+
+def test_last_login_flush_keeps_users_version(client, admin_headers, sql, run):
+    user_id = client.get("/api/auth/me", headers=admin_headers).json()["id"]
+    run(tracker.flush)
+    _, updated_at = _user(sql, user_id)
+    version = _version(sql)
+    etag = client.get("/api/users", headers=admin_headers).headers["etag"]
+
+    seen = datetime(2031, 1, 1, 12, 0)
+    tracker.touch(user_id, seen)
+    assert run(tracker.flush) == 1
+    last_login, updated_after = _user(sql, user_id)
+    assert last_login.startswith("2031-01-01 12:00")
+    assert updated_after == updated_at
+    assert _version(sql) == version
+    assert client.get("/api/users", headers={**admin_headers, "If-None-Match": etag}).status_code == 304
+
+    # правка пользователя версию меняет
+    assert client.put(f"/api/users/{user_id}", json={"name": "Admin 2"}, headers=admin_headers).status_code == 200
+    assert _version(sql) > version
@@ -0,0 +1,17 @@
+def test_owner_totals_follow_user_rename(client, admin_headers, pipeline_row):
+    h = admin_headers
+    me = client.get("/api/auth/me", headers=h).json()
+    assert client.post("/api/pipeline", json={"data": pipeline_row(Company="Owned")}, headers=h).status_code == 201
+
+    def owners(etag=None):
+        headers = {**h, "If-None-Match": etag} if etag else h
+        return client.get("/api/analytics/owners", params={"collections": "pipeline"}, headers=headers)
+
+    first = owners()
+    assert next(g for g in first.json() if g["key"] == me["id"])["email"] == me["email"]
+    assert owners(first.headers["etag"]).status_code == 304
+
+    assert client.put(f"/api/users/{me['id']}", json={"name": "Renamed Owner"}, headers=h).status_code == 200
+    second = owners(first.headers["etag"])
+    assert second.status_code == 200
+    assert next(g for g in second.json() if g["key"] == me["id"])["name"] == "Renamed Owner"
@@ -0,0 +1,44 @@
+import random
+import uuid
+from datetime import datetime
+
+from app.database import engine
+from app.services.audit_store import AUDIT_PARTITION_PREFIX, ROLLUP_TABLE, list_partitions, write_events
+
+
+def test_rollup_matches_group_by(sql):
+    rnd = random.Random(22)
+    users = [f"u_{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    events = [
+        {
+            "id": f"al_{uuid.uuid4().hex[:12]}",
+            "user_id": rnd.choice(users + [None]),
+            "action": rnd.choice(["import", "update", "delete", "change_password"]),
+            "entity": entity,
+            "entity_id": rnd.choice(users) if entity == "user" else None,
+            "ip": None,
+            "ua": None,
+            "meta": {},
+            # несколько партиций: сводка общая для всех месяцев
+            "created_at": datetime(2030, rnd.randint(1, 3), rnd.randint(1, 28), rnd.randint(0, 23)),
+        }
+        for entity in (rnd.choice(["pipeline", "user"]) for _ in range(200))
+    ]
+    for start in range(0, len(events), 50):
+        with engine.begin() as conn:
+            write_events(conn, events[start:start + 50])
+
+    with engine.connect() as conn:
+        tables = [f"{AUDIT_PARTITION_PREFIX}{m}" for m in list_partitions(conn)]
+    journal = " UNION ALL ".join(f"SELECT user_id, action, entity, entity_id, created_at FROM {t}" for t in tables)
+    marks = ", ".join("?" * len(users))
+    expected = sql(
+        f"SELECT user_id, action, 'actor', max(created_at), count(*) FROM ({journal}) "
+        f"WHERE user_id IN ({marks}) GROUP BY user_id, action "
+        f"UNION ALL SELECT entity_id, action, 'target', max(created_at), count(*) FROM ({journal}) "
+        f"WHERE entity = 'user' AND entity_id IN ({marks}) GROUP BY entity_id, action",
+        *users, *users,
+    )
+    rollup = sql(f"SELECT user_id, action, side, last_at, count FROM {ROLLUP_TABLE} WHERE user_id IN ({marks})", *users)
+    assert sorted(rollup) == sorted(expected)
+    assert sum(row[4] for row in rollup if row[2] == "actor") == sum(1 for e in events if e["user_id"])
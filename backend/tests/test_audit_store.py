@@ -0,0 +1,116 @@
+import uuid
+from datetime import datetime
+
+import orjson
+import pytest
+
+from app.database import engine
+from app.services import audit_store
+from app.services.audit import AuditSink
+from app.services.audit_store import AUDIT_PARTITION_PREFIX, archive_partitions, read_archive, read_events, write_events
+
+
+def _event(**fields) -> dict:
+    return {
+        "id": f"al_{uuid.uuid4().hex[:12]}",
+        "user_id": "u_test",
+        "action": "test",
+        "entity": "test",
+        "entity_id": None,
+        "ip": None,
+        "ua": None,
+        "meta": {},
+        "created_at": datetime.utcnow(),
+        **fields,
+    }
+
+
+def test_flush_more_strings_than_cache(run, monkeypatch):
+    monkeypatch.setattr(audit_store, "STRINGS_CACHE_SIZE", 5)
+    audit_store._string_ids.clear()
+    entity_id = uuid.uuid4().hex
+    sink = AuditSink(interval=1.0, size=100, batch=100)
+    # часть строк уже в кэше, новые его переполняют
+    first = [_event(entity_id=entity_id, ua="ua1", ip="ip1")]
+    second = [_event(entity_id=entity_id, ua=f"ua{i}", ip="ip1", meta={"email": f"e{i}@x"}) for i in range(1, 8)]
+    for batch in (first, second):
+        sink._buffer.extend(batch)
+        assert run(sink.flush) == len(batch)
+    assert not sink._buffer
+
+    with engine.connect() as conn:
+        events = read_events(conn, entity_id=entity_id)
+    expected = {(e["id"], e["ua"], e["ip"], e["meta"].get("email")) for e in first + second}
+    assert {(e["id"], e["ua"], e["ip"], e["meta"].get("email")) for e in events} == expected
+
+
+def test_failing_batch_goes_to_dead_letter(run, tmp_path):
+    entity_id = uuid.uuid4().hex
+    dead_letter = tmp_path / "dead.jsonl"
+    sink = AuditSink(interval=1.0, size=100, batch=1, max_attempts=3, dead_letter=str(dead_letter))
+    bad = _event(entity_id=entity_id, action=None)  # NOT NULL — БД пакет не примет
+    good = _event(entity_id=entity_id)
+    sink._buffer.extend([bad, good])
+    for _ in range(2):
+        with pytest.raises(Exception):
+            run(sink.flush)
+        assert len(sink._buffer) == 2
+    # третья неудача: пакет в dead letter, очередь пишется дальше
+    assert run(sink.flush) == 1
+    assert not sink._buffer
+    assert sink.stats()["dead_lettered"] == 1
+    assert [orjson.loads(line)["id"] for line in dead_letter.read_bytes().splitlines()] == [bad["id"]]
+    with engine.connect() as conn:
+        assert [e["id"] for e in read_events(conn, entity_id=entity_id)] == [good["id"]]
+
+
+def test_rearchived_month_keeps_first_archive(tmp_path):
+    old = datetime(2001, 1, 15)
+    first = [_event(created_at=old) for _ in range(3)]
+    late = [_event(created_at=old)]
+    paths = []
+    for batch in (first, late):
+        with engine.begin() as conn:
+            write_events(conn, batch)
+        with engine.begin() as conn:
+            paths += archive_partitions(conn, 12, str(tmp_path))
+    assert [p.rsplit("/", 1)[1] for p in paths] == ["audit-2001-01.jsonl.gz", "audit-2001-01-2.jsonl.gz"]
+    assert {e["id"] for e in read_archive(paths[0])} == {e["id"] for e in first}
+    assert {e["id"] for e in read_archive(paths[1])} == {e["id"] for e in late}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_write_recreates_partition_dropped_by_another_worker():
+    month = datetime(2002, 3, 1)
+    with engine.begin() as conn:
+        write_events(conn, [_event(created_at=month)])
+    # другой воркер выгрузил месяц: таблицы нет, а кэш этого процесса о ней помнит
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {AUDIT_PARTITION_PREFIX}200203")
+    assert "200203" in audit_store._known_months
+    late = _event(created_at=month)
+    with engine.begin() as conn:
+        write_events(conn, [late])
+    with engine.connect() as conn:
+        events = read_events(conn, since=month, until=datetime(2002, 4, 1))
+    assert [e["id"] for e in events] == [late["id"]]
+
+
+def test_rolled_back_strings_are_not_cached(run):
+    entity_id = uuid.uuid4().hex
+    victim, other = f"victim-{entity_id}@x", f"other-{entity_id}@x"
+    failing = AuditSink(interval=1.0, size=100, batch=100, max_attempts=100)
+    # строка victim попадает в audit_strings, но пакет откатывается на NOT NULL
+    failing._buffer.append(_event(entity_id=entity_id, action=None, meta={"email": victim}))
+    with pytest.raises(Exception):
+        run(failing.flush)
+    # откатившийся rowid SQLite отдаёт следующей строке
+    sink = AuditSink(interval=1.0, size=100, batch=100)
+    later = [_event(entity_id=entity_id, meta={"email": other}), _event(entity_id=entity_id, meta={"email": victim})]
+    for event in later:
+        sink._buffer.append(event)
+        assert run(sink.flush) == 1
+
+    with engine.connect() as conn:
+        events = read_events(conn, entity_id=entity_id)
+    assert {e["id"]: e["meta"].get("email") for e in events} == {e["id"]: e["meta"]["email"] for e in later}
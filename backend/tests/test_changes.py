@@ -0,0 +1,80 @@
+import uuid
+
+from app.database import engine
+from app.services.events import broadcaster
+from app.services.versions import CHANGE_LOG_TABLE, prune_change_log
+
+
+def _changes(client, headers, since=None):
+    params = {"since": since} if since else {}
+    r = client.get("/api/pipeline/changes", params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_changes_since_token(client, admin_headers, pipeline_row):
+    h = admin_headers
+    tag = uuid.uuid4().hex[:8]
+    kept, edited, removed = (
+        client.post("/api/pipeline", json={"data": pipeline_row(Company=f"{name}-{tag}")}, headers=h).json()["id"]
+        for name in ("kept", "edited", "removed")
+    )
+    token = _changes(client, h)["token"]
+    while True:
+        page = _changes(client, h, token)
+        token = page["token"]
+        if not page["more"]:
+            break
+
+    added = client.post("/api/pipeline", json={"data": pipeline_row(Company=f"added-{tag}")}, headers=h).json()["id"]
+    assert client.put(f"/api/pipeline/{edited}", json={"data": pipeline_row(Company=f"edited-{tag}", Status="Won")}, headers=h).status_code == 200
+    assert client.delete(f"/api/pipeline/{removed}", headers=h).status_code == 204
+
+    page = _changes(client, h, token)
+    assert {item["id"] for item in page["items"]} == {added, edited}
+    assert next(item for item in page["items"] if item["id"] == edited)["data"]["Status"] == "Won"
+    assert page["deleted"] == [removed]
+    assert kept not in page["deleted"]
+    # с новым токеном изменений нет
+    assert _changes(client, h, page["token"]) == {"items": [], "deleted": [], "token": page["token"], "more": False}
+
+
+def test_foreign_token_is_rejected(client, admin_headers):
+    assert client.get("/api/pipeline/changes", params={"since": "deadbeef.1"}, headers=admin_headers).status_code == 410
+
+
+def _drain(client, headers, token=None):
+    deleted = []
+    while True:
+        page = _changes(client, headers, token)
+        deleted += page["deleted"]
+        token = page["token"]
+        if not page["more"]:
+            return token, deleted
+
+
+def test_expired_tombstones_are_pruned(client, admin_headers, pipeline_row, run):
+    h = admin_headers
+    tag = uuid.uuid4().hex[:8]
+    removed = client.post("/api/pipeline", json={"data": pipeline_row(Company=f"old-{tag}")}, headers=h).json()["id"]
+    before, _ = _drain(client, h)
+    assert client.delete(f"/api/pipeline/{removed}", headers=h).status_code == 204
+    after, deleted = _drain(client, h, before)
+    assert deleted == [removed]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"UPDATE {CHANGE_LOG_TABLE} SET changed_at = datetime('now', '-40 days') WHERE row_id = ?", (removed,)
+        )
+        assert prune_change_log(conn, 30) == 1
+
+    # полная синхронизация не тянет старые tombstones
+    assert removed not in _drain(client, h)[1]
+    # токен до удалённого tombstone мог его пропустить — только полная перезагрузка
+    assert client.get("/api/pipeline/changes", params={"since": before}, headers=h).status_code == 410
+    assert _changes(client, h, after)["token"] == after
+    # поток событий с таким Last-Event-ID получает reset
+    subscriber = run(broadcaster.subscribe, ["pipeline"], int(before.rsplit(".", 1)[1]))
+    try:
+        assert subscriber.queue.get_nowait().startswith("event: reset")
+    finally:
+        broadcaster.unsubscribe(subscriber)
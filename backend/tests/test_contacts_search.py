@@ -0,0 +1,20 @@
+import uuid
+
+
+def test_contacts_search(client, admin_headers):
+    tag = f"t{uuid.uuid4().hex[:8]}"
+    for name in (f"Ivanov {tag}", f"Petrova {tag}"):
+        assert client.post("/api/contacts", json={"contact": name}, headers=admin_headers).status_code == 201
+
+    def found(search: str) -> list[str]:
+        r = client.get("/api/contacts", params={"search": search}, headers=admin_headers)
+        assert r.status_code == 200
+        return sorted(c["contact"] for c in r.json())
+
+    assert found(f"ivan {tag}") == [f"Ivanov {tag}"]
+    assert found(tag) == [f"Ivanov {tag}", f"Petrova {tag}"]
+    # слова ищутся по началу, не подстрокой
+    assert found(f"anov {tag}") == []
+    # без единого слова — ничего, а не весь список
+    assert found("-") == []
+    assert found(" ") == []
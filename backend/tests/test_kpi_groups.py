@@ -0,0 +1,88 @@
+import random
+import uuid
+
+from sqlalchemy import func, select
+
+from app.database import engine
+from app.models.deal import Deal
+from app.models.pipeline import PipelineItem
+from app.services.dimensions import DEFAULT_DATE, DEFAULT_SUM, dimension, month, number
+from app.services.kpi_groups import KPI_DIMENSIONS, KPI_TABLE, MONTH, NONE_KEY
+
+MODELS = {"pipeline": PipelineItem, "deals": Deal}
+
+
+def _materialized(collection: str) -> dict:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"SELECT dimension, key, count, total FROM {KPI_TABLE} WHERE collection = ?", (collection,)
+        ).all()
+    return {(dim, key): (count, round(total, 6)) for dim, key, count, total in rows}
+
+
+def _group_by(collection: str) -> dict:
+    model = MODELS[collection]
+    result = {}
+    with engine.connect() as conn:
+        for dim in KPI_DIMENSIONS:
+            key = func.coalesce(month(model, DEFAULT_DATE) if dim == MONTH else dimension(model, dim), NONE_KEY)
+            rows = conn.execute(
+                select(key, func.count(), func.sum(number(model, DEFAULT_SUM))).group_by(key)
+            ).all()
+            result.update({(dim, k): (count, round(total, 6)) for k, count, total in rows})
+    return result
+
+
+def _assert_consistent(step: str) -> None:
+    for collection in MODELS:
+        assert _materialized(collection) == _group_by(collection), (step, collection)
+
+
+def _data(rnd: random.Random, **fields) -> dict:
+    return {
+        rnd.choice(["Status", "status", "Статус"]): rnd.choice(["Active", "Won", " ", ""]),
+        "Sector": rnd.choice(["Tech", "Retail", ""]),
+        DEFAULT_SUM: rnd.choice(["100", "1 000,5", "n/a", "", 42]),
+        DEFAULT_DATE: rnd.choice(["2024-01-15", "15.02.2024", "bad", ""]),
+        **fields,
+    }
+
+
+def test_kpi_groups_follow_every_write(client, admin_headers, pipeline_row):
+    rnd = random.Random(25)
+    h = admin_headers
+    tag = uuid.uuid4().hex[:8]
+    _assert_consistent("start")
+
+    items = [pipeline_row(**_data(rnd, Company=f"{tag}-{i}")) for i in range(60)]
+    assert client.post("/api/pipeline/import", json={"items": items}, headers=h).status_code == 200
+    deals = [_data(rnd, Company=f"{tag}-{i}") for i in range(40)]
+    assert client.post("/api/deals/import", json={"deals": deals}, headers=h).status_code == 200
+    _assert_consistent("import")
+
+    pipeline_id = client.post("/api/pipeline", json={"data": pipeline_row(**_data(rnd))}, headers=h).json()["id"]
+    deal_id = client.post("/api/deals", json={"data": _data(rnd)}, headers=h).json()["id"]
+    _assert_consistent("create")
+
+    assert client.put(f"/api/pipeline/{pipeline_id}", json={"data": pipeline_row(**_data(rnd))}, headers=h).status_code == 200
+    assert client.put(f"/api/deals/{deal_id}", json={"data": _data(rnd)}, headers=h).status_code == 200
+    _assert_consistent("update")
+
+    assert client.delete(f"/api/pipeline/{pipeline_id}", headers=h).status_code == 204
+    assert client.delete(f"/api/deals/{deal_id}", headers=h).status_code == 204
+    _assert_consistent("delete")
+
+    assert client.delete("/api/pipeline/clear", headers=h).status_code == 204
+    assert client.delete("/api/deals/clear", headers=h).status_code == 204
+    _assert_consistent("clear")
+    assert _materialized("pipeline") == {} and _materialized("deals") == {}
+
+
+def test_kpi_endpoint_matches_group_by(client, admin_headers, pipeline_row):
+    h = admin_headers
+    items = [pipeline_row(Company=f"K{i}", Status="Active", **{DEFAULT_SUM: "10"}) for i in range(5)]
+    assert client.post("/api/pipeline/import", json={"items": items}, headers=h).status_code == 200
+    kpi = client.get("/api/analytics/kpi", params={"collections": "pipeline"}, headers=h).json()
+    groups = [value for (dim, _), value in _group_by("pipeline").items() if dim == "status"]
+    assert kpi["count"] == sum(count for count, _ in groups) >= 5
+    assert round(kpi["total"], 6) == round(sum(total for _, total in groups), 6)
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+from app.services.ratelimit import MemoryBackend, SQLiteBackend, sliding_window
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_keys=10)
+    return SQLiteBackend(str(tmp_path / "rl.db"), max_keys=10)
+
+
+def test_max_keys_is_a_hard_cap(backend):
+    # все ключи в пределах одного интервала чистки: ограничивает только max_keys
+    for i in range(50):
+        backend.hit(f"ip:{i}", sliding_window, 1000.0 + i, 5, 60.0)
+        assert len(backend) <= 10
+    assert len(backend) == 10
+    if isinstance(backend, SQLiteBackend):
+        keys = {k for (k,) in sqlite3.connect(backend.path).execute("SELECT key FROM rate_limits")}
+        assert keys == {f"ip:{i}" for i in range(40, 50)}
+
+
+def test_existing_key_keeps_its_state_at_the_cap(backend):
+    for i in range(10):
+        backend.hit(f"ip:{i}", sliding_window, 1000.0, 5, 60.0)
+    # повторные попадания в существующий ключ ничего не вытесняют и считаются
+    results = [backend.hit("ip:9", sliding_window, 1001.0, 5, 60.0) for _ in range(5)]
+    assert results == [True, True, True, True, False]
+    assert len(backend) == 10
+    backend.clear()
+    assert len(backend) == 0
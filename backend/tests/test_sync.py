@@ -0,0 +1,25 @@
+import uuid
+
+
+def _sync(client, headers, rows, **params):
+    r = client.post("/api/pipeline/sync", params={"key": "Company", **params}, json={"items": rows}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_sync_counts(client, admin_headers, pipeline_row, sql):
+    tag = uuid.uuid4().hex[:8]
+    rows = [pipeline_row(Company=f"{tag}-{i}", Status="Active", **{"Size, RUB mn": str(i)}) for i in range(4)]
+    assert _sync(client, admin_headers, rows) == {"inserted": 4, "updated": 0, "unchanged": 0, "deleted": 0, "skipped": 0}
+
+    rows[1] = {**rows[1], "Status": "Won"}
+    rows.append(pipeline_row(Company=f"{tag}-new"))
+    assert _sync(client, admin_headers, rows) == {"inserted": 1, "updated": 1, "unchanged": 3, "deleted": 0, "skipped": 0}
+    # повтор без изменений ничего не пишет
+    assert _sync(client, admin_headers, rows) == {"inserted": 0, "updated": 0, "unchanged": 5, "deleted": 0, "skipped": 0}
+
+    stored = dict(sql(
+        "SELECT json_extract(data, '$.Company'), json_extract(data, '$.Status') FROM pipeline_items "
+        "WHERE json_extract(data, '$.Company') LIKE ?", f"{tag}-%",
+    ))
+    assert stored == {row["Company"]: row["Status"] for row in rows}
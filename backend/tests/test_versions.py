@@ -0,0 +1,38 @@
+import uuid
+
+
+def _version(sql, collection: str) -> int:
+    return sql("SELECT version FROM collection_versions WHERE collection = ?", collection)[0][0]
+
+
+def test_every_write_bumps_collection_version(client, admin_headers, sql, pipeline_row):
+    h = admin_headers
+    company = f"V{uuid.uuid4().hex[:8]}"
+    created = {}
+
+    def create():
+        r = client.post("/api/pipeline", json={"data": pipeline_row(Company=company)}, headers=h)
+        created["id"] = r.json()["id"]
+        return r
+
+    writes = {
+        "create": create,
+        "update": lambda: client.put(f"/api/pipeline/{created['id']}", json={"data": pipeline_row(Company=company, Status="Won")}, headers=h),
+        "delete": lambda: client.delete(f"/api/pipeline/{created['id']}", headers=h),
+        "import": lambda: client.post("/api/pipeline/import", json={"items": [pipeline_row(Company=company)]}, headers=h),
+        "clear": lambda: client.delete("/api/pipeline/clear", headers=h),
+    }
+    for name, write in writes.items():
+        before = _version(sql, "pipeline")
+        etag = client.get("/api/pipeline", headers=h).headers["etag"]
+        assert client.get("/api/pipeline", headers={**h, "If-None-Match": etag}).status_code == 304
+        assert write().status_code < 300, name
+        assert _version(sql, "pipeline") > before, name
+        r = client.get("/api/pipeline", headers={**h, "If-None-Match": etag})
+        assert r.status_code == 200 and r.headers["etag"] != etag, name
+
+
+def test_other_collection_write_keeps_version(client, admin_headers, sql):
+    before = _version(sql, "pipeline")
+    assert client.post("/api/deals", json={"data": {"Company": "Other"}}, headers=admin_headers).status_code == 201
+    assert _version(sql, "pipeline") == before
@@ -0,0 +1,51 @@
+import { apiFetch } from './client'
+
+export type AnalyticsCollection = 'pipeline' | 'companies' | 'advisors' | 'investors' | 'deals'
+
+/** key = null — значение не заполнено */
+export interface GroupCount { key: string | null; count: number }
+export interface GroupTotal extends GroupCount { sum: number }
+export interface OwnerTotal extends GroupTotal { name: string | null; email: string | null }
+export interface MonthlyPoint { month: string; count: number; sum: number }
+export interface Kpi { count: number; total: number; avg: number }
+
+export interface DashboardStats {
+  deals: number
+  contacts: number
+  by_responsible: GroupCount[]
+  by_sector: GroupCount[]
+  by_status: GroupCount[]
+  by_type: GroupCount[]
+}
+
+function query(params: Record<string, string | string[] | undefined>): string {
+  const q = new URLSearchParams()
+  for (const [k, v] of Object.entries(params)) {
+    if (v === undefined) continue
+    for (const item of Array.isArray(v) ? v : [v]) q.append(k, item)
+  }
+  const s = q.toString()
+  return s ? `?${s}` : ''
+}
+
+// Ответы кэшируются на сервере по версиям коллекций; браузер переспрашивает по ETag
+
+export async function getDashboardStats(collections?: AnalyticsCollection[]): Promise<DashboardStats> {
+  return apiFetch<DashboardStats>(`/analytics/dashboard${query({ collections })}`)
+}
+
+export async function getGroupTotals(by: string, opts: { sum?: string; collections?: AnalyticsCollection[] } = {}): Promise<GroupTotal[]> {
+  return apiFetch<GroupTotal[]>(`/analytics/groups${query({ by, sum: opts.sum, collections: opts.collections })}`)
+}
+
+export async function getOwnerTotals(opts: { sum?: string; collections?: AnalyticsCollection[] } = {}): Promise<OwnerTotal[]> {
+  return apiFetch<OwnerTotal[]>(`/analytics/owners${query({ sum: opts.sum, collections: opts.collections })}`)
+}
+
+export async function getMonthlySeries(opts: { date?: string; sum?: string; collections?: AnalyticsCollection[] } = {}): Promise<MonthlyPoint[]> {
+  return apiFetch<MonthlyPoint[]>(`/analytics/monthly${query({ date: opts.date, sum: opts.sum, collections: opts.collections })}`)
+}
+
+export async function getKpi(opts: { sum?: string; collections?: AnalyticsCollection[] } = {}): Promise<Kpi> {
+  return apiFetch<Kpi>(`/analytics/kpi${query({ sum: opts.sum, collections: opts.collections })}`)
+}
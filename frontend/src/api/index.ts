@@ -10,6 +10,7 @@ export * from './pipeline'
 export * from './companies'
 export * from './advisors'
 export * from './investors'
+export * from './analytics'
 
 // Re-export для удобства
 export { API_URL } from './client'
@@ -6,6 +6,7 @@ import FullBleed from '../components/FullBleed'
 import AutoScale from '../components/AutoScale'
 import DealFormModal from '../components/DealFormModal'
 import SearchBar from '../components/SearchBar'
+import { refetchOnServerChanges } from '../utils/crossSync'
 
 const REQUIRED_HEADERS = ['Advisor','Contact persons','Type','Comment','Responsible','Date of the last meeting of the responsible person','Months since the last meeting'] as const
 
@@ -32,7 +33,8 @@ export default function Advisors() {
     load()
     const onImported = ()=> load()
     window.addEventListener('crm:imported', onImported as any)
-    return ()=> window.removeEventListener('crm:imported', onImported as any)
+    const offServer = refetchOnServerChanges(['advisors'], ()=> load())
+    return ()=> { window.removeEventListener('crm:imported', onImported as any); offServer() }
   }, [])
 
   const columns = useMemo(()=> {
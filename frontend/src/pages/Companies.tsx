@@ -6,6 +6,7 @@ import FullBleed from '../components/FullBleed'
 import AutoScale from '../components/AutoScale'
 import DealFormModal from '../components/DealFormModal'
 import SearchBar from '../components/SearchBar'
+import { refetchOnServerChanges } from '../utils/crossSync'
 
 const REQUIRED_HEADERS = ['Company','Sector','Contacted person','Methods to reach out','Status','Comments'] as const
 
@@ -32,7 +33,8 @@ export default function Companies() {
     load()
     const onImported = ()=> load()
     window.addEventListener('crm:imported', onImported as any)
-    return ()=> window.removeEventListener('crm:imported', onImported as any)
+    const offServer = refetchOnServerChanges(['companies'], ()=> load())
+    return ()=> { window.removeEventListener('crm:imported', onImported as any); offServer() }
   }, [])
 
   const columns = useMemo(()=> {
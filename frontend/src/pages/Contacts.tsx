@@ -8,6 +8,7 @@ import LiquidModal from '../components/LiquidModal';
 import ContactForm from '../components/ContactForm';
 import { RequireAuth } from '../auth/guards';
 import { useAuth } from '../auth/AuthContext';
+import { refetchOnServerChanges } from '../utils/crossSync';
 import { ContactRow, rowCanEdit } from '../utils/dataset';
 import * as API from '../api';
 
@@ -61,9 +62,10 @@ function ContactsInner() {
   );
 
   // Загрузка контактов из API
-  const loadContacts = async () => {
+  // quiet — фоновая перезагрузка по событию сервера, без экрана загрузки
+  const loadContacts = async (quiet = false) => {
     try {
-      setLoading(true);
+      if (!quiet) setLoading(true);
       setErrorBanner(null);
       setError(null);
       const contacts = await API.getContacts();
@@ -82,7 +84,8 @@ function ContactsInner() {
     const he = (e: any) => { setErrorBanner(e?.detail?.message || "Incorrect file wasn't imported"); setTimeout(()=>setErrorBanner(null), 6000) }
     window.addEventListener('crm:imported', h as any)
     window.addEventListener('crm:import-error', he as any)
-    return () => { window.removeEventListener('crm:imported', h as any); window.removeEventListener('crm:import-error', he as any) }
+    const offServer = refetchOnServerChanges(['contacts'], () => loadContacts(true))
+    return () => { window.removeEventListener('crm:imported', h as any); window.removeEventListener('crm:import-error', he as any); offServer() }
   }, []);
 
   const filtered = useMemo(() => {
@@ -163,7 +166,7 @@ function ContactsInner() {
           <div className="text-red-400">Error: {error}</div>
           <button 
             className="mt-2 glass px-3 py-2 rounded-2xl hover:bg-white/10" 
-            onClick={loadContacts}
+            onClick={() => loadContacts()}
           >
             Retry
           </button>
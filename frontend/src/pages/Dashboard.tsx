@@ -6,102 +6,85 @@ import {
   PieChart, Pie, Cell, Tooltip, ResponsiveContainer,
   BarChart, Bar, XAxis, YAxis, CartesianGrid
 } from 'recharts'
-import { KEYS, pickFirst } from '../utils/dataset'
+import { KEYS } from '../utils/dataset'
 import * as API from '../api'
 
 type DealRow = Record<string, unknown> & { id?: string; ownerId?: string }
-type ContactRow = Record<string, unknown> & { id?: string; contact?: string }
 type ModalState = { open: false } | { open: true; title: string; rows: DealRow[] }
 
 const PALETTE = ['#93C5FD','#A78BFA','#60A5FA','#F472B6','#34D399','#FBBF24','#F87171','#22D3EE','#A7F3D0','#FDE68A']
 
-function countBy<T extends Record<string, unknown>>(rows: T[], getter: (r: T)=>string) {
-  const map = new Map<string, number>()
-  for (const r of rows) {
-    const k = getter(r) || '—'
-    map.set(k, (map.get(k) ?? 0) + 1)
-  }
-  return Array.from(map.entries()).map(([name, value]) => ({ name, value }))
+type Slice = { name: string; value: number }
+
+// null от сервера — значение не заполнено
+function toSlices(groups: API.GroupCount[]): Slice[] {
+  return groups.map(g => ({ name: g.key ?? '—', value: g.count }))
 }
 
-function getUniqueContacts(contacts: ContactRow[], deals: DealRow[]) {
-  const set = new Set<string>()
-  const push = (v: unknown) => { const s = String(v ?? '').trim(); if (s) set.add(s) }
-  for (const r of contacts) {
-    if ('contact' in r) push((r as any).contact)
-    push(pickFirst(r, KEYS.contactPersons))
-    push((r as any)['Contacted person'])
-  }
-  if (set.size === 0) {
-    for (const r of deals) {
-      push(pickFirst(r, KEYS.contactPersons))
-      push((r as any)['Contacted person'])
-    }
+// Значение измерения строки так же, как его группирует сервер: первый непустой ключ, обрезанный
+function dimension(r: DealRow, keys: readonly string[]): string {
+  for (const k of keys) {
+    const v = String(r[k] ?? '').trim()
+    if (v) return v
   }
-  return set
+  return '—'
 }
 
 export default function Dashboard() {
-  const [allDeals, setAllDeals] = useState<DealRow[]>([])
-  const [allContacts, setAllContacts] = useState<ContactRow[]>([])
+  const [stats, setStats] = useState<API.DashboardStats | null>(null)
+  // Строки листов нужны только для окна со сделками — грузятся при первом клике
+  const [allDeals, setAllDeals] = useState<DealRow[] | null>(null)
   const [loading, setLoading] = useState(true)
   const [modal, setModal] = useState<ModalState>({ open: false })
 
-  // Загрузка данных из API (агрегация из всех листов)
-  const loadData = async () => {
+  // Показатели считает сервер (SQL по всем листам), ответ — сотни байт
+  const loadStats = async () => {
     try {
       setLoading(true)
-      const [pipeline, companies, advisors, investors] = await Promise.all([
-        API.getPipeline(),
-        API.getCompanies(),
-        API.getAdvisors(),
-        API.getInvestors(),
-      ])
-      
-      // Собираем единый список сделок из всех листов
-      const dealRows: DealRow[] = [
-        ...pipeline.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
-        ...companies.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
-        ...advisors.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
-        ...investors.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
-      ]
-      // strip parser artifacts
-      dealRows.forEach(r => { delete (r as any)['__parsed_extra'] })
-
-      // Вычисляем контакты из приоритетных колонок
-      const candidateKeys = ['Source Name','Contacted person','Contact persons','Investor']
-      const contactSet = new Set<string>()
-      for (const r of dealRows) {
-        for (const k of candidateKeys) {
-          const v = String((r as any)[k] ?? '').trim()
-          if (v) contactSet.add(v)
-        }
-      }
-      const contactRows: ContactRow[] = Array.from(contactSet).map((name, i) => ({ id: `ct_${i}`, contact: name }))
-      
-      setAllContacts(contactRows)
-      setAllDeals(dealRows)
+      setStats(await API.getDashboardStats())
     } catch (err) {
       console.error('Ошибка загрузки данных:', err)
     } finally {
       setLoading(false)
     }
   }
-  
+
+  const loadDeals = async (): Promise<DealRow[]> => {
+    const [pipeline, companies, advisors, investors] = await Promise.all([
+      API.getPipeline(),
+      API.getCompanies(),
+      API.getAdvisors(),
+      API.getInvestors(),
+    ])
+    // Собираем единый список сделок из всех листов
+    const dealRows: DealRow[] = [
+      ...pipeline.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
+      ...companies.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
+      ...advisors.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
+      ...investors.map(d => ({ id: d.id, ownerId: d.owner_id, ...d.data })),
+    ]
+    // strip parser artifacts
+    dealRows.forEach(r => { delete (r as any)['__parsed_extra'] })
+    setAllDeals(dealRows)
+    return dealRows
+  }
+
+  const loadData = async () => {
+    await Promise.all([loadStats(), allDeals ? loadDeals() : Promise.resolve()])
+  }
+
   useEffect(() => {
-    loadData()
+    loadStats()
   }, [])
 
-  const contactsCount = useMemo(() => getUniqueContacts(allContacts, allDeals).size, [allContacts, allDeals])
-  const dealsCount = allDeals.length
-
-  const byResponsible = useMemo(() => countBy(allDeals, r => String(pickFirst(r, KEYS.responsible) ?? '')), [allDeals])
-  const bySector      = useMemo(() => countBy(allDeals, r => String(pickFirst(r, KEYS.sector) ?? '')), [allDeals])
-  const byStatus      = useMemo(() => countBy(allDeals, r => String(pickFirst(r, KEYS.status) ?? '')), [allDeals])
-  const byType        = useMemo(() => countBy(allDeals, r => String(pickFirst(r, KEYS.type) ?? '')), [allDeals])
+  const byResponsible = useMemo(() => toSlices(stats?.by_responsible ?? []), [stats])
+  const bySector      = useMemo(() => toSlices(stats?.by_sector ?? []), [stats])
+  const byStatus      = useMemo(() => toSlices(stats?.by_status ?? []), [stats])
+  const byType        = useMemo(() => toSlices(stats?.by_type ?? []), [stats])
 
-  function openFiltered(title: string, predicate: (r: DealRow)=>boolean) {
-    const rows = allDeals.filter(predicate)
+  async function openFiltered(title: string, keys: readonly string[], value: string) {
+    const deals = allDeals ?? await loadDeals()
+    const rows = deals.filter(r => dimension(r, keys) === value)
     setModal({ open: true, title: `${title} — ${rows.length}`, rows })
   }
 
@@ -146,8 +129,8 @@ export default function Dashboard() {
   const gridLine = 'rgba(0,0,0,0.1)'
 
   const metrics = [
-    { label: 'Contacts', value: contactsCount },
-    { label: 'Deals', value: dealsCount },
+    { label: 'Contacts', value: stats?.contacts ?? 0 },
+    { label: 'Deals', value: stats?.deals ?? 0 },
     { label: 'Responsibles (unique)', value: byResponsible.filter(x => x.name && x.name !== '—').length },
   ]
 
@@ -183,10 +166,7 @@ export default function Dashboard() {
                   <Cell
                     key={`r-${entry.name}`}
                     fill={PALETTE[idx % PALETTE.length]}
-                    onClick={() => openFiltered(
-                      `Responsible: ${entry.name}`,
-                      (r) => String(pickFirst(r, KEYS.responsible) ?? '') === entry.name
-                    )}
+                    onClick={() => openFiltered(`Responsible: ${entry.name}`, KEYS.responsible, entry.name)}
                     style={{ cursor: 'pointer' }}
                   />
                 ))}
@@ -203,10 +183,7 @@ export default function Dashboard() {
                   <Cell
                     key={`s-${entry.name}`}
                     fill={PALETTE[idx % PALETTE.length]}
-                    onClick={()=> openFiltered(
-                      `Sector: ${entry.name}`,
-                      (r)=> String(pickFirst(r, KEYS.sector) ?? '') === entry.name
-                    )}
+                    onClick={()=> openFiltered(`Sector: ${entry.name}`, KEYS.sector, entry.name)}
                     style={{ cursor:'pointer' }}
                   />
                 ))}
@@ -228,10 +205,7 @@ export default function Dashboard() {
                   <Cell
                     key={`st-${entry.name}`}
                     fill={PALETTE[idx % PALETTE.length]}
-                    onClick={()=> openFiltered(
-                      `Status: ${entry.name}`,
-                      (r)=> String(pickFirst(r, KEYS.status) ?? '') === entry.name
-                    )}
+                    onClick={()=> openFiltered(`Status: ${entry.name}`, KEYS.status, entry.name)}
                     style={{ cursor:'pointer' }}
                   />
                 ))}
@@ -248,10 +222,7 @@ export default function Dashboard() {
                   <Cell
                     key={`t-${entry.name}`}
                     fill={PALETTE[idx % PALETTE.length]}
-                    onClick={()=> openFiltered(
-                      `Тип: ${entry.name}`,
-                      (r)=> String(pickFirst(r, KEYS.type) ?? '') === entry.name
-                    )}
+                    onClick={()=> openFiltered(`Тип: ${entry.name}`, KEYS.type, entry.name)}
                     style={{ cursor:'pointer' }}
                   />
                 ))}
@@ -8,6 +8,7 @@ import LiquidCard from '../components/LiquidCard';
 import DealForm from '../components/DealForm';
 import AutoScale from '../components/AutoScale';
 import FullBleed from '../components/FullBleed';
+import { refetchOnServerChanges } from '../utils/crossSync';
 import { RequireAuth } from '../auth/guards';
 import { useAuth } from '../auth/AuthContext';
 import { rowCanEdit, DealRow } from '../utils/dataset';
@@ -71,9 +72,10 @@ function DealsInner() {
   const [useFullBleed, setUseFullBleed] = useState(false);
 
   // Загрузка сделок из API
-  const loadDeals = async () => {
+  // quiet — фоновая перезагрузка по событию сервера, без экрана загрузки
+  const loadDeals = async (quiet = false) => {
     try {
-      setLoading(true);
+      if (!quiet) setLoading(true);
       setErrorBanner(null);
       setError(null);
       const deals = await API.getDeals();
@@ -94,7 +96,8 @@ function DealsInner() {
     const he = (e: any) => { setErrorBanner(e?.detail?.message || "Incorrect file wasn't imported"); setTimeout(()=>setErrorBanner(null), 6000) }
     window.addEventListener('crm:imported', h as any)
     window.addEventListener('crm:import-error', he as any)
-    return () => { window.removeEventListener('crm:imported', h as any); window.removeEventListener('crm:import-error', he as any) }
+    const offServer = refetchOnServerChanges(['deals'], () => loadDeals(true))
+    return () => { window.removeEventListener('crm:imported', h as any); window.removeEventListener('crm:import-error', he as any); offServer() }
   }, []);
 
   const filtered = useMemo(() => {
@@ -228,7 +231,7 @@ function DealsInner() {
           <div className="text-red-400">Ошибка: {error}</div>
           <button 
             className="mt-2 glass px-3 py-2 rounded-2xl hover:bg-white/10" 
-            onClick={loadDeals}
+            onClick={() => loadDeals()}
           >
             Повторить
           </button>
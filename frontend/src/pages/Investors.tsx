@@ -6,6 +6,7 @@ import FullBleed from '../components/FullBleed'
 import AutoScale from '../components/AutoScale'
 import DealFormModal from '../components/DealFormModal'
 import SearchBar from '../components/SearchBar'
+import { refetchOnServerChanges } from '../utils/crossSync'
 
 const REQUIRED_HEADERS = ['Investor','Connection','Target ticket','Target sectors','Relevant?','Comments','Discussed fund','Discussed A3','Discussed Lab Vkusa'] as const
 
@@ -32,7 +33,8 @@ export default function Investors() {
     load()
     const onImported = ()=> load()
     window.addEventListener('crm:imported', onImported as any)
-    return ()=> window.removeEventListener('crm:imported', onImported as any)
+    const offServer = refetchOnServerChanges(['investors'], ()=> load())
+    return ()=> { window.removeEventListener('crm:imported', onImported as any); offServer() }
   }, [])
 
   const columns = useMemo(()=> {
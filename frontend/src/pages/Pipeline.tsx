@@ -6,6 +6,7 @@ import FullBleed from '../components/FullBleed'
 import AutoScale from '../components/AutoScale'
 import DealFormModal from '../components/DealFormModal'
 import SearchBar from '../components/SearchBar'
+import { refetchOnServerChanges } from '../utils/crossSync'
 
 const REQUIRED_HEADERS = ['Company','Date','Sector','Seniot','Junior team','Source','Source Name','Type','Size, RUB mn','Status','Next connection','Comments'] as const
 
@@ -32,7 +33,8 @@ export default function Pipeline() {
     load()
     const onImported = ()=> load()
     window.addEventListener('crm:imported', onImported as any)
-    return ()=> window.removeEventListener('crm:imported', onImported as any)
+    const offServer = refetchOnServerChanges(['pipeline'], ()=> load())
+    return ()=> { window.removeEventListener('crm:imported', onImported as any); offServer() }
   }, [])
 
   const columns = useMemo(()=> {
@@ -1,5 +1,6 @@
 import { saveRows, STORE, ContactRow, DealRow } from './dataset'
 import { findHeader, CONTACT_HEADER_CANDIDATES } from './headers'
+import { API_URL } from '../api/client'
 
 export function saveRowsAndNotify<T>(storeKey: string, rows: T[]) {
   saveRows(storeKey as any, rows as any)
@@ -20,6 +21,33 @@ export function subscribeStore(keys: string[], cb: ()=>void): ()=>void {
   }
 }
 
+/** Событие сервера об изменении коллекции (SSE /api/events) */
+export type ServerChange =
+  | { collection: string; id: string; op: 'upsert' | 'delete'; token: string }
+  | { collection: string; op: 'bulk'; count: number; token: string }
+  | { op: 'reset' }
+
+/** Изменения на сервере от всех пользователей; EventSource сам переподключается и догоняет пропущенное */
+export function subscribeServerChanges(collections: string[], cb: (e: ServerChange) => void): () => void {
+  if (typeof EventSource === 'undefined') return () => {}
+  const source = new EventSource(`${API_URL}/events?collections=${encodeURIComponent(collections.join(','))}`, { withCredentials: true })
+  const onChange = (e: MessageEvent) => { try { cb(JSON.parse(e.data)) } catch {} }
+  const onReset = () => cb({ op: 'reset' })
+  source.addEventListener('change', onChange)
+  source.addEventListener('reset', onReset)
+  return () => source.close()
+}
+
+/** Перезагрузка страницы по изменениям на сервере; пачку событий (импорт, bulk) склеивает в один запрос */
+export function refetchOnServerChanges(collections: string[], refetch: () => void, delay = 300): () => void {
+  let timer: ReturnType<typeof setTimeout> | undefined
+  const off = subscribeServerChanges(collections, () => {
+    clearTimeout(timer)
+    timer = setTimeout(refetch, delay)
+  })
+  return () => { clearTimeout(timer); off() }
+}
+
 /** Извлечь контакты из сделок и пометить владельца */
 export function deriveContactsFromDeals(rows: Array<Record<string, unknown>>, ownerId?: string): ContactRow[] {
   const out: ContactRow[] = []